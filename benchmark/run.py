@@ -0,0 +1,322 @@
+"""
+Environment Benchmark
+Times ``initialize_state``, ``step``, ``legal_actions``, ``perspective`` and state
+serialization of every game and backend separately, over the positions of seeded
+random games. Each (game, backend) pair runs in its own process because every
+game directory provides its own ``pre`` and ``new`` packages.
+
+    python benchmark/run.py --output results.json
+    python benchmark/run.py --baseline results.json --threshold 0.1
+
+Backends
+    - ``pre``: ``<game>/pre/pre_env.py``
+    - ``new``: ``<game>/new/new_env.py``
+    - ``real``: the installed ``fights.envs`` release
+"""
+
+import argparse
+import dataclasses
+import datetime
+import importlib
+import json
+import operator
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GAMES = {
+    "quoridor": ("QuoridorEnv", "QuoridorState"),
+    "puoribor": ("PuoriborEnv", "PuoriborState"),
+    "othello": ("OthelloEnv", "OthelloState"),
+}
+
+BACKENDS = ("pre", "new", "real")
+
+OPS = (
+    "initialize_state",
+    "step",
+    "legal_actions",
+    "perspective",
+    "to_dict",
+    "from_dict",
+    "to_bytes",
+    "from_bytes",
+)
+
+PERCENTILES = (50, 90, 99)
+
+
+def load_backend(game: str, backend: str):
+    """
+    Import the environment and state classes of ``backend`` for ``game``.
+    """
+    if backend == "real":
+        module = importlib.import_module(f"fights.envs.{game}")
+    else:
+        game_dir = os.path.join(ROOT, game)
+        if game_dir not in sys.path:
+            sys.path.insert(0, game_dir)
+        module = importlib.import_module(f"{backend}.{backend}_env")
+    env_name, state_name = GAMES[game]
+    return getattr(module, env_name), getattr(module, state_name)
+
+
+def record_games(game: str, num_games: int, max_plies: int, seed: int):
+    """
+    Play seeded random games with the ``new`` backend.
+    :returns:
+        A list of action sequences, agent 0 moving first.
+    """
+    env_class, _ = load_backend(game, "new")
+    env = env_class()
+    rng = np.random.default_rng(seed)
+    games = []
+    for _ in range(num_games):
+        state = env.initialize_state()
+        agent_id = 0
+        actions = []
+        while not state.done and len(actions) < max_plies:
+            idx = rng.choice(np.flatnonzero(env.legal_mask_flat(state, agent_id)))
+            action = [int(value) for value in env.decode_action(int(idx))]
+            actions.append(action)
+            state = env.step(state, agent_id, action)
+            agent_id = 1 - agent_id
+        games.append(actions)
+    return games
+
+
+def initial_state(env, backend: str):
+    state = env.initialize_state()
+    if backend == "pre":
+        # The original Cython kernels take C ``int`` arrays, which ``np.int_`` is
+        # only where it is 32-bit.
+        state = dataclasses.replace(
+            state,
+            **{
+                name: getattr(state, name).astype(np.intc)
+                for name in ("board", "walls_remaining", "legal_actions")
+                if hasattr(state, name)
+            },
+        )
+    return state
+
+
+def build_cases(game: str, backend: str, games):
+    """
+    Replay ``games`` with ``backend`` and collect the arguments of every op.
+    :returns:
+        A dict mapping op names to ``(function, list of argument tuples)``.
+    """
+    env_class, state_class = load_backend(game, backend)
+    env = env_class()
+    transitions = []
+    for actions in games:
+        state = initial_state(env, backend)
+        for ply, action in enumerate(actions):
+            transitions.append((state, ply % 2, action))
+            state = env.step(state, ply % 2, action)
+    positions = [(state, agent_id) for state, agent_id, _ in transitions]
+    states = [(state,) for state, _ in positions]
+
+    cases = {
+        "initialize_state": (env.initialize_state, [()] * len(transitions)),
+        "step": (env.step, transitions),
+        "perspective": (state_class.perspective, positions),
+        "to_dict": (state_class.to_dict, states),
+        "from_dict": (state_class.from_dict, [(state.to_dict(),) for (state,) in states]),
+    }
+    # The same op on every backend of a game: a method where the environment
+    # computes legal actions, reading the field where the state stores them.
+    # A backend with neither reports the op as not supported.
+    if hasattr(env, "legal_actions"):
+        cases["legal_actions"] = (env.legal_actions, positions)
+    elif "legal_actions" in {field.name for field in dataclasses.fields(state_class)}:
+        cases["legal_actions"] = (operator.attrgetter("legal_actions"), states)
+    if hasattr(state_class, "to_bytes"):
+        cases["to_bytes"] = (state_class.to_bytes, states)
+        cases["from_bytes"] = (
+            state_class.from_bytes, [(state.to_bytes(),) for (state,) in states]
+        )
+    return cases
+
+
+def measure(function, cases, warmup: int, trials: int):
+    """
+    Time every call separately after ``warmup`` untimed passes over ``cases``.
+    :returns:
+        A dict of the call count and the mean, minimum and percentile times in
+        nanoseconds.
+    """
+    for _ in range(warmup):
+        for args in cases:
+            function(*args)
+
+    timer = time.perf_counter_ns
+    samples = np.empty(trials * len(cases), dtype=np.int64)
+    index = 0
+    for _ in range(trials):
+        for args in cases:
+            start = timer()
+            function(*args)
+            samples[index] = timer() - start
+            index += 1
+
+    summary = {
+        "calls": int(samples.size),
+        "mean_ns": float(samples.mean()),
+        "min_ns": int(samples.min()),
+    }
+    for percentile, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+        summary[f"p{percentile}_ns"] = float(value)
+    return summary
+
+
+def run_worker(game: str, backend: str, args) -> dict:
+    games = record_games(game, args.num_games, args.max_plies, args.seed)
+    cases = build_cases(game, backend, games)
+    results = {}
+    for op in args.ops:
+        if op not in cases:
+            results[op] = {"error": "not supported"}
+            continue
+        function, op_cases = cases[op]
+        try:
+            results[op] = measure(function, op_cases, args.warmup, args.trials)
+        except Exception as error:
+            results[op] = {"error": f"{type(error).__name__}: {error}"}
+    return results
+
+
+def run_pair(game: str, backend: str, args) -> dict:
+    """
+    Run one (game, backend) pair in a child process.
+    """
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--worker",
+        game,
+        backend,
+        "--ops",
+        *args.ops,
+        "--num-games",
+        str(args.num_games),
+        "--max-plies",
+        str(args.max_plies),
+        "--seed",
+        str(args.seed),
+        "--warmup",
+        str(args.warmup),
+        "--trials",
+        str(args.trials),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines() or ["exited with no output"]
+        return {op: {"error": lines[-1]} for op in args.ops}
+    return json.loads(completed.stdout)
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """
+    Find ops whose median time grew by more than ``threshold`` over ``baseline``.
+    :returns:
+        A dict mapping result keys to ``p50`` ratios against the baseline, and a
+        list of keys over the threshold.
+    """
+    ratios = {}
+    regressions = []
+    for key, summary in results.items():
+        base = baseline.get(key, {})
+        if "p50_ns" not in summary or not base.get("p50_ns"):
+            continue
+        ratios[key] = summary["p50_ns"] / base["p50_ns"]
+        if ratios[key] > 1 + threshold:
+            regressions.append(key)
+    return ratios, regressions
+
+
+def print_table(results: dict, ratios: dict, regressions) -> None:
+    print(f"{'benchmark':<34}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'vs base':>10}")
+    for key, summary in results.items():
+        if "error" in summary:
+            print(f"{key:<34}  {summary['error']}")
+            continue
+        line = f"{key:<34}" + "".join(
+            f"{summary[f'p{percentile}_ns'] / 1000:>10.2f}" for percentile in PERCENTILES
+        )
+        if key in ratios:
+            line += f"{(ratios[key] - 1) * 100:>+9.1f}%"
+            if key in regressions:
+                line += "  REGRESSION"
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--game", nargs="+", choices=GAMES, default=list(GAMES))
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["pre", "new"])
+    parser.add_argument("--ops", nargs="+", choices=OPS, default=list(OPS))
+    parser.add_argument("--num-games", type=int, default=5, help="random games replayed per pair")
+    parser.add_argument("--max-plies", type=int, default=60, help="plies kept per game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes per op")
+    parser.add_argument("--trials", type=int, default=5, help="timed passes per op")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results stored by --output")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="allowed p50 slowdown over the baseline"
+    )
+    parser.add_argument("--worker", nargs=2, metavar=("GAME", "BACKEND"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.worker:
+        print(json.dumps(run_worker(*args.worker, args)))
+        return 0
+
+    results = {}
+    for game in args.game:
+        for backend in args.backends:
+            for op, summary in run_pair(game, backend, args).items():
+                results[f"{game}/{backend}/{op}"] = summary
+
+    ratios, regressions = {}, []
+    if args.baseline:
+        with open(args.baseline) as f:
+            ratios, regressions = compare(results, json.load(f)["results"], args.threshold)
+    print_table(results, ratios, regressions)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "machine": platform.machine(),
+                        "num_games": args.num_games,
+                        "max_plies": args.max_plies,
+                        "seed": args.seed,
+                        "warmup": args.warmup,
+                        "trials": args.trials,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+
+    sys.exit(main())
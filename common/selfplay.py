@@ -0,0 +1,390 @@
+"""
+Self-Play Runner
+Plays games in worker processes and streams their trajectories to the parent
+through a shared-memory ring buffer per worker. Positions are stored as
+``to_bytes`` records of the game state and actions as flat indices (see
+``encode_action``), so nothing is pickled on the way back.
+
+Every game provides a subclass in ``<game>/new/selfplay.py`` that names its
+environment, decodes its records and scores its finished games:
+
+    class SelfPlayRunner(BaseSelfPlayRunner):
+        env_class = QuoridorEnv
+        trajectories_class = Trajectories
+        outcome = staticmethod(_outcome)
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Iterator, Optional, Sequence, Tuple, Type
+
+import numpy as np
+from numpy.typing import NDArray
+
+from fights.base import BaseAgent, BaseEnv, BaseState
+
+AgentFactory = Callable[[int, int], BaseAgent]
+"""
+Callable building an agent from ``(agent_id, seed)``, such as an agent class.
+"""
+
+OutcomeFn = Callable[[BaseState, int], int]
+"""
+Callable scoring the last state of a game from ``(state, last_agent_id)`` for
+agent 0: ``1`` for a win, ``-1`` for a loss and ``0`` for a draw or a game cut
+off at ``max_plies``.
+"""
+
+
+def _slot_dtype(record_size: int) -> np.dtype:
+    """
+    Layout of one ply in the ring buffers.
+    """
+    return np.dtype(
+        [
+            ("record", np.uint8, (record_size,)),
+            ("game_id", np.int64),
+            ("action", np.intc),
+            ("ply", np.intc),
+            ("agent_id", np.uint8),
+            ("outcome", np.int8),
+        ],
+        align=True,
+    )
+
+
+@dataclass
+class BaseTrajectories(ABC):
+    """
+    ``BaseTrajectories`` holds plies collected by :meth:`BaseSelfPlayRunner.collect`,
+    in the order their games finished. Plies of a game are consecutive and in order.
+    """
+
+    records: NDArray[np.uint8]
+    """
+    Array of shape ``(N, record_size)`` holding the position before each ply,
+    as written by ``to_bytes`` of the game state.
+    """
+
+    actions: NDArray[np.intc]
+    """
+    Array of shape ``(N,)`` holding the flat index of the action played.
+    """
+
+    agent_ids: NDArray[np.uint8]
+    """
+    Array of shape ``(N,)`` holding the agent who played each ply.
+    """
+
+    game_ids: NDArray[np.int64]
+    """
+    Array of shape ``(N,)`` holding an id unique among the games of a runner.
+    """
+
+    plies: NDArray[np.intc]
+    """
+    Array of shape ``(N,)`` holding the index of each ply in its game.
+    """
+
+    outcomes: NDArray[np.int8]
+    """
+    Array of shape ``(N,)`` holding the result of the game for agent 0 (see
+    :obj:`OutcomeFn`).
+    """
+
+    @classmethod
+    def from_slots(cls, slots: NDArray) -> BaseTrajectories:
+        return cls(
+            records=np.ascontiguousarray(slots["record"]),
+            actions=np.ascontiguousarray(slots["action"]),
+            agent_ids=np.ascontiguousarray(slots["agent_id"]),
+            game_ids=np.ascontiguousarray(slots["game_id"]),
+            plies=np.ascontiguousarray(slots["ply"]),
+            outcomes=np.ascontiguousarray(slots["outcome"]),
+        )
+
+    def __len__(self) -> int:
+        return self.actions.shape[0]
+
+    @abstractmethod
+    def states(self) -> Tuple[NDArray, ...]:
+        """
+        Decode every position with ``from_bytes_batch`` of the game state.
+        """
+        ...
+
+
+def _worker(
+    worker_id: int,
+    num_workers: int,
+    shm_name: str,
+    capacity: int,
+    env_class: Type[BaseEnv],
+    outcome: OutcomeFn,
+    slot_dtype: np.dtype,
+    agent_fns: Sequence[AgentFactory],
+    seed: int,
+    num_games: Optional[int],
+    max_plies: int,
+    condition,
+    stop,
+) -> None:
+    shm = SharedMemory(name=shm_name)
+    try:
+        counters, rings = _views(shm, num_workers, capacity, slot_dtype)
+        counters, ring = counters[worker_id], rings[worker_id]
+        env = env_class()
+        agents = [agent_fn(agent_id, seed + worker_id) for agent_id, agent_fn in enumerate(agent_fns)]
+        game = np.zeros((max_plies,), dtype=slot_dtype)
+        game["ply"] = np.arange(max_plies)
+        game["agent_id"] = game["ply"] % 2
+
+        game_index = 0
+        while not stop.is_set() and (num_games is None or game_index < num_games):
+            state = env.initialize_state()
+            ply = 0
+            while not state.done and ply < max_plies:
+                agent_id = ply % 2
+                action = agents[agent_id](state)
+                game["record"][ply] = np.frombuffer(state.to_bytes(), dtype=np.uint8)
+                game["action"][ply] = env.encode_action(action)
+                state = env.step(state, agent_id, action)
+                ply += 1
+            game["game_id"][:ply] = game_index * num_workers + worker_id
+            game["outcome"][:ply] = outcome(state, (ply - 1) % 2)
+
+            with condition:
+                while capacity - (counters[0] - counters[1]) < ply:
+                    if stop.is_set():
+                        return
+                    condition.wait(0.1)
+                start = int(counters[0]) % capacity
+            # Only this worker writes its ring and the parent only reads published
+            # plies, so the copy needs no lock.
+            head = min(ply, capacity - start)
+            ring[start:start + head] = game[:head]
+            ring[:ply - head] = game[head:ply]
+            with condition:
+                counters[0] += ply
+                condition.notify_all()
+            game_index += 1
+    finally:
+        # Drop the views before closing the mapping they point into.
+        counters = rings = ring = None
+        shm.close()
+
+
+def _views(
+    shm: SharedMemory, num_workers: int, capacity: int, slot_dtype: np.dtype
+) -> Tuple[NDArray[np.int64], NDArray]:
+    """
+    Map ``(written, read)`` ply counters of shape ``(num_workers, 2)`` and rings of
+    shape ``(num_workers, capacity)`` onto the shared block.
+    """
+    counters = np.ndarray((num_workers, 2), dtype=np.int64, buffer=shm.buf)
+    rings = np.ndarray(
+        (num_workers, capacity), dtype=slot_dtype, buffer=shm.buf, offset=counters.nbytes
+    )
+    return counters, rings
+
+
+class BaseSelfPlayRunner(ABC):
+    """
+    Self-play in ``num_workers`` processes, each with its own ring buffer of
+    ``capacity`` plies. A worker publishes a game once it is finished and waits
+    while its ring has no room for it, so a slow consumer throttles the workers.
+    """
+
+    @property
+    @abstractmethod
+    def env_class(self) -> Type[BaseEnv]:
+        """
+        Environment played by every worker, built without arguments.
+        """
+        ...
+
+    @property
+    @abstractmethod
+    def trajectories_class(self) -> Type[BaseTrajectories]:
+        """
+        Type returned by :meth:`collect`.
+        """
+        ...
+
+    @staticmethod
+    @abstractmethod
+    def outcome(state: BaseState, last_agent_id: int) -> int:
+        """
+        Result of a game for agent 0 (see :obj:`OutcomeFn`), called in the workers.
+        Subclasses assign a module-level function with ``staticmethod`` so that it
+        can be pickled.
+        """
+        ...
+
+    def __init__(
+        self,
+        agent_fns: Sequence[AgentFactory],
+        num_workers: int = 1,
+        capacity: int = 4096,
+        num_games: Optional[int] = None,
+        max_plies: int = 256,
+        seed: int = 0,
+        start_method: Optional[str] = None,
+    ) -> None:
+        """
+        :arg agent_fns:
+            Two agent factories, called as ``agent_fns[agent_id](agent_id, seed)``
+            in every worker. Worker ``i`` passes ``seed + i``. They must be picklable
+            unless the ``fork`` start method is used.
+        :arg num_workers:
+            Number of worker processes.
+        :arg capacity:
+            Plies held by the ring buffer of each worker.
+        :arg num_games:
+            Games played by each worker, or ``None`` to play until :meth:`close`.
+        :arg max_plies:
+            Plies after which an unfinished game is cut off. It must fit in
+            ``capacity``.
+        :arg seed:
+            Base seed of the agents.
+        :arg start_method:
+            :mod:`multiprocessing` start method, the platform default if ``None``.
+        """
+        if len(agent_fns) != 2:
+            raise ValueError(f"invalid number of agents: {len(agent_fns)}")
+        if num_workers <= 0:
+            raise ValueError(f"invalid num_workers: {num_workers}")
+        if not 0 < max_plies <= capacity:
+            raise ValueError(f"invalid max_plies: {max_plies}")
+
+        self.num_workers = num_workers
+        self.capacity = capacity
+        self.record_size = len(self.env_class().initialize_state().to_bytes())
+        """
+        Size in bytes of the position stored with every ply.
+        """
+        slot_dtype = _slot_dtype(self.record_size)
+        context = multiprocessing.get_context(start_method)
+        self._condition = context.Condition()
+        self._stop = context.Event()
+        self._shm = SharedMemory(
+            create=True, size=num_workers * (16 + capacity * slot_dtype.itemsize)
+        )
+        self._counters, self._rings = _views(self._shm, num_workers, capacity, slot_dtype)
+        self._counters[:] = 0
+        self._processes = [
+            context.Process(
+                target=_worker,
+                args=(
+                    worker_id,
+                    num_workers,
+                    self._shm.name,
+                    capacity,
+                    self.env_class,
+                    self.outcome,
+                    slot_dtype,
+                    tuple(agent_fns),
+                    seed,
+                    num_games,
+                    max_plies,
+                    self._condition,
+                    self._stop,
+                ),
+                daemon=True,
+            )
+            for worker_id in range(num_workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+    def _check_workers(self) -> bool:
+        """
+        :returns:
+            Whether any worker is still running.
+        """
+        alive = False
+        for worker_id, process in enumerate(self._processes):
+            if process.exitcode:
+                raise RuntimeError(f"self-play worker {worker_id} exited with code {process.exitcode}")
+            alive |= process.exitcode is None
+        return alive
+
+    def collect(self, block: bool = True, timeout: Optional[float] = None) -> BaseTrajectories:
+        """
+        Take every published ply out of the ring buffers.
+        :arg block:
+            Whether to wait until at least one game is published.
+        :arg timeout:
+            Longest wait in seconds, unbounded if ``None``.
+        :returns:
+            :obj:`trajectories_class`, empty if nothing was published in time or
+            every worker has finished and every ply was collected.
+        """
+        if self._shm is None:
+            raise ValueError("runner is closed")
+        counters = self._counters
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while block and (counters[:, 0] == counters[:, 1]).all():
+                if not self._check_workers():
+                    break
+                wait = 0.1
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                    if wait <= 0:
+                        break
+                self._condition.wait(wait)
+            written = counters[:, 0].copy()
+        read = counters[:, 1]
+
+        parts = []
+        for worker_id in range(self.num_workers):
+            count = int(written[worker_id] - read[worker_id])
+            offset = int(read[worker_id]) % self.capacity
+            # At most two contiguous runs, split where the ring wraps.
+            head = min(count, self.capacity - offset)
+            parts.append(self._rings[worker_id, offset:offset + head])
+            parts.append(self._rings[worker_id, :count - head])
+        slots = np.concatenate(parts)
+
+        with self._condition:
+            counters[:, 1] = written
+            self._condition.notify_all()
+        return self.trajectories_class.from_slots(slots)
+
+    def __iter__(self) -> Iterator[BaseTrajectories]:
+        """
+        Collect until every worker has finished.
+        """
+        while True:
+            trajectories = self.collect()
+            if not len(trajectories):
+                return
+            yield trajectories
+
+    def close(self) -> None:
+        """
+        Stop the workers and release the shared memory. Unpublished games are lost.
+        """
+        if self._shm is None:
+            return
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        for process in self._processes:
+            process.join()
+        self._counters = self._rings = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self) -> BaseSelfPlayRunner:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,127 @@
+# Zobrist key generation and the transposition table shared by the Quoridor,
+# Puoribor and Othello kernels. Included by each ``cythonfn.pyx``, which provides
+# ``u64``, ``calloc``, ``free`` and ``memset``.
+
+cdef struct TableEntry:
+    u64 key
+    int depth
+    bint used
+
+cdef inline u64 _splitmix64(u64 *state) noexcept nogil:
+    cdef u64 z
+    state[0] += 0x9E3779B97F4A7C15ULL
+    z = state[0]
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL
+    return z ^ (z >> 31)
+
+
+cdef class TranspositionTable:
+    """
+    ``TranspositionTable`` maps Zobrist hashes to search results in a fixed number
+    of slots. Slots are grouped in buckets of two: the first keeps the entry
+    searched to the greatest depth, the second is always replaced.
+    """
+
+    cdef TableEntry *entries
+    cdef list values
+    cdef u64 bucket_mask
+    cdef readonly Py_ssize_t capacity
+    cdef Py_ssize_t size
+
+    def __cinit__(self, Py_ssize_t capacity = 1 << 16):
+        """
+        :arg capacity:
+            Number of slots, rounded up to a power of two.
+        """
+        cdef Py_ssize_t buckets = 1
+        if capacity < 2:
+            raise ValueError(f"invalid capacity: {capacity}")
+        while 2 * buckets < capacity:
+            buckets *= 2
+        self.capacity = 2 * buckets
+        self.bucket_mask = buckets - 1
+        self.entries = <TableEntry *> calloc(self.capacity, sizeof(TableEntry))
+        if self.entries == NULL:
+            raise MemoryError()
+        self.values = [None] * self.capacity
+        self.size = 0
+
+    def __dealloc__(self):
+        free(self.entries)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    cdef Py_ssize_t _find(self, u64 key):
+        cdef Py_ssize_t slot = 2 * <Py_ssize_t> (key & self.bucket_mask)
+        if self.entries[slot].used and self.entries[slot].key == key:
+            return slot
+        if self.entries[slot + 1].used and self.entries[slot + 1].key == key:
+            return slot + 1
+        return -1
+
+    def lookup(self, key, default = None):
+        """
+        Return the value stored for ``key``, or ``default`` if it was never stored
+        or has been replaced.
+        """
+        cdef Py_ssize_t slot = self._find(key)
+        if slot < 0:
+            return default
+        return self.values[slot]
+
+    def depth(self, key):
+        """
+        Return the depth stored for ``key``, or -1 if it is not in the table.
+        """
+        cdef Py_ssize_t slot = self._find(key)
+        if slot < 0:
+            return -1
+        return self.entries[slot].depth
+
+    def store(self, key, value, int depth = 0):
+        """
+        Store ``value`` for ``key``. An entry of the same key is overwritten; the
+        deepest entry of the bucket is only replaced by an entry at least as deep.
+        """
+        cdef u64 k = key
+        cdef Py_ssize_t slot = 2 * <Py_ssize_t> (k & self.bucket_mask)
+        cdef TableEntry *first = &self.entries[slot]
+        cdef TableEntry *second = &self.entries[slot + 1]
+
+        if not first.used or first.key == k or depth >= first.depth:
+            if first.used and first.key != k:
+                # Demote the previous deepest entry to the always-replace slot.
+                if not second.used:
+                    self.size += 1
+                second[0] = first[0]
+                self.values[slot + 1] = self.values[slot]
+            elif second.used and second.key == k:
+                second.used = False
+                self.values[slot + 1] = None
+                self.size -= 1
+            if not first.used:
+                self.size += 1
+            first.key = k
+            first.depth = depth
+            first.used = True
+            self.values[slot] = value
+        else:
+            if not second.used:
+                self.size += 1
+            second.key = k
+            second.depth = depth
+            second.used = True
+            self.values[slot + 1] = value
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        memset(self.entries, 0, self.capacity * sizeof(TableEntry))
+        self.values = [None] * self.capacity
+        self.size = 0
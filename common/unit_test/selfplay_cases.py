@@ -0,0 +1,101 @@
+"""
+Test cases of :class:`common.selfplay.BaseSelfPlayRunner`, run against every game
+by ``<game>/unit_test/selfplay_unittest.py``.
+"""
+
+from functools import partial
+
+import numpy as np
+
+from fights.base import BaseAgent
+
+from common.selfplay import BaseSelfPlayRunner, BaseTrajectories, _slot_dtype
+
+class RandomAgent(BaseAgent):
+    env_id = ("random", 0)  # type: ignore
+
+    def __init__(self, agent_id: int, seed: int = 0, env_class=None) -> None:
+        self.agent_id = agent_id  # type: ignore
+        self._rng = np.random.default_rng(seed)
+        self._env = env_class()
+
+    def __call__(self, state):
+        idx = self._rng.choice(np.flatnonzero(self._env.legal_mask_flat(state, self.agent_id)))
+        return self._env.decode_action(int(idx))
+
+class SelfPlayRunnerCases:
+    """
+    Mixed into a :class:`unittest.TestCase` that sets ``runner_class`` and
+    defines ``expected_outcome(state, num_plies)`` for a finished game.
+    """
+
+    runner_class = None
+
+    def setUp(self):
+        self.env = self.runner_class.env_class()
+        agent = partial(RandomAgent, env_class=self.runner_class.env_class)
+        self.agent_fns = (agent, agent)
+
+    def test_arguments(self):
+        self.assertRaisesRegex(
+            ValueError, "invalid number of agents", lambda: self.runner_class(self.agent_fns[:1])
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "invalid num_workers",
+            lambda: self.runner_class(self.agent_fns, num_workers=0),
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "invalid max_plies",
+            lambda: self.runner_class(self.agent_fns, capacity=64, max_plies=65),
+        )
+
+    def test_abstract(self):
+        class NoOutcome(BaseSelfPlayRunner):
+            env_class = self.runner_class.env_class
+            trajectories_class = self.runner_class.trajectories_class
+
+        self.assertRaisesRegex(TypeError, "outcome", lambda: NoOutcome(self.agent_fns))
+        slots = np.zeros((0,), dtype=_slot_dtype(1))
+        self.assertRaisesRegex(TypeError, "states", lambda: BaseTrajectories.from_slots(slots))
+
+    def test_trajectories(self):
+        env = self.env
+        # Games are longer than half the ring, so the ring wraps.
+        with self.runner_class(
+            self.agent_fns, num_workers=2, capacity=160, num_games=3, max_plies=120
+        ) as runner:
+            batches = list(runner)
+        self.assertTrue(all(isinstance(batch, self.runner_class.trajectories_class) for batch in batches))
+        game_ids = np.concatenate([batch.game_ids for batch in batches])
+        records = np.concatenate([batch.records for batch in batches])
+        actions = np.concatenate([batch.actions for batch in batches])
+        outcomes = np.concatenate([batch.outcomes for batch in batches])
+        self.assertEqual(sorted(set(game_ids.tolist())), list(range(6)))
+        self.assertEqual(records.shape[1], runner.record_size)
+
+        for game_id in range(6):
+            plies = np.flatnonzero(game_ids == game_id)
+            state = env.initialize_state()
+            for ply, index in enumerate(plies):
+                self.assertEqual(records[index].tobytes(), state.to_bytes())
+                state = env.step(state, ply % 2, env.decode_action(int(actions[index])))
+            if state.done:
+                expected = self.expected_outcome(state, len(plies))
+            else:
+                self.assertEqual(len(plies), 120)
+                expected = 0
+            np.testing.assert_array_equal(outcomes[plies], expected)
+
+        states = batches[0].states()
+        initial_board = env.initialize_state().board
+        self.assertEqual(states[0].shape, (len(batches[0]),) + initial_board.shape)
+        np.testing.assert_array_equal(states[0][0], initial_board)
+
+    def test_close(self):
+        runner = self.runner_class(self.agent_fns, capacity=64, max_plies=64)
+        self.assertGreater(len(runner.collect()), 0)
+        runner.close()
+        runner.close()
+        self.assertRaisesRegex(ValueError, "runner is closed", runner.collect)
@@ -0,0 +1,87 @@
+"""
+Test cases of :class:`common.vec_env.BaseVecEnv`, run against every game by
+``<game>/unit_test/vec_env_unittest.py``.
+"""
+
+import numpy as np
+
+from common.vec_env import BaseVecEnv
+
+class VecEnvCases:
+    """
+    Mixed into a :class:`unittest.TestCase` that sets ``vec_env_class`` and
+    defines ``expected_reward(state, agent_id)`` for the move that ended a game.
+    """
+
+    vec_env_class = None
+
+    def setUp(self):
+        self.env = self.vec_env_class.env_class()
+        self.vec_env = self.vec_env_class(8)
+
+    def test_reset(self):
+        self.assertRaisesRegex(ValueError, "invalid num_envs", lambda: self.vec_env_class(0))
+        obs = self.vec_env.reset()
+        self.assertIs(obs, self.vec_env.obs)
+        initial_state = self.env.initialize_state()
+        board_size = self.env.board_size
+        self.assertEqual(obs.shape[0], 8)
+        self.assertEqual(obs.shape[2:], (board_size, board_size))
+        for i in range(8):
+            np.testing.assert_array_equal(obs[i], initial_state.perspective(0))
+            np.testing.assert_array_equal(
+                self.vec_env.legal_masks[i], self.env.legal_mask_flat(initial_state, 0)
+            )
+        np.testing.assert_array_equal(self.vec_env.agent_ids, 0)
+
+    def test_abstract(self):
+        class NoReward(BaseVecEnv):
+            env_class = self.vec_env_class.env_class
+
+        self.assertRaisesRegex(TypeError, "_reward", lambda: NoReward(8))
+
+    def test_step(self):
+        rng = np.random.default_rng(0)
+        states = [self.env.initialize_state() for _ in range(8)]
+        agent_ids = [0] * 8
+        finished = 0
+        for _ in range(400):
+            actions = np.array(
+                [rng.choice(np.flatnonzero(mask)) for mask in self.vec_env.legal_masks]
+            )
+            obs, rewards, dones, legal_masks = self.vec_env.step(actions)
+            self.assertIs(legal_masks, self.vec_env.legal_masks)
+            for i in range(8):
+                state = self.env.step_index(states[i], agent_ids[i], int(actions[i]))
+                self.assertEqual(dones[i], state.done)
+                if state.done:
+                    finished += 1
+                    self.assertEqual(rewards[i], self.expected_reward(state, agent_ids[i]))
+                    states[i], agent_ids[i] = self.env.initialize_state(), 0
+                else:
+                    self.assertEqual(rewards[i], 0)
+                    states[i], agent_ids[i] = state, 1 - agent_ids[i]
+                self.assertEqual(self.vec_env.agent_ids[i], agent_ids[i])
+                np.testing.assert_array_equal(obs[i], states[i].perspective(agent_ids[i]))
+                np.testing.assert_array_equal(
+                    legal_masks[i], self.env.legal_mask_flat(states[i], agent_ids[i])
+                )
+        self.assertGreater(finished, 0)
+
+    def test_invalid_actions(self):
+        self.assertRaisesRegex(
+            ValueError, "invalid actions shape", lambda: self.vec_env.step(np.zeros((7,), dtype=int))
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "invalid action index",
+            lambda: self.vec_env.step(np.full((8,), self.env.num_actions)),
+        )
+        legal_mask = self.vec_env.legal_masks[0]
+        actions = np.full((8,), np.flatnonzero(legal_mask)[0])
+        actions[3] = np.flatnonzero(~legal_mask)[0]
+        states = list(self.vec_env.states)
+        self.assertRaisesRegex(
+            ValueError, f"illegal action {actions[3]}: game 3", lambda: self.vec_env.step(actions)
+        )
+        self.assertEqual(self.vec_env.states, states)
@@ -0,0 +1,156 @@
+"""
+Vectorized Environment
+Runs ``N`` independent games behind a Gym-style batched interface, stepping
+each game with ``step_index`` of the game environment and writing observations
+and legal action masks into buffers allocated once.
+
+Every game provides a subclass in ``<game>/new/vec_env.py`` that names its
+environment and the reward of a winning move:
+
+    vec_env = VecEnv(64)
+    obs = vec_env.reset()
+    legal_masks = vec_env.legal_masks
+    while training:
+        obs, rewards, dones, legal_masks = vec_env.step(policy(obs, legal_masks))
+"""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple, Type
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from fights.base import BaseEnv, BaseState
+
+
+class BaseVecEnv(ABC):
+    """
+    ``N`` games stepped together.
+    Agents alternate in every game, starting with agent 0, and a finished game
+    restarts from the initial position within the same :meth:`step`. Actions
+    are flat indices (see ``encode_action``) and observations are the
+    ``perspective`` of the agent to move.
+
+    The arrays returned by :meth:`reset` and :meth:`step` are the buffers of the
+    environment and are overwritten by the next call; copy them to keep them.
+    """
+
+    @property
+    @abstractmethod
+    def env_class(self) -> Type[BaseEnv]:
+        """
+        Environment built when none is given, without arguments.
+        """
+        ...
+
+    def __init__(self, num_envs: int, env: Optional[BaseEnv] = None) -> None:
+        """
+        :arg num_envs:
+            Number of games ``N``.
+        :arg env:
+            Environment stepping every game, a new :obj:`env_class` if ``None``.
+        """
+        if num_envs <= 0:
+            raise ValueError(f"invalid num_envs: {num_envs}")
+        self.num_envs = num_envs
+        self.env = self.env_class() if env is None else env
+        self._initial_state = self.env.initialize_state()
+        self._initial_obs = np.array(self._initial_state.perspective(0))
+        self._initial_legal_mask = self.env.legal_mask_flat(self._initial_state, 0).copy()
+
+        self.states: List[BaseState] = [self._initial_state] * num_envs
+        """
+        Current state of each game.
+        """
+        self.agent_ids = np.zeros((num_envs,), dtype=np.intc)
+        """
+        Array of shape ``(N,)`` holding the agent to move in each game.
+        """
+        self.obs = np.empty((num_envs,) + self._initial_obs.shape, dtype=self._initial_obs.dtype)
+        """
+        Array of shape ``(N, C, board_size, board_size)`` holding the perspective
+        of the agent to move.
+        """
+        self.rewards = np.zeros((num_envs,), dtype=np.float32)
+        """
+        Array of shape ``(N,)`` holding the reward of the agent who moved last.
+        """
+        self.dones = np.zeros((num_envs,), dtype=np.bool_)
+        """
+        Array of shape ``(N,)`` marking games that ended on the last step.
+        """
+        self.legal_masks = np.empty((num_envs, self.env.num_actions), dtype=np.bool_)
+        """
+        Array of shape ``(N, num_actions)`` holding the flat legal action mask of
+        the agent to move.
+        """
+        self._index = np.arange(num_envs)
+        self.reset()
+
+    @abstractmethod
+    def _reward(self, state: BaseState, agent_id: int) -> float:
+        """
+        Reward of ``agent_id``, whose move ended the game in ``state``.
+        """
+        ...
+
+    def reset(self) -> NDArray:
+        """
+        Restart every game from the initial position.
+        :returns:
+            :obj:`obs`.
+        """
+        for i in range(self.num_envs):
+            self.states[i] = self._initial_state
+        self.agent_ids[:] = 0
+        self.obs[:] = self._initial_obs
+        self.rewards[:] = 0
+        self.dones[:] = False
+        self.legal_masks[:] = self._initial_legal_mask
+        return self.obs
+
+    def step(
+        self, actions: ArrayLike
+    ) -> Tuple[NDArray, NDArray[np.float32], NDArray[np.bool_], NDArray[np.bool_]]:
+        """
+        Take one action in every game for its agent to move.
+        :arg actions:
+            Flat action indices of shape ``(N,)``. Every game is checked against
+            :obj:`legal_masks` before any game is stepped.
+        :returns:
+            A tuple of ``(obs, rewards, dones, legal_masks)``. ``rewards`` is
+            :meth:`_reward` of the agent whose move ended the game and ``0``
+            otherwise. Games with ``dones`` set are already restarted, so their
+            ``obs`` and ``legal_masks`` are those of agent 0 in a new game.
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_envs,):
+            raise ValueError(f"invalid actions shape: {actions.shape}")
+        invalid = (actions < 0) | (actions >= self.legal_masks.shape[1])
+        if invalid.any():
+            raise ValueError(f"invalid action index: {actions[invalid][0]}")
+        illegal = ~self.legal_masks[self._index, actions]
+        if illegal.any():
+            game = np.flatnonzero(illegal)[0]
+            raise ValueError(f"illegal action {actions[game]}: game {game}")
+
+        env = self.env
+        for i, (agent_id, idx) in enumerate(zip(self.agent_ids.tolist(), actions.tolist())):
+            state = env.step_index(self.states[i], agent_id, idx)
+            if state.done:
+                self.rewards[i] = self._reward(state, agent_id)
+                self.dones[i] = True
+                self.states[i] = self._initial_state
+                self.agent_ids[i] = 0
+                self.obs[i] = self._initial_obs
+                self.legal_masks[i] = self._initial_legal_mask
+            else:
+                self.rewards[i] = 0
+                self.dones[i] = False
+                self.states[i] = state
+                self.agent_ids[i] = 1 - agent_id
+                self.obs[i] = state.perspective(1 - agent_id)
+                self.legal_masks[i] = env.legal_mask_flat(state, 1 - agent_id)
+        return self.obs, self.rewards, self.dones, self.legal_masks
@@ -0,0 +1,118 @@
+"""
+Othello Move Generation Perft
+Counts the leaf nodes of the legal-move tree below fixed positions with both the
+''pre'' and ''new'' environments, checks them against known node counts and
+reports nodes/sec per backend.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+import numpy as np
+import time
+
+from pre import pre_env
+from new import new_env
+
+KNOWN_POSITIONS = {
+    "initial": ([], [4, 12, 56, 244, 1396, 8200, 55092, 390216]),
+    "midgame": (
+        [[5, 4], [5, 3], [5, 2], [6, 3], [6, 2], [6, 1], [7, 2], [3, 5], [2, 3], [3, 2],
+         [2, 6], [7, 3]],
+        [11, 115, 1143, 11870, 122274, 1304014],
+    ),
+    "endgame": (
+        [[4, 5], [5, 5], [2, 3], [4, 6], [6, 6], [6, 5], [6, 4], [1, 2], [1, 3], [1, 4],
+         [4, 7], [3, 7], [0, 5], [7, 5], [0, 3], [7, 7], [2, 1], [5, 3], [6, 2], [5, 6],
+         [2, 7], [2, 2], [7, 4], [6, 7], [6, 3], [7, 1], [3, 1], [0, 1], [1, 1], [7, 3],
+         [3, 5], [2, 5], [3, 2], [0, 0], [3, 6], [2, 4], [7, 6], [4, 0], [7, 2], [0, 2],
+         [7, 0], [1, 5], [5, 1], [3, 0], [2, 6], [4, 1], [0, 4], [5, 4], [2, 0], [0, 6],
+         [1, 6], [5, 7], [4, 2], [5, 2]],
+        [3, 14, 26, 67, 90, 99, 41, 7],
+    ),
+}
+"""
+Actions played from the initial position, starting with agent 0, and the known
+node counts for depth 1, 2, ... from the resulting position.
+"""
+
+BACKENDS = {
+    "pre": (pre_env.OthelloEnv, 6),
+    "new": (new_env.OthelloEnv, 8),
+}
+"""
+Environment class of each backend and the deepest depth checked with it.
+"""
+
+
+def legal_actions(env, state, agent_id: int):
+    # Both environments keep legal actions in the state; the pass flag is [3, 3].
+    return np.argwhere(state.legal_actions[agent_id])
+
+
+def perft(state, agent_id: int, depth: int, env=None) -> int:
+    """
+    Count the positions exactly ''depth'' plies below ''state''. Agents alternate
+    every ply and a finished game has no children.
+    """
+    if env is None:
+        env = new_env.OthelloEnv()
+    if depth == 0:
+        return 1
+    if state.done:
+        return 0
+    actions = legal_actions(env, state, agent_id)
+    if depth == 1:
+        return len(actions)
+    return sum(
+        perft(env.step(state, agent_id, action), 1 - agent_id, depth - 1, env)
+        for action in actions
+    )
+
+
+def known_position(env, name: str):
+    actions, counts = KNOWN_POSITIONS[name]
+    state = env.initialize_state()
+    if isinstance(env, pre_env.OthelloEnv):
+        # The original kernels take C ''int'' arrays.
+        state = pre_env.OthelloState(
+            board=state.board.astype(np.intc),
+            legal_actions=state.legal_actions.astype(np.intc),
+            reward=state.reward,
+            done=state.done,
+        )
+    for ply, action in enumerate(actions):
+        state = env.step(state, ply % 2, action)
+    return state, len(actions) % 2, counts
+
+
+def run(backend: str) -> bool:
+    """
+    Check every known position up to the backend's depth and print nodes/sec.
+    :returns:
+        ''True'' if every count matches.
+    """
+    env_class, max_depth = BACKENDS[backend]
+    env = env_class()
+    matched = True
+    nodes = 0
+    elapsed = 0.0
+    for name in KNOWN_POSITIONS:
+        state, agent_id, counts = known_position(env, name)
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            start = time.perf_counter()
+            count = perft(state, agent_id, depth, env)
+            elapsed += time.perf_counter() - start
+            nodes += count
+            matched &= count == expected
+            status = "ok" if count == expected else f"MISMATCH (expected {expected})"
+            print(f"{backend} {name} depth {depth}: {count} {status}")
+    print(f"{backend}: {nodes / elapsed:.0f} nodes/sec")
+    return matched
+
+if __name__ == "__main__":
+
+    matched = run("pre")
+    matched &= run("new")
+    sys.exit(0 if matched else 1)
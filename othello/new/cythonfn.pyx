@@ -2,6 +2,34 @@
 
 import numpy as np
 cimport numpy as np
+from libc.stdlib cimport calloc, free
+from libc.string cimport memset
+
+# Element type of boards and legal action arrays (``BOARD_DTYPE``).
+ctypedef unsigned char cell_t
+ctypedef unsigned long long u64
+
+BOARD_DTYPE = np.uint8
+
+cdef extern from *:
+    int __builtin_popcountll(unsigned long long) nogil
+    int __builtin_ctzll(unsigned long long) nogil
+    unsigned long long __builtin_bswap64(unsigned long long) nogil
+
+cdef enum:
+    # Stones are kept as 64-bit masks with bit ``r * 8 + c``.
+    BOARD_SIZE = 8
+    BOARD_CELLS = BOARD_SIZE * BOARD_SIZE
+
+cdef u64 NOT_COLUMN_0 = 0xFEFEFEFEFEFEFEFEULL
+cdef u64 NOT_COLUMN_7 = 0x7F7F7F7F7F7F7F7FULL
+
+include "../../common/transposition.pxi"
+
+cdef int _check_board_size(int board_size) except -1:
+    if board_size != BOARD_SIZE:
+        raise ValueError(f"unsupported board_size: {board_size}")
+    return 0
 
 def fast_step(
     pre_board,
@@ -9,23 +37,36 @@ def fast_step(
     int agent_id,
     int action_r,
     int action_c,
-    int board_size
+    int board_size,
+    pre_hash = None,
+    pre_mobility = None
 ):
+    """
+    Put a stone of ``agent_id`` on ``(action_r, action_c)``, or pass with ``(3, 3)``.
+    Only the placed and flipped stones are written into the copied board; the
+    legal moves of both agents are generated once, after the move, and
+    ``legal_actions`` is rebuilt from them. A pass leaves the board unchanged, so
+    it is checked against ``pre_mobility`` and returns a copy of
+    ``pre_legal_actions``; without ``pre_mobility`` the moves are generated from
+    ``pre_board``.
+    :returns:
+        A tuple of ``(board, legal_actions, reward0, reward1, done, hash,
+        mobility0, mobility1)`` where ``mobility`` is the number of squares each
+        agent can put a stone on.
+    """
 
-    board = np.copy(pre_board)
-    cdef int [:,:,:] board_view = board
-    legal_actions = np.copy(pre_legal_actions)
-    cdef int [:,:,:] pre_legal_actions_view = pre_legal_actions
-    cdef int [:,:,:] legal_actions_view = legal_actions
+    cdef cell_t [:,:,:] pre_board_view = pre_board
 
     cdef int reward[2]
     cdef int done
+    cdef int mobility[2]
+    cdef u64 stones[2]
+    cdef u64 moves[2]
+    cdef u64 placed, flipped, changed
+    cdef int square
+    cdef u64 hash = 0
 
-    cdef int i, j, k
-    cdef int directions[8][2]
-    cdef int flag, flipped_something
-    cdef int now_r, now_c
-    cdef int has_action0, has_action1
+    _check_board_size(board_size)
 
     reward[0] = 0
     reward[1] = 0
@@ -35,129 +76,802 @@ def fast_step(
         raise ValueError(f"out of board: {(action_r, action_c)}")
     if not 0 <= agent_id <= 1:
         raise ValueError(f"invalid agent_id: {agent_id}")
-    
+
     if action_r == 3 and action_c == 3:
-        if legal_actions_view[agent_id, 3, 3]:
-            return (board, legal_actions, reward[0], reward[1], done)
+        if pre_mobility is None:
+            stones[0] = _board_bits(pre_board_view, 0)
+            stones[1] = _board_bits(pre_board_view, 1)
+            mobility[0] = __builtin_popcountll(_legal_moves(stones[0], stones[1]))
+            mobility[1] = __builtin_popcountll(_legal_moves(stones[1], stones[0]))
         else:
+            mobility[0] = pre_mobility[0]
+            mobility[1] = pre_mobility[1]
+        if mobility[agent_id] != 0:
             raise ValueError("cannot skip if there is possible action")
+        if pre_hash is None:
+            hash = _zobrist_hash(_board_bits(pre_board_view, 0), _board_bits(pre_board_view, 1))
+        else:
+            hash = <u64> pre_hash
+        return (
+            pre_board.copy(),
+            pre_legal_actions.copy(),
+            reward[0],
+            reward[1],
+            done,
+            hash,
+            mobility[0],
+            mobility[1],
+        )
 
-    if board_view[1-agent_id, action_r, action_c]:
+    if pre_board_view[1-agent_id, action_r, action_c]:
         raise ValueError("cannot put a stone on opponent's stone")
-    if board_view[agent_id, action_r, action_c]:
+    if pre_board_view[agent_id, action_r, action_c]:
         raise ValueError("cannot put a stone on another stone")
 
-    directions[0][:] = [1, 1]
-    directions[1][:] = [1, 0]
-    directions[2][:] = [1, -1]
-    directions[3][:] = [0, -1]
-    directions[4][:] = [-1, -1]
-    directions[5][:] = [-1, 0]
-    directions[6][:] = [-1, 1]
-    directions[7][:] = [0, 1]
+    stones[0] = _board_bits(pre_board_view, 0)
+    stones[1] = _board_bits(pre_board_view, 1)
+    placed = 1ULL << (action_r * BOARD_SIZE + action_c)
+    flipped = _flips(stones[agent_id], stones[1-agent_id], placed)
+    if not flipped:
+        raise ValueError("There is no stone to flip")
+
+    stones[agent_id] |= placed | flipped
+    stones[1-agent_id] &= ~flipped
 
+    board = pre_board.copy()
+    cdef cell_t [:,:,:] board_view = board
     board_view[agent_id, action_r, action_c] = 1
+    changed = flipped
+    while changed:
+        square = __builtin_ctzll(changed)
+        changed &= changed - 1
+        board_view[agent_id, square // BOARD_SIZE, square % BOARD_SIZE] = 1
+        board_view[1-agent_id, square // BOARD_SIZE, square % BOARD_SIZE] = 0
 
-    flipped_something = 0
-    for i in range(8):
-        flag = 0
-        now_r = action_r
-        now_c = action_c
-        for j in range(board_size):
-            now_r += directions[i][0]
-            now_c += directions[i][1]
-            if not _check_in_range(now_r, now_c, board_size):
-                break
-            if board_view[1-agent_id, now_r, now_c]:
-                flag = 1
-            elif board_view[agent_id, now_r, now_c]:
-                if flag:
-                    flipped_something = 1
-                    now_r = action_r
-                    now_c = action_c
-                    for k in range(j):
-                        now_r += directions[i][0]
-                        now_c += directions[i][1]
-                        board_view[agent_id, now_r, now_c] = 1
-                        board_view[1-agent_id, now_r, now_c] = 0
-                    break
-                else:
-                    break
-            else:
-                break
-    if not flipped_something:
-        raise ValueError("There is no stone to flip")
-    
-    for i in range(board_size):
-        for j in range(board_size):
-            if board_view[0, i, j] or board_view[1, i, j]:
-                legal_actions_view[0, i, j] = 0
-                legal_actions_view[1, i, j] = 0
-            else:
-                legal_actions_view[0, i, j] = is_flippable(board_view, 0, i, j, board_size, directions)
-                legal_actions_view[1, i, j] = is_flippable(board_view, 1, i, j, board_size, directions)
-
-    has_action0 = 0
-    has_action1 = 0
-    for i in range(board_size):
-        for j in range(board_size):
-            if legal_actions_view[0, i, j]:
-                has_action0 = 1
-            if legal_actions_view[1, i, j]:
-                has_action1 = 1
-
-    if has_action0 == 0:
-        legal_actions_view[0, 3, 3] = 1
-    if has_action1 == 0:
-        legal_actions_view[1, 3, 3] = 1
-
-    if has_action0 == 0 and has_action1 == 0:
+    if pre_hash is None:
+        hash = _zobrist_hash(stones[0], stones[1])
+    else:
+        hash = <u64> pre_hash ^ _zobrist_stones[agent_id][action_r * BOARD_SIZE + action_c]
+        changed = flipped
+        while changed:
+            hash ^= _zobrist_flips[__builtin_ctzll(changed)]
+            changed &= changed - 1
+
+    moves[0] = _legal_moves(stones[0], stones[1])
+    moves[1] = _legal_moves(stones[1], stones[0])
+
+    # (3, 3) is never empty, so it only ever holds the pass flag.
+    legal_actions = np.empty((2, BOARD_SIZE, BOARD_SIZE), dtype=BOARD_DTYPE)
+    cdef cell_t [:,:,:] legal_actions_view = legal_actions
+    _write_bits(legal_actions_view, 0, moves[0])
+    _write_bits(legal_actions_view, 1, moves[1])
+    legal_actions_view[0, 3, 3] = moves[0] == 0
+    legal_actions_view[1, 3, 3] = moves[1] == 0
+
+    if moves[0] == 0 and moves[1] == 0:
         done = True
-        reward[0] = _check_wins(board_view, board_size)
+        reward[0] = _check_wins(stones[0], stones[1])
         reward[1] = -reward[0]
 
-    return (board, legal_actions, reward[0], reward[1], done)
+    return (
+        board,
+        legal_actions,
+        reward[0],
+        reward[1],
+        done,
+        hash,
+        __builtin_popcountll(moves[0]),
+        __builtin_popcountll(moves[1]),
+    )
+
+cdef inline u64 _shift(u64 bits, int direction) noexcept nogil:
+    """
+    Move every stone one step towards ``direction``, dropping stones which would
+    leave the board. Directions are numbered E, W, S, N, SE, SW, NE, NW.
+    """
+    if direction == 0:
+        return (bits << 1) & NOT_COLUMN_0
+    elif direction == 1:
+        return (bits >> 1) & NOT_COLUMN_7
+    elif direction == 2:
+        return bits << 8
+    elif direction == 3:
+        return bits >> 8
+    elif direction == 4:
+        return (bits << 9) & NOT_COLUMN_0
+    elif direction == 5:
+        return (bits << 7) & NOT_COLUMN_7
+    elif direction == 6:
+        return (bits >> 7) & NOT_COLUMN_0
+    return (bits >> 9) & NOT_COLUMN_7
+
+cdef inline u64 _fill(u64 gen, u64 pro, int direction) noexcept nogil:
+    """
+    Kogge-Stone occluded fill: extend ``gen`` towards ``direction`` through the
+    stones of ``pro``.
+    """
+    cdef int amount
+    cdef u64 mask
+    if direction == 0 or direction == 4 or direction == 6:
+        pro &= NOT_COLUMN_0
+    elif direction == 1 or direction == 5 or direction == 7:
+        pro &= NOT_COLUMN_7
+    if direction == 0 or direction == 1:
+        amount = 1
+    elif direction == 2 or direction == 3:
+        amount = 8
+    elif direction == 4 or direction == 7:
+        amount = 9
+    else:
+        amount = 7
+    if direction == 0 or direction == 2 or direction == 4 or direction == 5:
+        gen |= pro & (gen << amount)
+        pro &= pro << amount
+        gen |= pro & (gen << (2 * amount))
+        pro &= pro << (2 * amount)
+        gen |= pro & (gen << (4 * amount))
+    else:
+        gen |= pro & (gen >> amount)
+        pro &= pro >> amount
+        gen |= pro & (gen >> (2 * amount))
+        pro &= pro >> (2 * amount)
+        gen |= pro & (gen >> (4 * amount))
+    return gen
+
+cdef u64 _legal_moves(u64 player, u64 opponent) noexcept nogil:
+    """
+    Squares where ``player`` can put a stone.
+    """
+    cdef u64 empty = ~(player | opponent)
+    cdef u64 moves = 0
+    cdef int direction
+    for direction in range(8):
+        moves |= _shift(_fill(player, opponent, direction) & opponent, direction)
+    return moves & empty
 
-cdef int is_flippable(int [:,:,:] board_view, int agent_id, int r, int c, int board_size, int [8][2] directions):
-    
+cdef u64 _flips(u64 player, u64 opponent, u64 placed) noexcept nogil:
+    """
+    Opponent stones flipped when ``player`` puts a stone on ``placed``.
+    """
+    cdef u64 flipped = 0
+    cdef u64 line
+    cdef int direction
+    for direction in range(8):
+        line = _fill(placed, opponent, direction) & opponent
+        if _shift(line | placed, direction) & player:
+            flipped |= line
+    return flipped
+
+cdef u64 _board_bits(cell_t [:,:,:] board_view, int agent_id) noexcept nogil:
+    cdef u64 bits = 0
+    cdef int i, j
+    for i in range(BOARD_SIZE):
+        for j in range(BOARD_SIZE):
+            if board_view[agent_id, i, j]:
+                bits |= 1ULL << (i * BOARD_SIZE + j)
+    return bits
+
+cdef void _write_bits(cell_t [:,:,:] view, int channel, u64 bits) noexcept nogil:
     cdef int i, j
-    cdef int flag
-    cdef int now_r, now_c
+    for i in range(BOARD_SIZE):
+        for j in range(BOARD_SIZE):
+            view[channel, i, j] = (bits >> (i * BOARD_SIZE + j)) & 1
+
+def zobrist_hash(board, int board_size):
+    """
+    Compute the 64-bit Zobrist hash of a board from scratch. ``fast_step`` updates
+    it incrementally when given the previous hash.
+    """
+    cdef cell_t [:,:,:] board_view = board
+    _check_board_size(board_size)
+    return _zobrist_hash(_board_bits(board_view, 0), _board_bits(board_view, 1))
+
+cdef u64 _zobrist_stones[2][BOARD_CELLS]
+# ``_zobrist_stones[0] ^ _zobrist_stones[1]``, the change caused by flipping a stone.
+cdef u64 _zobrist_flips[BOARD_CELLS]
+
+cdef void _init_zobrist() noexcept nogil:
+    cdef u64 seed = 0x4F7468656C6C6F00ULL
+    cdef int agent_id, square
+    for agent_id in range(2):
+        for square in range(BOARD_CELLS):
+            _zobrist_stones[agent_id][square] = _splitmix64(&seed)
+    for square in range(BOARD_CELLS):
+        _zobrist_flips[square] = _zobrist_stones[0][square] ^ _zobrist_stones[1][square]
 
+_init_zobrist()
+
+cdef u64 _zobrist_hash(u64 black, u64 white) noexcept nogil:
+    cdef u64 hash = 0
+    while black:
+        hash ^= _zobrist_stones[0][__builtin_ctzll(black)]
+        black &= black - 1
+    while white:
+        hash ^= _zobrist_stones[1][__builtin_ctzll(white)]
+        white &= white - 1
+    return hash
+
+cdef enum:
+    STATE_VERSION = 1
+    STATE_RECORD_SIZE = 48
+
+STATE_FORMAT_VERSION = STATE_VERSION
+"""
+Version byte leading every record written by :func:`pack_state`.
+"""
+
+def state_record_size(int board_size):
+    """
+    Size in bytes of every record written by :func:`pack_state`.
+    """
+    _check_board_size(board_size)
+    return STATE_RECORD_SIZE
+
+cdef inline void _store_u64(unsigned char *dest, u64 value) noexcept nogil:
+    cdef int i
     for i in range(8):
-        flag = 0
-        now_r = r
-        now_c = c
-        for j in range(board_size):
-            now_r += directions[i][0]
-            now_c += directions[i][1]
-            if not _check_in_range(now_r, now_c, board_size):
-                break
-            if board_view[1-agent_id, now_r, now_c]:
-                flag = 1
-            elif board_view[agent_id, now_r, now_c]:
-                if flag:
-                    return 1
-                else:
-                    break
-            else:
-                break
+        dest[i] = (value >> (8 * i)) & 0xFF
+
+cdef inline u64 _load_u64(const unsigned char *src) noexcept nogil:
+    cdef u64 value = 0
+    cdef int i
+    for i in range(8):
+        value |= (<u64>src[i]) << (8 * i)
+    return value
+
+cdef void _pack_state(
+    cell_t [:,:,:] board_view,
+    cell_t [:,:,:] legal_actions_view,
+    int reward0,
+    int reward1,
+    bint done,
+    u64 zobrist,
+    unsigned char *record
+) noexcept nogil:
+    cdef u64 black = _board_bits(board_view, 0)
+    cdef u64 white = _board_bits(board_view, 1)
+    memset(record, 0, STATE_RECORD_SIZE)
+    record[0] = STATE_VERSION
+    record[1] = done
+    record[2] = <unsigned char><signed char>reward0
+    record[3] = <unsigned char><signed char>reward1
+    record[4] = __builtin_popcountll(_legal_moves(black, white))
+    record[5] = __builtin_popcountll(_legal_moves(white, black))
+    _store_u64(record + 8, zobrist)
+    _store_u64(record + 16, black)
+    _store_u64(record + 24, white)
+    _store_u64(record + 32, _board_bits(legal_actions_view, 0))
+    _store_u64(record + 40, _board_bits(legal_actions_view, 1))
+
+cdef bint _unpack_state(
+    const unsigned char *record,
+    cell_t [:,:,:] board_view,
+    cell_t [:,:,:] legal_actions_view,
+    int *reward,
+    int *mobility,
+    u64 *zobrist
+) noexcept nogil:
+    reward[0] = <signed char>record[2]
+    reward[1] = <signed char>record[3]
+    mobility[0] = record[4]
+    mobility[1] = record[5]
+    zobrist[0] = _load_u64(record + 8)
+    _write_bits(board_view, 0, _load_u64(record + 16))
+    _write_bits(board_view, 1, _load_u64(record + 24))
+    _write_bits(legal_actions_view, 0, _load_u64(record + 32))
+    _write_bits(legal_actions_view, 1, _load_u64(record + 40))
+    return record[1] & 1
+
+cdef int _check_record(const unsigned char *record) except -1:
+    if record[0] != STATE_VERSION:
+        raise ValueError(f"unsupported state format version: {record[0]}")
     return 0
 
+def pack_state(board, legal_actions, reward, bint done, u64 zobrist):
+    """
+    Encode a position as a fixed-size record of :func:`state_record_size` bytes.
+
+    Layout: format version, flags (bit 0: ``done``), ``reward`` as two signed
+    bytes, the mobility of each agent, two padding bytes, then the little-endian
+    64-bit Zobrist hash, stones of agent 0 and 1 and legal actions of agent 0 and
+    1 as masks with bit ``r * 8 + c``.
+    """
+    cdef cell_t [:,:,:] board_view = board
+    cdef cell_t [:,:,:] legal_actions_view = legal_actions
+    record = bytearray(STATE_RECORD_SIZE)
+    cdef unsigned char [:] record_view = record
+    _pack_state(
+        board_view, legal_actions_view, reward[0], reward[1], done, zobrist, &record_view[0]
+    )
+    return bytes(record)
+
+def unpack_state(data):
+    """
+    Decode a record written by :func:`pack_state`.
+
+    :returns:
+        A tuple of ``(board, legal_actions, reward, done, zobrist, mobility)``.
+    """
+    cdef const unsigned char [:] data_view = data
+    if data_view.shape[0] != STATE_RECORD_SIZE:
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    _check_record(&data_view[0])
+
+    board = np.empty((2, BOARD_SIZE, BOARD_SIZE), dtype=BOARD_DTYPE)
+    legal_actions = np.empty((2, BOARD_SIZE, BOARD_SIZE), dtype=BOARD_DTYPE)
+    cdef int reward[2]
+    cdef int mobility[2]
+    cdef u64 zobrist
+    done = _unpack_state(&data_view[0], board, legal_actions, reward, mobility, &zobrist)
+    return (
+        board,
+        legal_actions,
+        np.array([reward[0], reward[1]]),
+        done,
+        zobrist,
+        (mobility[0], mobility[1]),
+    )
+
+def unpack_states(data, boards, legal_actions, reward, done, zobrist, mobility):
+    """
+    Decode consecutive records written by :func:`pack_state` straight into
+    preallocated arrays. ``data`` is read in place, so it can be a slice of a
+    file mapping or a shared memory block.
+
+    :arg boards:
+        :data:`BOARD_DTYPE` array of shape ``(N, 2, 8, 8)``.
+    :arg legal_actions:
+        :data:`BOARD_DTYPE` array of shape ``(N, 2, 8, 8)``.
+    :arg reward:
+        ``np.intc`` array of shape ``(N, 2)``.
+    :arg done:
+        ``np.bool_`` array of shape ``(N,)``.
+    :arg zobrist:
+        ``np.uint64`` array of shape ``(N,)``.
+    :arg mobility:
+        ``np.intc`` array of shape ``(N, 2)``.
+    :returns:
+        Number of decoded records, which fill the first rows of each array.
+    """
+    cdef const unsigned char [:] data_view = data
+    cdef cell_t [:,:,:,:] boards_view = boards
+    cdef cell_t [:,:,:,:] legal_actions_view = legal_actions
+    cdef int [:,::1] reward_view = reward
+    cdef np.uint8_t [:] done_view = done.view(np.uint8)
+    cdef u64 [:] zobrist_view = zobrist
+    cdef int [:,::1] mobility_view = mobility
+    cdef Py_ssize_t count, index
+    if data_view.shape[0] % STATE_RECORD_SIZE:
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    count = data_view.shape[0] // STATE_RECORD_SIZE
+    if count > min(
+        boards_view.shape[0],
+        legal_actions_view.shape[0],
+        reward_view.shape[0],
+        done_view.shape[0],
+        zobrist_view.shape[0],
+        mobility_view.shape[0],
+    ):
+        raise ValueError(f"too many records for the output arrays: {count}")
+    for index in range(count):
+        _check_record(&data_view[index * STATE_RECORD_SIZE])
+
+    with nogil:
+        for index in range(count):
+            done_view[index] = _unpack_state(
+                &data_view[index * STATE_RECORD_SIZE],
+                boards_view[index],
+                legal_actions_view[index],
+                &reward_view[index, 0],
+                &mobility_view[index, 0],
+                &zobrist_view[index],
+            )
+    return count
+
 cdef int _check_in_range(int pos_r, int pos_c, int bottom_right = 8):
     return (0 <= pos_r < bottom_right and 0 <= pos_c < bottom_right)
 
-cdef int _check_wins(int [:,:,:] board_view, int board_size):
-    cdef int i, j
-    cdef int agent0_cnt = 0, agent1_cnt = 0
-    for i in range(board_size):
-        for j in range(board_size):
-            if board_view[0, i, j]:
-                agent0_cnt += 1
-            elif board_view[1, i, j]:
-                agent1_cnt += 1
+cdef int _check_wins(u64 black, u64 white) noexcept nogil:
+    cdef int agent0_cnt = __builtin_popcountll(black)
+    cdef int agent1_cnt = __builtin_popcountll(white)
     if agent0_cnt > agent1_cnt:
         return 1
     elif agent0_cnt < agent1_cnt:
         return -1
-    return 0
\ No newline at end of file
+    return 0
+
+cdef inline u64 _mirror_horizontal(u64 bits) noexcept nogil:
+    """
+    Map the square ``(r, c)`` to ``(r, 7 - c)``.
+    """
+    bits = ((bits >> 1) & 0x5555555555555555ULL) | ((bits & 0x5555555555555555ULL) << 1)
+    bits = ((bits >> 2) & 0x3333333333333333ULL) | ((bits & 0x3333333333333333ULL) << 2)
+    return ((bits >> 4) & 0x0F0F0F0F0F0F0F0FULL) | ((bits & 0x0F0F0F0F0F0F0F0FULL) << 4)
+
+cdef inline u64 _transpose(u64 bits) noexcept nogil:
+    """
+    Map the square ``(r, c)`` to ``(c, r)``.
+    """
+    cdef u64 t
+    t = 0x0F0F0F0F00000000ULL & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333000033330000ULL & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500550055005500ULL & (bits ^ (bits << 7))
+    return bits ^ t ^ (t >> 7)
+
+cdef u64 _transform(u64 bits, int transform_id) noexcept nogil:
+    """
+    Apply one of the 8 board symmetries: ``transform_id % 4`` counterclockwise
+    quarter turns (as ``np.rot90``), followed by a horizontal mirror if
+    ``transform_id >= 4``.
+    """
+    cdef int i
+    for i in range(transform_id & 3):
+        bits = __builtin_bswap64(_transpose(bits))
+    if transform_id & 4:
+        bits = _mirror_horizontal(bits)
+    return bits
+
+cdef int _canonical_transform(u64 black, u64 white) noexcept nogil:
+    """
+    Transform which maps the position to its smallest ``(black, white)`` image,
+    the lowest id among ties.
+    """
+    cdef int best = 0
+    cdef int transform_id
+    cdef u64 best_black = black
+    cdef u64 best_white = white
+    cdef u64 b, w
+    for transform_id in range(1, 8):
+        b = _transform(black, transform_id)
+        if b > best_black:
+            continue
+        w = _transform(white, transform_id)
+        if b < best_black or w < best_white:
+            best = transform_id
+            best_black = b
+            best_white = w
+    return best
+
+cdef class OthelloBitboard:
+    """
+    ``OthelloBitboard`` stores the stones of both agents as 64-bit masks, where bit
+    ``r * 8 + c`` is set if the square ``(r, c)`` holds a stone.
+    """
+
+    cdef u64 _stones[2]
+
+    def __init__(self, black, white):
+        """
+        :arg black:
+            Mask of agent 0's stones.
+        :arg white:
+            Mask of agent 1's stones.
+        """
+        self._stones[0] = black
+        self._stones[1] = white
+
+    @staticmethod
+    def from_board(board):
+        """
+        Build masks from an ``OthelloState.board`` array.
+        """
+        cdef cell_t [:,:,:] board_view = board
+        cdef OthelloBitboard result = OthelloBitboard.__new__(OthelloBitboard)
+        result._stones[0] = _board_bits(board_view, 0)
+        result._stones[1] = _board_bits(board_view, 1)
+        return result
+
+    def to_board(self):
+        """
+        Expand masks back into an ``OthelloState.board`` array.
+        """
+        board = np.empty((2, BOARD_SIZE, BOARD_SIZE), dtype=BOARD_DTYPE)
+        cdef cell_t [:,:,:] board_view = board
+        _write_bits(board_view, 0, self._stones[0])
+        _write_bits(board_view, 1, self._stones[1])
+        return board
+
+    @property
+    def stones(self):
+        """
+        Tuple of stone masks of agent 0 and agent 1.
+        """
+        return (self._stones[0], self._stones[1])
+
+    def legal_moves(self, int agent_id):
+        """
+        Mask of squares where ``agent_id`` can put a stone.
+        """
+        if not 0 <= agent_id <= 1:
+            raise ValueError(f"invalid agent_id: {agent_id}")
+        return _legal_moves(self._stones[agent_id], self._stones[1-agent_id])
+
+    def mobility(self, int agent_id):
+        """
+        Number of squares where ``agent_id`` can put a stone.
+        """
+        if not 0 <= agent_id <= 1:
+            raise ValueError(f"invalid agent_id: {agent_id}")
+        return __builtin_popcountll(_legal_moves(self._stones[agent_id], self._stones[1-agent_id]))
+
+    def flips(self, int agent_id, int action_r, int action_c):
+        """
+        Mask of stones flipped when ``agent_id`` puts a stone on ``(action_r,
+        action_c)``. Empty if the move is illegal.
+        """
+        if not 0 <= agent_id <= 1:
+            raise ValueError(f"invalid agent_id: {agent_id}")
+        if not _check_in_range(action_r, action_c, BOARD_SIZE):
+            raise ValueError(f"out of board: {(action_r, action_c)}")
+        cdef u64 placed = 1ULL << (action_r * BOARD_SIZE + action_c)
+        if (self._stones[0] | self._stones[1]) & placed:
+            return 0
+        return _flips(self._stones[agent_id], self._stones[1-agent_id], placed)
+
+    def play(self, int agent_id, int action_r, int action_c):
+        """
+        Put a stone of ``agent_id`` on ``(action_r, action_c)``.
+        :returns:
+            A new ``OthelloBitboard`` with the stones flipped.
+        """
+        cdef u64 flipped = self.flips(agent_id, action_r, action_c)
+        cdef u64 placed = 1ULL << (action_r * BOARD_SIZE + action_c)
+        cdef OthelloBitboard result
+        if not flipped:
+            raise ValueError("There is no stone to flip")
+        result = OthelloBitboard.__new__(OthelloBitboard)
+        result._stones[agent_id] = self._stones[agent_id] | placed | flipped
+        result._stones[1-agent_id] = self._stones[1-agent_id] & ~flipped
+        return result
+
+    def transform(self, int transform_id):
+        """
+        Apply a board symmetry (see ``symmetry.transform``).
+        :returns:
+            A new ``OthelloBitboard``.
+        """
+        cdef OthelloBitboard result
+        if not 0 <= transform_id < 8:
+            raise ValueError(f"invalid transform_id: {transform_id}")
+        result = OthelloBitboard.__new__(OthelloBitboard)
+        result._stones[0] = _transform(self._stones[0], transform_id)
+        result._stones[1] = _transform(self._stones[1], transform_id)
+        return result
+
+    def canonical(self):
+        """
+        Pick the canonical representative among the 8 symmetric positions.
+        :returns:
+            A tuple of ``(bitboard, transform_id)`` such that
+            ``self.transform(transform_id) == bitboard``.
+        """
+        cdef int transform_id = _canonical_transform(self._stones[0], self._stones[1])
+        return self.transform(transform_id), transform_id
+
+    def __eq__(self, other):
+        if not isinstance(other, OthelloBitboard):
+            return NotImplemented
+        return self.stones == other.stones
+
+    def __hash__(self):
+        return hash(self.stones)
+
+cdef enum:
+    # Empty squares from which the solver orders moves by opponent mobility and
+    # consults its transposition table. Closer to the end plain parity ordering
+    # is cheaper than the extra move generation.
+    FASTEST_FIRST_EMPTIES = 7
+    ENDGAME_TABLE_EMPTIES = 7
+    MAX_DISC_DIFF = 64
+
+cdef struct EndgameEntry:
+    u64 player
+    u64 opponent
+    signed char lower
+    signed char upper
+    signed char best_square
+
+cdef struct EndgameSolver:
+    EndgameEntry *table
+    u64 table_mask
+    u64 nodes
+
+# The four 4x4 quadrants. A move into a quadrant with an odd number of empty
+# squares tends to give its owner the last move there.
+cdef u64 QUADRANTS[4]
+QUADRANTS[0] = 0x000000000F0F0F0FULL
+QUADRANTS[1] = 0x00000000F0F0F0F0ULL
+QUADRANTS[2] = 0x0F0F0F0F00000000ULL
+QUADRANTS[3] = 0xF0F0F0F000000000ULL
+
+cdef inline u64 _odd_quadrants(u64 empty) noexcept nogil:
+    cdef u64 odd = 0
+    cdef int i
+    for i in range(4):
+        if __builtin_popcountll(empty & QUADRANTS[i]) & 1:
+            odd |= QUADRANTS[i]
+    return odd
+
+cdef inline EndgameEntry *_endgame_entry(EndgameSolver *solver, u64 player, u64 opponent) noexcept nogil:
+    cdef u64 key = player * 0x9E3779B97F4A7C15ULL ^ opponent * 0xC2B2AE3D27D4EB4FULL
+    return &solver.table[(key ^ (key >> 29)) & solver.table_mask]
+
+cdef int _order_moves(u64 player, u64 opponent, u64 moves, int hint, int *squares) noexcept nogil:
+    """
+    Write the squares of ``moves`` into ``squares`` in search order and return
+    their number: ``hint`` first, then by ascending opponent mobility
+    (fastest-first), moves into odd quadrants first among equals.
+    """
+    cdef int keys[BOARD_CELLS]
+    cdef u64 odd = _odd_quadrants(~(player | opponent))
+    cdef u64 placed, flipped
+    cdef int count = 0
+    cdef int i, j, square, key
+    while moves:
+        square = __builtin_ctzll(moves)
+        moves &= moves - 1
+        placed = 1ULL << square
+        if square == hint:
+            key = -1
+        else:
+            flipped = _flips(player, opponent, placed)
+            key = 2 * __builtin_popcountll(
+                _legal_moves(opponent & ~flipped, player | placed | flipped)
+            ) + (0 if odd & placed else 1)
+        i = count
+        while i > 0 and keys[i - 1] > key:
+            keys[i] = keys[i - 1]
+            squares[i] = squares[i - 1]
+            i -= 1
+        keys[i] = key
+        squares[i] = square
+        count += 1
+    return count
+
+cdef int _solve_endgame(
+    EndgameSolver *solver, u64 player, u64 opponent, int alpha, int beta, bint passed
+) noexcept nogil:
+    """
+    Negamax alpha-beta returning the final disc differential of ``player`` with
+    both sides playing perfectly, fail-soft within ``(alpha, beta)``.
+    """
+    cdef u64 empty = ~(player | opponent)
+    cdef u64 moves = _legal_moves(player, opponent)
+    cdef u64 placed, flipped, odd
+    cdef int empties = __builtin_popcountll(empty)
+    cdef int squares[BOARD_CELLS]
+    cdef int count, i, square, score
+    cdef int best = -MAX_DISC_DIFF - 1
+    cdef int best_square = -1
+    cdef int alpha_start
+    cdef EndgameEntry *entry = NULL
+
+    solver.nodes += 1
+
+    if not moves:
+        if passed:
+            return __builtin_popcountll(player) - __builtin_popcountll(opponent)
+        return -_solve_endgame(solver, opponent, player, -beta, -alpha, True)
+
+    if empties == 1:
+        flipped = _flips(player, opponent, moves)
+        return __builtin_popcountll(player | moves | flipped) - __builtin_popcountll(opponent & ~flipped)
+
+    if empties >= ENDGAME_TABLE_EMPTIES:
+        entry = _endgame_entry(solver, player, opponent)
+        if entry.player == player and entry.opponent == opponent:
+            if entry.lower >= beta:
+                return entry.lower
+            if entry.upper <= alpha:
+                return entry.upper
+            if entry.lower == entry.upper:
+                return entry.lower
+            if entry.lower > alpha:
+                alpha = entry.lower
+            if entry.upper < beta:
+                beta = entry.upper
+            best_square = entry.best_square
+    alpha_start = alpha
+
+    if empties >= FASTEST_FIRST_EMPTIES:
+        count = _order_moves(player, opponent, moves, best_square, squares)
+    else:
+        # Parity ordering: odd quadrants first, in square order.
+        odd = _odd_quadrants(empty)
+        count = 0
+        placed = moves & odd
+        while placed:
+            squares[count] = __builtin_ctzll(placed)
+            placed &= placed - 1
+            count += 1
+        placed = moves & ~odd
+        while placed:
+            squares[count] = __builtin_ctzll(placed)
+            placed &= placed - 1
+            count += 1
+
+    for i in range(count):
+        square = squares[i]
+        placed = 1ULL << square
+        flipped = _flips(player, opponent, placed)
+        score = -_solve_endgame(
+            solver, opponent & ~flipped, player | placed | flipped, -beta, -alpha, False
+        )
+        if score > best:
+            best = score
+            best_square = square
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+    if entry != NULL:
+        entry.player = player
+        entry.opponent = opponent
+        entry.best_square = best_square
+        entry.lower = best if best > alpha_start else -MAX_DISC_DIFF
+        entry.upper = best if best < beta else MAX_DISC_DIFF
+    return best
+
+def solve_endgame(black, white, int agent_id, int table_bits = 16):
+    """
+    Solve the position exactly for the agent to move.
+    :arg black, white:
+        Stones of agent 0 and 1 as 64-bit masks.
+    :arg table_bits:
+        Log2 of the number of transposition table entries.
+    :returns:
+        A tuple of ``(score, square, nodes)``: the final disc differential of
+        ``agent_id`` under perfect play, the best square (``r * 8 + c``, or -1 if
+        the agent has to pass) and the number of searched nodes.
+    """
+    cdef EndgameSolver solver
+    cdef u64 stones[2]
+    cdef u64 player, opponent, moves, placed, flipped
+    cdef int squares[BOARD_CELLS]
+    cdef int count, i, score
+    cdef int best = -MAX_DISC_DIFF - 1
+    cdef int best_square = -1
+
+    if not 0 <= agent_id <= 1:
+        raise ValueError(f"invalid agent_id: {agent_id}")
+    if not 0 <= table_bits <= 30:
+        raise ValueError(f"invalid table_bits: {table_bits}")
+    stones[0] = black
+    stones[1] = white
+    if stones[0] & stones[1]:
+        raise ValueError("cannot put a stone on another stone")
+    player = stones[agent_id]
+    opponent = stones[1-agent_id]
+
+    solver.nodes = 0
+    solver.table_mask = (1ULL << table_bits) - 1
+    solver.table = <EndgameEntry *> calloc(solver.table_mask + 1, sizeof(EndgameEntry))
+    if solver.table == NULL:
+        raise MemoryError()
+    try:
+        with nogil:
+            moves = _legal_moves(player, opponent)
+            if not moves:
+                best = _solve_endgame(&solver, player, opponent, -MAX_DISC_DIFF, MAX_DISC_DIFF, False)
+            else:
+                count = _order_moves(player, opponent, moves, -1, squares)
+                for i in range(count):
+                    placed = 1ULL << squares[i]
+                    flipped = _flips(player, opponent, placed)
+                    score = -_solve_endgame(
+                        &solver,
+                        opponent & ~flipped,
+                        player | placed | flipped,
+                        -MAX_DISC_DIFF,
+                        -best,
+                        False,
+                    )
+                    if score > best:
+                        best = score
+                        best_square = squares[i]
+    finally:
+        free(solver.table)
+    return best, best_square, solver.nodes
@@ -0,0 +1,77 @@
+"""
+Othello(Reversi) Endgame Solver
+Perfect play for positions with few empty squares, searched by
+:func:'cythonfn.solve_endgame' on bitboards.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+from . import cythonfn
+from .new_env import OthelloAction, OthelloState
+
+MAX_EMPTIES = 20
+"""
+Default limit of empty squares accepted by :func:'solve'.
+"""
+
+
+@dataclass
+class EndgameResult:
+    """
+    ''EndgameResult'' is the outcome of :func:'solve'.
+    """
+
+    score: int
+    """
+    Final disc differential (own stones minus opponent stones) of the solved
+    agent when both agents play perfectly.
+    """
+
+    action: OthelloAction
+    """
+    Best action in the form of [ 'coordinate_r', 'coordinate_c' ].
+    [3, 3] if the agent has to jump.
+    """
+
+    nodes: int
+    """
+    Number of searched positions.
+    """
+
+
+def solve(
+    state: OthelloState, agent_id: int, max_empties: int = MAX_EMPTIES, table_bits: int = 16
+) -> EndgameResult:
+    """
+    Solve the endgame exactly for the agent to move.
+    :arg state:
+        Current state of the environment.
+    :arg agent_id:
+        ID of the agent to move. (''0'' or ''1'')
+    :arg max_empties:
+        Largest number of empty squares to accept. The search grows exponentially
+        with it.
+    :arg table_bits:
+        Log2 of the number of transposition table entries.
+    :returns:
+        An :obj:'EndgameResult'.
+    """
+    bitboard = state.to_bitboard()
+    black, white = bitboard.stones
+    empties = 64 - bin(black | white).count("1")
+    if empties > max_empties:
+        raise ValueError(f"too many empty squares: {empties}")
+
+    score, square, nodes = cythonfn.solve_endgame(black, white, agent_id, table_bits)
+    if square < 0:
+        action = np.array([3, 3])
+    else:
+        action = np.array([square // 8, square % 8])
+    return EndgameResult(score=score, action=action, nodes=nodes)
@@ -16,7 +16,7 @@ import sys
 from collections import defaultdict
 from collections.abc import Callable
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple
 
 import numpy as np
 from numpy.typing import ArrayLike, NDArray
@@ -32,6 +32,12 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 from . import cythonfn
 
+BOARD_DTYPE = cythonfn.BOARD_DTYPE
+"""
+Compact dtype (''uint8'') of ''board'' and ''legal_actions'' arrays.
+Every kernel in :mod:'cythonfn' expects arrays of this dtype.
+"""
+
 OthelloAction: TypeAlias = ArrayLike
 """
 Alias of :obj:'ArrayLike' to describe the action type.
@@ -46,7 +52,7 @@ class OthelloState(BaseState):
     ''OthelloState'' represents the game state.
     """
 
-    board: NDArray[np.int_]
+    board: NDArray[np.uint8]
     """
     Array of shape ``(C, W, H)``,
     where C is channel index
@@ -56,7 +62,7 @@ class OthelloState(BaseState):
         - ''C = 1'': one-hot encoded stones of agent 1. (white)
     """
 
-    legal_actions: NDArray[np.int_]
+    legal_actions: NDArray[np.uint8]
     """
     Array of shape ''(C, W, H)'',
     where C is channel index
@@ -82,6 +88,20 @@ class OthelloState(BaseState):
     Boolean value indicating wheter the game is done.
     """
 
+    zobrist: Optional[int] = None
+    """
+    64-bit Zobrist hash of ''board'', maintained incrementally by
+    :meth:'OthelloEnv.step'. ''None'' if unknown, in which case the next step
+    computes it from scratch.
+    """
+
+    mobility: Optional[Tuple[int, int]] = None
+    """
+    Number of squares each agent can put a stone on, maintained by
+    :meth:'OthelloEnv.step'. ''0'' means the agent has to pass.
+    ''None'' if unknown.
+    """
+
     def __str__(self) -> str:
         """
         Generate a human-readable string representation of the board.
@@ -133,7 +153,7 @@ class OthelloState(BaseState):
 
         return result
 
-    def perspective(self, agent_id: int) -> NDArray[np.int_]:
+    def perspective(self, agent_id: int) -> NDArray[np.uint8]:
         """
         Return board observed by the agent whose ID is agent_id.
         :arg agent_id:
@@ -155,6 +175,62 @@ class OthelloState(BaseState):
 
         return np.flip(np.rot90(self.board, 2, axes=(1, 2)), axis=0)
 
+    def must_pass(self, agent_id: int) -> bool:
+        """
+        Check whether the agent has no square to put a stone on.
+        :arg agent_id:
+            ID of the agent. (''0'' or ''1'')
+        :returns:
+            ''True'' if the only possible action is the jumping action.
+        """
+        if self.mobility is not None:
+            return self.mobility[agent_id] == 0
+        return bool(self.legal_actions[agent_id, 3, 3])
+
+    def to_bitboard(self) -> cythonfn.OthelloBitboard:
+        """
+        Convert the board to its bitboard representation.
+        :returns:
+            A :obj:'cythonfn.OthelloBitboard' holding the stones of both agents as
+            64-bit masks.
+        """
+        return cythonfn.OthelloBitboard.from_board(self.board)
+
+    def to_compact(self) -> OthelloState:
+        """
+        Convert a state holding ''np.int_'' arrays to :data:'BOARD_DTYPE'.
+        :returns:
+            The state itself if it is already compact, otherwise a converted copy.
+        """
+        if (
+            self.board.dtype == BOARD_DTYPE
+            and self.legal_actions.dtype == BOARD_DTYPE
+        ):
+            return self
+        return OthelloState(
+            board=self.board.astype(BOARD_DTYPE),
+            legal_actions=self.legal_actions.astype(BOARD_DTYPE),
+            reward=self.reward,
+            done=self.done,
+            zobrist=self.zobrist,
+            mobility=self.mobility,
+        )
+
+    def to_legacy(self) -> OthelloState:
+        """
+        Convert the state to the former ''np.int_'' layout.
+        :returns:
+            A copy of the state holding ''np.int_'' arrays.
+        """
+        return OthelloState(
+            board=self.board.astype(np.int_),
+            legal_actions=self.legal_actions.astype(np.int_),
+            reward=self.reward,
+            done=self.done,
+            zobrist=self.zobrist,
+            mobility=self.mobility,
+        )
+
     def to_dict(self) -> dict:
         """
         Serialize state object to dict.
@@ -177,13 +253,81 @@ class OthelloState(BaseState):
         :returns:
             Deserialized ``PuoriborState`` object.
         """
+        board = np.array(serialized["board"], dtype=BOARD_DTYPE)
+        bitboard = cythonfn.OthelloBitboard.from_board(board)
         return OthelloState(
-            board=np.array(serialized["board"]),
-            legal_actions=np.array(serialized["legal_actions"]),
+            board=board,
+            legal_actions=np.array(serialized["legal_actions"], dtype=BOARD_DTYPE),
             done=serialized["done"],
             reward=np.array(serialized["reward"]),
+            zobrist=cythonfn.zobrist_hash(board, board.shape[1]),
+            mobility=(bitboard.mobility(0), bitboard.mobility(1)),
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize state object to a fixed-size binary record.
+        :returns:
+            A record of :func:'cythonfn.state_record_size' bytes, laid out as
+            described in :func:'cythonfn.pack_state'.
+        """
+        state = self.to_compact()
+        zobrist = self.zobrist
+        if zobrist is None:
+            zobrist = cythonfn.zobrist_hash(state.board, state.board.shape[1])
+        return cythonfn.pack_state(
+            state.board, state.legal_actions, self.reward, self.done, zobrist
         )
 
+    @staticmethod
+    def from_bytes(data) -> OthelloState:
+        """
+        Deserialize from a record written by :meth:'to_bytes'.
+        :arg data:
+            A bytes-like object.
+        :returns:
+            Deserialized ''OthelloState'' object.
+        """
+        board, legal_actions, reward, done, zobrist, mobility = cythonfn.unpack_state(data)
+        return OthelloState(
+            board=board,
+            legal_actions=legal_actions,
+            reward=reward,
+            done=done,
+            zobrist=zobrist,
+            mobility=mobility,
+        )
+
+    @staticmethod
+    def from_bytes_batch(
+        data, out: Optional[Tuple[NDArray, ...]] = None
+    ) -> Tuple[NDArray, ...]:
+        """
+        Deserialize concatenated records written by :meth:'to_bytes' into arrays,
+        without creating a state object per record.
+        :arg data:
+            A bytes-like object. It is read in place.
+        :arg out:
+            Optional tuple of preallocated ''(boards, legal_actions, reward, done,
+            zobrist, mobility)'' arrays as accepted by :func:'cythonfn.unpack_states',
+            with room for every record.
+        :returns:
+            The ''(boards, legal_actions, reward, done, zobrist, mobility)'' arrays,
+            trimmed to the number of records. They are views of ''out'' if given.
+        """
+        if out is None:
+            count = len(memoryview(data).cast("B")) // cythonfn.state_record_size(8)
+            out = (
+                np.empty((count, 2, 8, 8), dtype=BOARD_DTYPE),
+                np.empty((count, 2, 8, 8), dtype=BOARD_DTYPE),
+                np.empty((count, 2), dtype=np.intc),
+                np.empty((count,), dtype=np.bool_),
+                np.empty((count,), dtype=np.uint64),
+                np.empty((count, 2), dtype=np.intc),
+            )
+        count = cythonfn.unpack_states(data, *out)
+        return tuple(array[:count] for array in out)
+
 
 class OthelloEnv(BaseEnv[OthelloState, OthelloAction]):
     env_id = ("othello", 0)  # type: ignore
@@ -231,13 +375,24 @@ class OthelloEnv(BaseEnv[OthelloState, OthelloAction]):
         if pre_step_fn is not None:
             pre_step_fn(state, agent_id, action)
 
-        next_information = cythonfn.fast_step(state.board, state.legal_actions, agent_id, action[0], action[1], self.board_size)
+        next_information = cythonfn.fast_step(
+            state.board,
+            state.legal_actions,
+            agent_id,
+            action[0],
+            action[1],
+            self.board_size,
+            state.zobrist,
+            state.mobility,
+        )
 
         next_state = OthelloState(
             board=next_information[0],
             legal_actions=next_information[1],
             reward=np.array([next_information[2], next_information[3]]),
-            done=next_information[4]
+            done=next_information[4],
+            zobrist=next_information[5],
+            mobility=(next_information[6], next_information[7]),
         )
 
         if post_step_fn is not None:
@@ -245,7 +400,89 @@ class OthelloEnv(BaseEnv[OthelloState, OthelloAction]):
 
         return next_state
 
-    def _check_wins(self, board: NDArray[np.int_]) -> NDArray[np.int_]:
+    @property
+    def num_actions(self) -> int:
+        """
+        Size of the flat action index space, ''board_size * board_size + 1''.
+        The last index is the jumping action.
+        """
+        return self.board_size * self.board_size + 1
+
+    def encode_action(self, action: OthelloAction) -> int:
+        """
+        Convert an action to its flat index ''r * board_size + c''.
+        The jumping action [3, 3] is encoded as ''num_actions - 1''.
+        """
+        if action[0] == 3 and action[1] == 3:
+            return self.board_size * self.board_size
+        return action[0] * self.board_size + action[1]
+
+    def decode_action(self, idx: int) -> OthelloAction:
+        """
+        Convert a flat action index back to [ 'coordinate_r', 'coordinate_c' ].
+        """
+        if not 0 <= idx < self.num_actions:
+            raise ValueError(f"invalid action index: {idx}")
+        if idx == self.board_size * self.board_size:
+            return [3, 3]
+        return list(divmod(idx, self.board_size))
+
+    def step_index(
+        self,
+        state: OthelloState,
+        agent_id: int,
+        idx: int,
+        *,
+        pre_step_fn: Optional[
+            Callable[[OthelloState, int, OthelloAction], None]
+        ] = None,
+        post_step_fn: Optional[
+            Callable[[OthelloState, int, OthelloAction], None]
+        ] = None,
+    ) -> OthelloState:
+        """
+        Step through the game with an action given as a flat index, which is
+        decoded and passed to :meth:'step' together with the callbacks.
+        :arg state:
+            Current state of the environment.
+        :arg agent_id:
+            ID of the agent that takes the action. (''0'' or ''1'')
+        :arg idx:
+            Flat action index, as described by :meth:'encode_action'.
+        :arg pre_step_fn:
+            See :meth:'step'.
+        :arg post_step_fn:
+            See :meth:'step'.
+        :returns:
+            The next state.
+        """
+        action = self.decode_action(idx)
+        if idx == 3 * self.board_size + 3:
+            # Square (3, 3) shares its coordinates with the jumping action.
+            raise ValueError("cannot put a stone on another stone")
+        return self.step(
+            state, agent_id, action, pre_step_fn=pre_step_fn, post_step_fn=post_step_fn
+        )
+
+    def legal_mask_flat(self, state: OthelloState, agent_id: int) -> NDArray[np.bool_]:
+        """
+        Find possible actions for the agent as a flat mask.
+        :arg state:
+            Current state of the environment.
+        :arg agent_id:
+            ID of the agent. (''0'' or ''1'')
+        :returns:
+            A contiguous boolean array of shape ''(num_actions,)'' indexed by
+            :meth:'encode_action'.
+        """
+        pass_index = self.board_size * self.board_size
+        mask = np.empty((pass_index + 1,), dtype=np.bool_)
+        mask[:pass_index] = state.legal_actions[agent_id].reshape(-1)
+        mask[pass_index] = mask[3 * self.board_size + 3]
+        mask[3 * self.board_size + 3] = False
+        return mask
+
+    def _check_wins(self, board: NDArray[np.uint8]) -> NDArray[np.int_]:
         agent0_cnt = np.count_nonzero(board[0])
         agent1_cnt = np.count_nonzero(board[1])
 
@@ -295,7 +532,8 @@ class OthelloEnv(BaseEnv[OthelloState, OthelloAction]):
                     [0, 0, 0, 0, 0, 0, 0, 0],
                     [0, 0, 0, 0, 0, 0, 0, 0],
                 ],
-            ]
+            ],
+            dtype=BOARD_DTYPE,
         )
 
         legal_actions = np.array(
@@ -320,14 +558,17 @@ class OthelloEnv(BaseEnv[OthelloState, OthelloAction]):
                     [0, 0, 0, 0, 0, 0, 0, 0],
                     [0, 0, 0, 0, 0, 0, 0, 0],
                 ],
-            ]
+            ],
+            dtype=BOARD_DTYPE,
         )
 
         initial_state = OthelloState(
             board=board,
             legal_actions=legal_actions,
             done=False,
-            reward = np.zeros((2,), dtype=np.int_)
+            reward = np.zeros((2,), dtype=np.int_),
+            zobrist=cythonfn.zobrist_hash(board, self.board_size),
+            mobility=(4, 4),
         )
 
         return initial_state
@@ -0,0 +1,54 @@
+"""
+Othello(Reversi) Self-Play Runner
+:class:'common.selfplay.BaseSelfPlayRunner' playing :obj:'OthelloEnv' games.
+Positions are stored as :meth:'OthelloState.to_bytes' records and actions as
+flat indices (see :meth:'OthelloEnv.encode_action'). Agents jump with [3, 3]
+when they have no square to put a stone on.
+
+    with SelfPlayRunner((RandomAgent, RandomAgent), num_workers=8) as runner:
+        for trajectories in runner:
+            boards, legal_actions, reward, done, zobrist, mobility = trajectories.states()
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.selfplay import AgentFactory, BaseSelfPlayRunner, BaseTrajectories
+from .new_env import OthelloEnv, OthelloState
+
+
+class Trajectories(BaseTrajectories):
+    """
+    Plies of Othello games; ''outcomes'' is ''0'' for a draw or a game cut off
+    at ''max_plies''.
+    """
+
+    def states(self) -> Tuple[NDArray, ...]:
+        """
+        Decode every position with :meth:'OthelloState.from_bytes_batch'.
+        """
+        return OthelloState.from_bytes_batch(self.records.reshape(-1))
+
+
+def _outcome(state: OthelloState, last_agent_id: int) -> int:
+    if not state.done:
+        return 0
+    return int(np.sign(state.reward[0]))
+
+
+class SelfPlayRunner(BaseSelfPlayRunner):
+    """
+    Self-play of Othello games; see :class:'common.selfplay.BaseSelfPlayRunner'.
+    """
+
+    env_class = OthelloEnv
+    trajectories_class = Trajectories
+    outcome = staticmethod(_outcome)
@@ -0,0 +1,184 @@
+"""
+Othello(Reversi) Board Symmetries
+The board is invariant under the 8 symmetries of the square. A symmetry is
+identified by ''transform_id'': ''transform_id % 4'' counterclockwise quarter
+turns (as :func:'np.rot90'), followed by a horizontal mirror (''c -> 7 - c'')
+if ''transform_id >= 4''.
+
+The jumping action [3, 3] is not a square, so it is never moved: the pass flag
+of ''legal_actions'' and the pass entry of a policy stay where they are.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+from . import cythonfn
+from .new_env import BOARD_DTYPE, OthelloState
+
+NUM_TRANSFORMS = 8
+
+_BOARD_SIZE = 8
+_BOARD_CELLS = _BOARD_SIZE * _BOARD_SIZE
+_PASS_SQUARE = 3 * _BOARD_SIZE + 3
+
+
+def _transform_squares(squares: NDArray, transform_id: int) -> NDArray:
+    squares = np.rot90(squares, transform_id % 4, axes=(-2, -1))
+    if transform_id >= 4:
+        squares = np.flip(squares, axis=-1)
+    return squares
+
+
+def _build_permutations() -> Tuple[NDArray[np.intp], NDArray[np.intp]]:
+    squares = np.arange(_BOARD_CELLS).reshape(_BOARD_SIZE, _BOARD_SIZE)
+    # ''permutations[t, i]'' is the source square of square ''i'' after transform ''t''.
+    permutations = np.stack(
+        [_transform_squares(squares, t).reshape(-1) for t in range(NUM_TRANSFORMS)]
+    )
+    # Same, over flat action indices with (3, 3) and the pass index fixed. The
+    # other center squares always hold stones, so swapping (3, 3) out of the
+    # center cycle loses nothing.
+    actions = np.empty((NUM_TRANSFORMS, _BOARD_CELLS + 1), dtype=np.intp)
+    actions[:, :_BOARD_CELLS] = permutations
+    actions[:, _BOARD_CELLS] = _BOARD_CELLS
+    for t in range(NUM_TRANSFORMS):
+        moved_to = np.flatnonzero(permutations[t] == _PASS_SQUARE)[0]
+        actions[t, moved_to] = permutations[t, _PASS_SQUARE]
+        actions[t, _PASS_SQUARE] = _PASS_SQUARE
+    return permutations.astype(np.intp), actions
+
+
+_SQUARE_PERMUTATIONS, _ACTION_PERMUTATIONS = _build_permutations()
+# Permutations of both channels of a flattened ''(2, 8, 8)'' array, of shape ''(8, 128)''.
+_CHANNEL_OFFSETS = np.array([[0], [_BOARD_CELLS]])
+_BOARD_PERMUTATIONS = (_SQUARE_PERMUTATIONS[:, None, :] + _CHANNEL_OFFSETS).reshape(
+    NUM_TRANSFORMS, -1
+)
+_LEGAL_ACTIONS_PERMUTATIONS = (
+    _ACTION_PERMUTATIONS[:, None, :_BOARD_CELLS] + _CHANNEL_OFFSETS
+).reshape(NUM_TRANSFORMS, -1)
+_INVERSE = np.array(
+    [
+        [
+            u
+            for u in range(NUM_TRANSFORMS)
+            if (_SQUARE_PERMUTATIONS[t][_SQUARE_PERMUTATIONS[u]] == np.arange(_BOARD_CELLS)).all()
+        ][0]
+        for t in range(NUM_TRANSFORMS)
+    ]
+)
+
+
+def _check_transform_id(transform_id: int) -> None:
+    if not 0 <= transform_id < NUM_TRANSFORMS:
+        raise ValueError(f"invalid transform_id: {transform_id}")
+
+
+def inverse(transform_id: int) -> int:
+    """
+    Find the transform undoing ''transform_id''.
+    """
+    _check_transform_id(transform_id)
+    return int(_INVERSE[transform_id])
+
+
+def transform(board: NDArray, transform_id: int) -> NDArray:
+    """
+    Apply a symmetry to the last two (square) axes of ''board''.
+    """
+    _check_transform_id(transform_id)
+    return np.ascontiguousarray(_transform_squares(board, transform_id))
+
+
+def transform_action(idx: int, transform_id: int) -> int:
+    """
+    Map a flat action index (see :meth:'OthelloEnv.encode_action') through a symmetry.
+    """
+    _check_transform_id(transform_id)
+    if not 0 <= idx <= _BOARD_CELLS:
+        raise ValueError(f"invalid action index: {idx}")
+    if idx == _PASS_SQUARE:
+        raise ValueError("cannot put a stone on another stone")
+    return int(np.flatnonzero(_ACTION_PERMUTATIONS[transform_id] == idx)[0])
+
+
+def canonicalize(board: NDArray[np.uint8]) -> Tuple[NDArray[np.uint8], int]:
+    """
+    Pick the canonical representative among the 8 symmetric boards.
+    :arg board:
+        Board of shape ''(2, 8, 8)'' as in :obj:'OthelloState.board'.
+    :returns:
+        A tuple of ''(canonical_board, transform_id)'' where ''canonical_board''
+        is ''transform(board, transform_id)''. Symmetric boards share the same
+        ''canonical_board''.
+    """
+    bitboard, transform_id = cythonfn.OthelloBitboard.from_board(
+        np.asarray(board, dtype=BOARD_DTYPE)
+    ).canonical()
+    return bitboard.to_board(), transform_id
+
+
+def canonical_state(state: OthelloState) -> Tuple[OthelloState, int]:
+    """
+    Canonicalize a whole state, keeping its reward and done flag.
+    :returns:
+        A tuple of ''(canonical_state, transform_id)''.
+    """
+    board, transform_id = canonicalize(state.board)
+    legal_actions = state.legal_actions.reshape(2, _BOARD_CELLS)[
+        :, _ACTION_PERMUTATIONS[transform_id, :_BOARD_CELLS]
+    ].reshape(state.legal_actions.shape)
+    return (
+        OthelloState(
+            board=board,
+            legal_actions=legal_actions,
+            reward=state.reward,
+            done=state.done,
+            mobility=state.mobility,
+        ),
+        transform_id,
+    )
+
+
+def augment(
+    boards: NDArray, legal_actions: NDArray, policy: NDArray
+) -> Tuple[NDArray, NDArray, NDArray]:
+    """
+    Map a batch of training samples through all 8 symmetries at once.
+    :arg boards:
+        Array of shape ''(N, 2, 8, 8)''.
+    :arg legal_actions:
+        Array of shape ''(N, 2, 8, 8)''; the pass flag at (3, 3) is kept in place.
+    :arg policy:
+        Array of shape ''(N, 65)'' over flat action indices.
+    :returns:
+        A tuple of arrays of shapes ''(N, 8, 2, 8, 8)'', ''(N, 8, 2, 8, 8)'' and
+        ''(N, 8, 65)'', where index ''t'' of the second axis is the sample under
+        ''transform_id = t''.
+    """
+    boards = np.asarray(boards)
+    legal_actions = np.asarray(legal_actions)
+    policy = np.asarray(policy)
+    n = boards.shape[0]
+    if boards.shape != (n, 2, _BOARD_SIZE, _BOARD_SIZE):
+        raise ValueError(f"invalid boards shape: {boards.shape}")
+    if legal_actions.shape != boards.shape:
+        raise ValueError(f"invalid legal_actions shape: {legal_actions.shape}")
+    if policy.shape != (n, _BOARD_CELLS + 1):
+        raise ValueError(f"invalid policy shape: {policy.shape}")
+
+    square_shape = (n, NUM_TRANSFORMS, 2, _BOARD_SIZE, _BOARD_SIZE)
+    return (
+        np.take(boards.reshape(n, -1), _BOARD_PERMUTATIONS, axis=1).reshape(square_shape),
+        np.take(legal_actions.reshape(n, -1), _LEGAL_ACTIONS_PERMUTATIONS, axis=1).reshape(
+            square_shape
+        ),
+        np.take(policy, _ACTION_PERMUTATIONS, axis=1),
+    )
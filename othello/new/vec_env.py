@@ -0,0 +1,266 @@
+"""
+Vectorized Othello(Reversi) Environment
+Holds ''N'' games as 64-bit bitboards and advances all of them with NumPy bit
+operations, without a Python loop per game.
+
+Bit ''r * 8 + c'' of a bitboard is the square ''(r, c)'', the same layout as
+:obj:'cythonfn.OthelloBitboard'. Actions are flat indices as returned by
+:meth:'OthelloEnv.encode_action': ''r * 8 + c'' puts a stone, ''64'' passes.
+
+:obj:'VecEnv' offers the same games behind the Gym-style interface of
+:class:'common.vec_env.BaseVecEnv', built on :obj:'OthelloEnv'.
+"""
+
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.vec_env import BaseVecEnv
+from .new_env import BOARD_DTYPE, OthelloEnv, OthelloState
+
+BOARD_SIZE = 8
+PASS_ACTION = BOARD_SIZE * BOARD_SIZE
+"""
+Flat index of the jumping action.
+"""
+
+_ZERO = np.uint64(0)
+_NOT_COLUMN_0 = np.uint64(0xFEFEFEFEFEFEFEFE)
+_NOT_COLUMN_7 = np.uint64(0x7F7F7F7F7F7F7F7F)
+_INITIAL_BLACK = np.uint64((1 << 28) | (1 << 35))
+_INITIAL_WHITE = np.uint64((1 << 27) | (1 << 36))
+_SQUARE_BITS = np.left_shift(np.uint64(1), np.arange(PASS_ACTION, dtype=np.uint64))
+
+# (shift, is_left, mask) in the same E, W, S, N, SE, SW, NE, NW order as ''cythonfn._shift''.
+_DIRECTIONS = (
+    (np.uint64(1), True, _NOT_COLUMN_0),
+    (np.uint64(1), False, _NOT_COLUMN_7),
+    (np.uint64(8), True, None),
+    (np.uint64(8), False, None),
+    (np.uint64(9), True, _NOT_COLUMN_0),
+    (np.uint64(7), True, _NOT_COLUMN_7),
+    (np.uint64(7), False, _NOT_COLUMN_0),
+    (np.uint64(9), False, _NOT_COLUMN_7),
+)
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(bits: NDArray[np.uint64]) -> NDArray[np.int_]:
+        return np.bitwise_count(bits).astype(np.int_)
+else:
+    _BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int_)
+
+    def _popcount(bits: NDArray[np.uint64]) -> NDArray[np.int_]:
+        as_bytes = np.ascontiguousarray(bits).view(np.uint8).reshape(bits.shape + (8,))
+        return _BYTE_POPCOUNT[as_bytes].sum(axis=-1)
+
+
+def _shift(bits: NDArray[np.uint64], direction) -> NDArray[np.uint64]:
+    amount, is_left, mask = direction
+    shifted = np.left_shift(bits, amount) if is_left else np.right_shift(bits, amount)
+    if mask is not None:
+        shifted &= mask
+    return shifted
+
+
+def _fill(bits: NDArray[np.uint64], through: NDArray[np.uint64], direction) -> NDArray[np.uint64]:
+    """
+    Squares of ''through'' reached from ''bits'' by repeated shifts in ''direction''.
+    A line has at most 6 inner squares, so 6 shifts cover every line.
+    """
+    result = _shift(bits, direction) & through
+    for _ in range(5):
+        result |= _shift(result, direction) & through
+    return result
+
+
+def legal_moves(player: NDArray[np.uint64], opponent: NDArray[np.uint64]) -> NDArray[np.uint64]:
+    """
+    Squares ''player'' can put a stone on, for each game.
+    """
+    empty = ~(player | opponent)
+    moves = np.zeros_like(player)
+    for direction in _DIRECTIONS:
+        moves |= _shift(_fill(player, opponent, direction), direction) & empty
+    return moves
+
+
+def flips(
+    player: NDArray[np.uint64], opponent: NDArray[np.uint64], placed: NDArray[np.uint64]
+) -> NDArray[np.uint64]:
+    """
+    Stones of ''opponent'' flipped when ''player'' puts a stone on ''placed'', for each game.
+    Empty for games whose ''placed'' is ''0''.
+    """
+    result = np.zeros_like(player)
+    for direction in _DIRECTIONS:
+        line = _fill(placed, opponent, direction)
+        closed = (_shift(line, direction) & player) != _ZERO
+        result |= np.where(closed, line, _ZERO)
+    return result
+
+
+class OthelloVecEnv:
+    """
+    ''N'' Othello games stepped together.
+    Agents alternate in every game, starting with agent 0 (black), exactly as in
+    :obj:'OthelloEnv'. A game whose current agent has no legal square must be
+    stepped with :data:'PASS_ACTION'.
+    """
+
+    env_id = ("othello", 0)  # type: ignore
+    """
+    Environment identifier in the form of ''(name, version)''.
+    """
+
+    board_size: int = BOARD_SIZE
+    """
+    Size (width and height) of the board.
+    """
+
+    def __init__(self, num_envs: int, auto_reset: bool = True) -> None:
+        """
+        :arg num_envs:
+            Number of games ''N''.
+        :arg auto_reset:
+            Whether :meth:'step' restarts finished games in place.
+        """
+        if num_envs <= 0:
+            raise ValueError(f"invalid num_envs: {num_envs}")
+        self.num_envs = num_envs
+        self.auto_reset = auto_reset
+        self.stones = np.empty((num_envs, 2), dtype=np.uint64)
+        """
+        Array of shape ''(N, 2)'' holding the stones of agent 0 and 1 in each game.
+        """
+        self.agent_ids = np.empty((num_envs,), dtype=np.intc)
+        """
+        Array of shape ''(N,)'' holding the agent to move in each game.
+        """
+        self.done = np.empty((num_envs,), dtype=np.bool_)
+        """
+        Array of shape ''(N,)'', only ever ''True'' when ''auto_reset'' is off.
+        """
+        self._index = np.arange(num_envs)
+        self.reset()
+
+    def reset(self, mask: Optional[ArrayLike] = None) -> None:
+        """
+        Restart games from the initial position.
+        :arg mask:
+            Boolean array of shape ''(N,)'' selecting games to restart.
+            Every game is restarted if ''None''.
+        """
+        if mask is None:
+            mask = slice(None)
+        self.stones[mask, 0] = _INITIAL_BLACK
+        self.stones[mask, 1] = _INITIAL_WHITE
+        self.agent_ids[mask] = 0
+        self.done[mask] = False
+
+    def _players(self) -> Tuple[NDArray[np.uint64], NDArray[np.uint64]]:
+        player = self.stones[self._index, self.agent_ids]
+        opponent = self.stones[self._index, 1 - self.agent_ids]
+        return player, opponent
+
+    def legal_moves(self) -> NDArray[np.uint64]:
+        """
+        Squares the agent to move can put a stone on, as bitboards of shape ''(N,)''.
+        """
+        return legal_moves(*self._players())
+
+    def legal_mask(self) -> NDArray[np.bool_]:
+        """
+        Possible actions of the agent to move as flat masks.
+        :returns:
+            A boolean array of shape ''(N, 65)'' indexed like
+            :meth:'OthelloEnv.encode_action'.
+        """
+        moves = self.legal_moves()
+        mask = np.empty((self.num_envs, PASS_ACTION + 1), dtype=np.bool_)
+        mask[:, :PASS_ACTION] = (moves[:, None] & _SQUARE_BITS) != _ZERO
+        mask[:, PASS_ACTION] = moves == _ZERO
+        return mask
+
+    def boards(self) -> NDArray[np.uint8]:
+        """
+        Boards of every game in the layout of :obj:'OthelloState.board'.
+        :returns:
+            An array of shape ''(N, 2, 8, 8)'' and dtype :data:'BOARD_DTYPE'.
+        """
+        bits = (self.stones[:, :, None] & _SQUARE_BITS) != _ZERO
+        return bits.reshape(self.num_envs, 2, BOARD_SIZE, BOARD_SIZE).astype(BOARD_DTYPE)
+
+    def step(self, actions: ArrayLike) -> Tuple[NDArray[np.int_], NDArray[np.bool_]]:
+        """
+        Put a stone (or pass) in every game for its agent to move.
+        :arg actions:
+            Flat action indices of shape ''(N,)''.
+        :returns:
+            A tuple of ''(reward, done)''. ''reward'' has shape ''(N, 2)'' and
+            follows :meth:'OthelloEnv._check_wins'; it is nonzero only for games
+            that ended on this step. ''done'' has shape ''(N,)'' and is also the
+            auto-reset mask: with ''auto_reset'' those games are already back at
+            the initial position.
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.num_envs,):
+            raise ValueError(f"invalid actions shape: {actions.shape}")
+        if self.done.any():
+            raise ValueError(f"game is already done: {np.flatnonzero(self.done)[0]}")
+        invalid = (actions < 0) | (actions > PASS_ACTION)
+        if invalid.any():
+            raise ValueError(f"invalid action index: {actions[invalid][0]}")
+
+        player, opponent = self._players()
+        moves = legal_moves(player, opponent)
+        is_pass = actions == PASS_ACTION
+        placed = np.where(is_pass, _ZERO, _SQUARE_BITS[np.where(is_pass, 0, actions)])
+        illegal = np.where(is_pass, moves != _ZERO, (placed & moves) == _ZERO)
+        if illegal.any():
+            game = np.flatnonzero(illegal)[0]
+            if is_pass[game]:
+                raise ValueError(f"cannot skip if there is possible action: game {game}")
+            raise ValueError(f"illegal action {actions[game]}: game {game}")
+
+        flipped = flips(player, opponent, placed)
+        player = player | placed | flipped
+        opponent = opponent & ~flipped
+        self.stones[self._index, self.agent_ids] = player
+        self.stones[self._index, 1 - self.agent_ids] = opponent
+        self.agent_ids ^= 1
+
+        done = (legal_moves(player, opponent) == _ZERO) & (
+            legal_moves(opponent, player) == _ZERO
+        )
+        reward = np.zeros((self.num_envs, 2), dtype=np.int_)
+        if done.any():
+            black = _popcount(self.stones[done, 0])
+            white = _popcount(self.stones[done, 1])
+            reward[done, 0] = np.sign(black - white)
+            reward[done, 1] = -reward[done, 0]
+            if self.auto_reset:
+                self.reset(done)
+            else:
+                self.done |= done
+        return reward, done
+
+
+class VecEnv(BaseVecEnv):
+    """
+    ''N'' Othello games stepped together; see :class:'common.vec_env.BaseVecEnv'.
+    Observations of shape ''(N, C, board_size, board_size)'' stack
+    :meth:'OthelloState.perspective'. Unlike :obj:'OthelloVecEnv', every game
+    keeps an :obj:'OthelloState'.
+    """
+
+    env_class = OthelloEnv
+
+    def _reward(self, state: OthelloState, agent_id: int) -> float:
+        return state.reward[agent_id]
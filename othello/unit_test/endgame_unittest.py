@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+from new import endgame
+from new.new_env import OthelloEnv
+
+class TestEndgame(unittest.TestCase):
+    def setUp(self):
+        self.env = OthelloEnv()
+
+    def _negamax(self, state, agent_id):
+        if state.done:
+            return int(state.board[agent_id].sum()) - int(state.board[1 - agent_id].sum())
+        return max(
+            -self._negamax(self.env.step_index(state, agent_id, int(idx)), 1 - agent_id)
+            for idx in np.flatnonzero(self.env.legal_mask_flat(state, agent_id))
+        )
+
+    def _positions(self, empties):
+        """
+        Undecided positions of random games with at most ''empties'' empty squares.
+        """
+        for game in range(40):
+            rng = np.random.default_rng(game)
+            state = self.env.initialize_state()
+            agent_id = 0
+            while not state.done:
+                if 64 - state.board.sum() <= empties:
+                    yield state, agent_id
+                    break
+                idx = rng.choice(np.flatnonzero(self.env.legal_mask_flat(state, agent_id)))
+                state = self.env.step_index(state, agent_id, int(idx))
+                agent_id = 1 - agent_id
+
+    def _assert_best(self, state, agent_id, result):
+        self.assertEqual(result.score, self._negamax(state, agent_id))
+        self.assertTrue(self.env.legal_mask_flat(state, agent_id)[self.env.encode_action(result.action)])
+        next_state = self.env.step(state, agent_id, result.action)
+        self.assertEqual(result.score, -self._negamax(next_state, 1 - agent_id))
+        self.assertGreater(result.nodes, 0)
+
+    def test_solve(self):
+        for state, agent_id in self._positions(6):
+            self._assert_best(state, agent_id, endgame.solve(state, agent_id))
+
+    def test_pass(self):
+        found = 0
+        for state, agent_id in self._positions(10):
+            while not state.done and not state.must_pass(agent_id):
+                idx = np.flatnonzero(self.env.legal_mask_flat(state, agent_id))[0]
+                state = self.env.step_index(state, agent_id, int(idx))
+                agent_id = 1 - agent_id
+            if state.done:
+                continue
+            result = endgame.solve(state, agent_id)
+            np.testing.assert_array_equal(result.action, [3, 3])
+            self._assert_best(state, agent_id, result)
+            found += 1
+        self.assertGreater(found, 0)
+
+    def test_too_many_empties(self):
+        self.assertRaisesRegex(
+            ValueError,
+            "too many empty squares: 60",
+            lambda: endgame.solve(self.env.initialize_state(), 0),
+        )
+        state, agent_id = next(self._positions(6))
+        empties = 64 - state.board.sum()
+        self.assertRaisesRegex(
+            ValueError,
+            f"too many empty squares: {empties}",
+            lambda: endgame.solve(state, agent_id, max_empties=empties - 1),
+        )
+
+if __name__ == "__main__":
+    unittest.main()
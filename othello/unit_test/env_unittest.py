@@ -0,0 +1,186 @@
+import unittest
+
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+from new import cythonfn
+from new.new_env import BOARD_DTYPE, OthelloEnv, OthelloState
+from pre import pre_env
+
+class TestOthelloEnv(unittest.TestCase):
+    def setUp(self):
+        self.env = OthelloEnv()
+        self.initial_state = self.env.initialize_state()
+
+    def _pre_initial_state(self):
+        # The original kernel takes C ``int`` arrays, which ``np.int_`` is only
+        # where it is 32-bit.
+        state = pre_env.OthelloEnv().initialize_state()
+        return pre_env.OthelloState(
+            board=state.board.astype(np.intc),
+            legal_actions=state.legal_actions.astype(np.intc),
+            reward=state.reward,
+            done=state.done,
+        )
+
+    def _assert_same_state(self, state, pre_state):
+        np.testing.assert_array_equal(state.board, pre_state.board)
+        np.testing.assert_array_equal(state.legal_actions, pre_state.legal_actions)
+        np.testing.assert_array_equal(state.reward, pre_state.reward)
+        self.assertEqual(state.done, pre_state.done)
+        self.assertEqual(state.zobrist, cythonfn.zobrist_hash(state.board, 8))
+
+    def test_initialize_state(self):
+        self.assertEqual(self.initial_state.board.dtype, BOARD_DTYPE)
+        self.assertEqual(self.initial_state.legal_actions.dtype, BOARD_DTYPE)
+        self._assert_same_state(self.initial_state, self._pre_initial_state())
+        self.assertEqual(self.initial_state.mobility, (4, 4))
+
+    def test_action(self):
+        self.assertRaisesRegex(
+            ValueError,
+            "invalid agent_id",
+            lambda: self.env.step(self.initial_state, 2, [2, 3]),
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "out of board",
+            lambda: self.env.step(self.initial_state, 0, [8, 0]),
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "cannot put a stone on opponent's stone",
+            lambda: self.env.step(self.initial_state, 0, [4, 4]),
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "cannot put a stone on another stone",
+            lambda: self.env.step(self.initial_state, 0, [3, 4]),
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "There is no stone to flip",
+            lambda: self.env.step(self.initial_state, 0, [0, 0]),
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "cannot skip if there is possible action",
+            lambda: self.env.step(self.initial_state, 0, [3, 3]),
+        )
+
+    def test_step(self):
+        state = self.env.step(self.initial_state, 0, [2, 3])
+        expected = np.zeros((2, 8, 8), dtype=BOARD_DTYPE)
+        expected[0, 2, 3] = expected[0, 3, 3] = expected[0, 4, 3] = expected[0, 3, 4] = 1
+        expected[1, 4, 4] = 1
+        np.testing.assert_array_equal(state.board, expected)
+        np.testing.assert_array_equal(np.argwhere(state.legal_actions[1]), [[2, 2], [2, 4], [4, 2]])
+
+    def test_step_index(self):
+        calls = []
+        state = self.env.step_index(
+            self.initial_state,
+            0,
+            19,
+            pre_step_fn=lambda *args: calls.append(("pre",) + args),
+            post_step_fn=lambda *args: calls.append(("post",) + args),
+        )
+        np.testing.assert_array_equal(state.board, self.env.step(self.initial_state, 0, [2, 3]).board)
+        self.assertEqual(
+            calls, [("pre", self.initial_state, 0, [2, 3]), ("post", state, 0, [2, 3])]
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "cannot put a stone on another stone",
+            lambda: self.env.step_index(self.initial_state, 0, 27),
+        )
+
+    def test_against_pre(self):
+        pre = pre_env.OthelloEnv()
+        passes = 0
+        for game in range(40):
+            rng = np.random.default_rng(game)
+            state = self.initial_state
+            pre_state = self._pre_initial_state()
+            agent_id = 0
+            while not state.done:
+                idx = rng.choice(np.flatnonzero(self.env.legal_mask_flat(state, agent_id)))
+                action = self.env.decode_action(int(idx))
+                passes += idx == self.env.num_actions - 1
+                state = self.env.step(state, agent_id, action)
+                pre_state = pre.step(pre_state, agent_id, action)
+                self._assert_same_state(state, pre_state)
+                agent_id = 1 - agent_id
+            np.testing.assert_array_equal(state.reward, self.env._check_wins(state.board))
+        self.assertGreater(passes, 0)
+
+    def test_legal_actions_and_mobility(self):
+        squares = np.left_shift(1, np.arange(64, dtype=np.uint64))
+        must_pass = 0
+        for game in range(20):
+            rng = np.random.default_rng(game)
+            state = self.initial_state
+            agent_id = 0
+            while not state.done:
+                idx = rng.choice(np.flatnonzero(self.env.legal_mask_flat(state, agent_id)))
+                state = self.env.step(state, agent_id, self.env.decode_action(int(idx)))
+                agent_id = 1 - agent_id
+
+                bitboard = cythonfn.OthelloBitboard.from_board(state.board)
+                rebuilt = np.zeros((2, 8, 8), dtype=BOARD_DTYPE)
+                for agent in range(2):
+                    moves = np.uint64(bitboard.legal_moves(agent))
+                    rebuilt[agent] = ((moves & squares) != 0).reshape(8, 8)
+                    rebuilt[agent, 3, 3] = moves == 0
+                    self.assertEqual(state.mobility[agent], bin(int(moves)).count("1"))
+                    self.assertEqual(state.must_pass(agent), state.mobility[agent] == 0)
+                    legacy = OthelloState(
+                        board=state.board, legal_actions=state.legal_actions, reward=state.reward
+                    )
+                    self.assertEqual(legacy.must_pass(agent), state.must_pass(agent))
+                    must_pass += state.must_pass(agent)
+                np.testing.assert_array_equal(state.legal_actions, rebuilt)
+        self.assertGreater(must_pass, 0)
+
+    def test_rebuild_legal_actions(self):
+        # Stale legal actions of the previous state are not carried over.
+        stale = OthelloState(
+            board=self.initial_state.board,
+            legal_actions=np.zeros_like(self.initial_state.legal_actions),
+            reward=self.initial_state.reward,
+        )
+        state = self.env.step(stale, 0, [2, 3])
+        expected = self.env.step(self.initial_state, 0, [2, 3])
+        np.testing.assert_array_equal(state.legal_actions, expected.legal_actions)
+        self.assertEqual(state.mobility, expected.mobility)
+
+        # Passing is checked with the carried mobility, or on the board without it.
+        passes = 0
+        for game in range(20):
+            rng = np.random.default_rng(game)
+            state = self.initial_state
+            agent_id = 0
+            while not state.done:
+                if state.must_pass(agent_id):
+                    legacy = OthelloState(
+                        board=state.board, legal_actions=state.legal_actions, reward=state.reward
+                    )
+                    passed = self.env.step(state, agent_id, [3, 3])
+                    self.assertEqual(self.env.step(legacy, agent_id, [3, 3]).mobility, passed.mobility)
+                    self.assertEqual(passed.mobility, state.mobility)
+                    passes += 1
+                elif state.mobility[agent_id]:
+                    self.assertRaisesRegex(
+                        ValueError,
+                        "cannot skip if there is possible action",
+                        lambda: self.env.step(state, agent_id, [3, 3]),
+                    )
+                idx = rng.choice(np.flatnonzero(self.env.legal_mask_flat(state, agent_id)))
+                state = self.env.step(state, agent_id, self.env.decode_action(int(idx)))
+                agent_id = 1 - agent_id
+        self.assertGreater(passes, 0)
+
+if __name__ == "__main__":
+    unittest.main()
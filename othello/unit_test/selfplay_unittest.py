@@ -0,0 +1,19 @@
+import unittest
+
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.unit_test.selfplay_cases import SelfPlayRunnerCases
+from new.selfplay import SelfPlayRunner
+
+class TestSelfPlayRunner(SelfPlayRunnerCases, unittest.TestCase):
+    runner_class = SelfPlayRunner
+
+    def expected_outcome(self, state, num_plies):
+        return np.sign(int(state.board[0].sum()) - int(state.board[1].sum()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+from new import cythonfn, symmetry
+from new.new_env import BOARD_DTYPE, OthelloEnv, OthelloState
+
+class TestSymmetry(unittest.TestCase):
+    def setUp(self):
+        self.env = OthelloEnv()
+        self.states = []
+        for game in range(10):
+            rng = np.random.default_rng(game)
+            state = self.env.initialize_state()
+            agent_id = 0
+            while not state.done:
+                self.states.append(state)
+                idx = rng.choice(np.flatnonzero(self.env.legal_mask_flat(state, agent_id)))
+                state = self.env.step_index(state, agent_id, int(idx))
+                agent_id = 1 - agent_id
+
+    def _legal_actions(self, board):
+        squares = np.left_shift(1, np.arange(64, dtype=np.uint64))
+        bitboard = cythonfn.OthelloBitboard.from_board(np.ascontiguousarray(board))
+        legal_actions = np.zeros((2, 8, 8), dtype=BOARD_DTYPE)
+        for agent in range(2):
+            moves = np.uint64(bitboard.legal_moves(agent))
+            legal_actions[agent] = ((moves & squares) != 0).reshape(8, 8)
+            legal_actions[agent, 3, 3] = moves == 0
+        return legal_actions
+
+    def test_inverse(self):
+        board = self.states[-1].board
+        for t in range(symmetry.NUM_TRANSFORMS):
+            u = symmetry.inverse(t)
+            np.testing.assert_array_equal(symmetry.transform(symmetry.transform(board, t), u), board)
+            for idx in range(65):
+                if idx != 27:
+                    self.assertEqual(
+                        symmetry.transform_action(symmetry.transform_action(idx, t), u), idx
+                    )
+            self.assertEqual(symmetry.transform_action(64, t), 64)
+        self.assertRaisesRegex(ValueError, "invalid transform_id: 8", lambda: symmetry.inverse(8))
+        self.assertRaisesRegex(
+            ValueError, "invalid action index: 65", lambda: symmetry.transform_action(65, 0)
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "cannot put a stone on another stone",
+            lambda: symmetry.transform_action(27, 0),
+        )
+
+    def test_canonicalize(self):
+        for state in self.states:
+            canonical_board, transform_id = symmetry.canonicalize(state.board)
+            np.testing.assert_array_equal(
+                canonical_board, symmetry.transform(state.board, transform_id)
+            )
+            for t in range(symmetry.NUM_TRANSFORMS):
+                board, _ = symmetry.canonicalize(symmetry.transform(state.board, t))
+                np.testing.assert_array_equal(board, canonical_board)
+
+    def test_canonical_state(self):
+        passes = 0
+        for state in self.states:
+            canonical, transform_id = symmetry.canonical_state(state)
+            np.testing.assert_array_equal(
+                canonical.board, symmetry.transform(state.board, transform_id)
+            )
+            np.testing.assert_array_equal(canonical.legal_actions, self._legal_actions(canonical.board))
+            np.testing.assert_array_equal(canonical.legal_actions[:, 3, 3], state.legal_actions[:, 3, 3])
+            self.assertEqual(canonical.mobility, state.mobility)
+            passes += state.legal_actions[:, 3, 3].any()
+        self.assertGreater(passes, 0)
+
+    def test_augment(self):
+        states = self.states[::7]
+        boards = np.stack([state.board for state in states])
+        legal_actions = np.stack([state.legal_actions for state in states])
+        policy = np.random.default_rng(0).random((len(states), 65))
+        aug_boards, aug_legal_actions, aug_policy = symmetry.augment(boards, legal_actions, policy)
+        self.assertEqual(aug_boards.shape, (len(states), 8, 2, 8, 8))
+        self.assertEqual(aug_legal_actions.shape, (len(states), 8, 2, 8, 8))
+        self.assertEqual(aug_policy.shape, (len(states), 8, 65))
+        for n, state in enumerate(states):
+            for t in range(symmetry.NUM_TRANSFORMS):
+                np.testing.assert_array_equal(aug_boards[n, t], symmetry.transform(state.board, t))
+                np.testing.assert_array_equal(
+                    aug_legal_actions[n, t], self._legal_actions(aug_boards[n, t])
+                )
+                np.testing.assert_array_equal(aug_legal_actions[n, t, :, 3, 3], state.legal_actions[:, 3, 3])
+                for idx in range(65):
+                    if idx != 27:
+                        self.assertEqual(aug_policy[n, t, symmetry.transform_action(idx, t)], policy[n, idx])
+
+                augmented = OthelloState(
+                    board=aug_boards[n, t], legal_actions=aug_legal_actions[n, t], reward=state.reward
+                )
+                for agent in range(2):
+                    mask = self.env.legal_mask_flat(state, agent)
+                    aug_mask = self.env.legal_mask_flat(augmented, agent)
+                    for idx in np.flatnonzero(mask):
+                        self.assertTrue(aug_mask[symmetry.transform_action(int(idx), t)])
+                    self.assertEqual(mask.sum(), aug_mask.sum())
+        self.assertRaisesRegex(
+            ValueError, "invalid policy shape", lambda: symmetry.augment(boards, legal_actions, policy[:, :64])
+        )
+
+if __name__ == "__main__":
+    unittest.main()
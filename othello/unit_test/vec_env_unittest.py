@@ -0,0 +1,107 @@
+import unittest
+
+import numpy as np
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.unit_test.vec_env_cases import VecEnvCases
+from new.new_env import OthelloEnv
+from new.vec_env import PASS_ACTION, OthelloVecEnv, VecEnv
+
+class TestOthelloVecEnv(unittest.TestCase):
+    def setUp(self):
+        self.env = OthelloEnv()
+
+    def _random_actions(self, rng, vec_env):
+        return np.array([rng.choice(np.flatnonzero(mask)) for mask in vec_env.legal_mask()])
+
+    def test_step(self):
+        rng = np.random.default_rng(0)
+        vec_env = OthelloVecEnv(8)
+        states = [self.env.initialize_state() for _ in range(8)]
+        agent_ids = [0] * 8
+        finished = passes = 0
+        for _ in range(200):
+            legal_mask = vec_env.legal_mask()
+            boards = vec_env.boards()
+            np.testing.assert_array_equal(vec_env.agent_ids, agent_ids)
+            for i in range(8):
+                np.testing.assert_array_equal(
+                    legal_mask[i], self.env.legal_mask_flat(states[i], agent_ids[i])
+                )
+                np.testing.assert_array_equal(boards[i], states[i].board)
+
+            actions = self._random_actions(rng, vec_env)
+            reward, done = vec_env.step(actions)
+            for i in range(8):
+                passes += actions[i] == PASS_ACTION
+                state = self.env.step_index(states[i], agent_ids[i], int(actions[i]))
+                self.assertEqual(done[i], state.done)
+                if state.done:
+                    finished += 1
+                    np.testing.assert_array_equal(reward[i], self.env._check_wins(state.board))
+                    states[i], agent_ids[i] = self.env.initialize_state(), 0
+                else:
+                    np.testing.assert_array_equal(reward[i], [0, 0])
+                    states[i], agent_ids[i] = state, 1 - agent_ids[i]
+        self.assertGreater(finished, 0)
+        self.assertGreater(passes, 0)
+
+    def test_no_auto_reset(self):
+        rng = np.random.default_rng(1)
+        vec_env = OthelloVecEnv(4, auto_reset=False)
+        while not vec_env.done.any():
+            reward, done = vec_env.step(self._random_actions(rng, vec_env))
+        self.assertFalse(done.all())
+        np.testing.assert_array_equal(done, vec_env.done)
+        boards = vec_env.boards()
+        for i in range(4):
+            expected = self.env._check_wins(boards[i]) if done[i] else [0, 0]
+            np.testing.assert_array_equal(reward[i], expected)
+        game = np.flatnonzero(done)[0]
+        self.assertRaisesRegex(
+            ValueError,
+            f"game is already done: {game}",
+            lambda: vec_env.step(self._random_actions(rng, vec_env)),
+        )
+
+        vec_env.reset(done)
+        self.assertFalse(vec_env.done.any())
+        initial_board = self.env.initialize_state().board
+        for i in range(4):
+            np.testing.assert_array_equal(
+                vec_env.boards()[i], initial_board if done[i] else boards[i]
+            )
+        np.testing.assert_array_equal(vec_env.agent_ids[done], 0)
+
+    def test_invalid_actions(self):
+        vec_env = OthelloVecEnv(3)
+        self.assertRaisesRegex(ValueError, "invalid num_envs", lambda: OthelloVecEnv(0))
+        self.assertRaisesRegex(
+            ValueError, "invalid actions shape", lambda: vec_env.step(np.array([19, 19]))
+        )
+        self.assertRaisesRegex(
+            ValueError, "invalid action index: 65", lambda: vec_env.step(np.array([19, 19, 65]))
+        )
+        self.assertRaisesRegex(
+            ValueError,
+            "cannot skip if there is possible action: game 1",
+            lambda: vec_env.step(np.array([19, PASS_ACTION, 19])),
+        )
+        self.assertRaisesRegex(
+            ValueError, "illegal action 0: game 2", lambda: vec_env.step(np.array([19, 19, 0]))
+        )
+        np.testing.assert_array_equal(
+            vec_env.boards(), np.stack([self.env.initialize_state().board] * 3)
+        )
+
+class TestVecEnv(VecEnvCases, unittest.TestCase):
+    vec_env_class = VecEnv
+
+    def expected_reward(self, state, agent_id):
+        return self.env._check_wins(state.board)[agent_id]
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+"""
+Puoribor Move Generation Perft
+Counts the leaf nodes of the legal-move tree below fixed positions with both the
+``pre`` and ``new`` environments, checks them against known node counts and
+reports nodes/sec per backend.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+import numpy as np
+import time
+
+from pre import pre_env
+from new import new_env
+
+KNOWN_POSITIONS = {
+    "initial": ([], [167, 27405, 4419735]),
+    "midgame": (
+        [[1, 2, 3], [3, 3, 3], [0, 4, 1], [2, 3, 6]],
+        [160, 25013, 3867774],
+    ),
+}
+"""
+Actions played from the initial position, starting with agent 0, and the known
+node counts for depth 1, 2, 3 from the resulting position.
+"""
+
+BACKENDS = {
+    "pre": (pre_env.PuoriborEnv, 2),
+    "new": (new_env.PuoriborEnv, 3),
+}
+"""
+Environment class of each backend and the deepest depth checked with it.
+"""
+
+
+def legal_actions(env, state, agent_id: int):
+    if isinstance(env, new_env.PuoriborEnv):
+        return np.argwhere(env.legal_actions(state, agent_id))
+    # ``pre_env.PuoriborEnv.legal_actions`` writes an ``np.int_`` array through a C
+    # ``int`` view, which only works where both are 32-bit, so every action is tried.
+    actions = []
+    for action_type in range(4):
+        for coordinate_x in range(env.board_size):
+            for coordinate_y in range(env.board_size):
+                action = [action_type, coordinate_x, coordinate_y]
+                try:
+                    env.step(state, agent_id, action)
+                except ValueError:
+                    ...
+                else:
+                    actions.append(action)
+    return actions
+
+
+def perft(state, agent_id: int, depth: int, env=None) -> int:
+    """
+    Count the positions exactly ``depth`` plies below ``state``. Agents alternate
+    every ply and a finished game has no children.
+    """
+    if env is None:
+        env = new_env.PuoriborEnv()
+    if depth == 0:
+        return 1
+    if state.done:
+        return 0
+    actions = legal_actions(env, state, agent_id)
+    if depth == 1:
+        return len(actions)
+    return sum(
+        perft(env.step(state, agent_id, action), 1 - agent_id, depth - 1, env)
+        for action in actions
+    )
+
+
+def known_position(env, name: str):
+    actions, counts = KNOWN_POSITIONS[name]
+    state = env.initialize_state()
+    if isinstance(env, pre_env.PuoriborEnv):
+        # The original kernels take C ``int`` arrays.
+        state = pre_env.PuoriborState(
+            board=state.board.astype(np.intc),
+            walls_remaining=state.walls_remaining.astype(np.intc),
+            done=state.done,
+        )
+    for ply, action in enumerate(actions):
+        state = env.step(state, ply % 2, action)
+    return state, len(actions) % 2, counts
+
+
+def run(backend: str) -> bool:
+    """
+    Check every known position up to the backend's depth and print nodes/sec.
+    :returns:
+        ``True`` if every count matches.
+    """
+    env_class, max_depth = BACKENDS[backend]
+    env = env_class()
+    matched = True
+    nodes = 0
+    elapsed = 0.0
+    for name in KNOWN_POSITIONS:
+        state, agent_id, counts = known_position(env, name)
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            start = time.perf_counter()
+            count = perft(state, agent_id, depth, env)
+            elapsed += time.perf_counter() - start
+            nodes += count
+            matched &= count == expected
+            status = "ok" if count == expected else f"MISMATCH (expected {expected})"
+            print(f"{backend} {name} depth {depth}: {count} {status}")
+    print(f"{backend}: {nodes / elapsed:.0f} nodes/sec")
+    return matched
+
+if __name__ == "__main__":
+
+    matched = run("pre")
+    matched &= run("new")
+    sys.exit(0 if matched else 1)
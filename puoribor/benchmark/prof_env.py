@@ -1,659 +0,0 @@
-
-
-from __future__ import annotations
-
-import sys
-from dataclasses import dataclass
-from typing import Callable, Deque, Dict, Optional
-import time
-
-import numpy as np
-from numpy.typing import ArrayLike, NDArray
-
-from queue import PriorityQueue
-
-if sys.version_info < (3, 10):
-    from typing_extensions import TypeAlias
-else:
-    from typing import TypeAlias
-
-from fights.base import BaseEnv, BaseState
-
-PuoriborAction: TypeAlias = ArrayLike
-"""
-Alias of :obj:`ArrayLike` to describe the action type.
-Encoded as an array of shape ``(3,)``, in the form of
-[ `action_type`, `coordinate_x`, `coordinate_y` ].
-`action_type`
-    - 0 (move piece)
-    - 1 (place wall horizontally)
-    - 2 (place wall vertically)
-    - 3 (rotate section)
-`coordinate_x`, `coordinate_y`
-    - position to move the piece to
-    - top or left position to place the wall
-    - top left position of the section to rotate
-"""
-
-
-@dataclass
-class PuoriborState(BaseState):
-    """
-    ``PuoriborState`` represents the game state.
-    """
-
-    board: NDArray[np.int_]
-    """
-    Array of shape ``(C, W, H)``, where C is channel index and W, H is board width,
-    height.
-    Channels
-        - ``C = 0``: one-hot encoded position of agent 0. (starts from top)
-        - ``C = 1``: one-hot encoded position of agent 1. (starts from bottom)
-        - ``C = 2``: label encoded positions of horizontal walls. (1 for wall placed
-          by agent 0, 2 for agent 1)
-        - ``C = 3``: label encoded positions of vertical walls. (encoding is same as
-          ``C = 2``)
-        - ``C = 4``: one-hot encoded positions of horizontal walls' midpoints.
-        - ``C = 5``: one-hot encoded positions of vertical walls' midpoints.
-    """
-
-    walls_remaining: NDArray[np.int_]
-    """
-    Array of shape ``(2,)``, in the form of [ `agent0_remaining_walls`,
-    `agent1_remaining_walls` ].
-    """
-
-    memory_cells: NDArray[np.int_]
-    """
-    Array of shape ''(2, 9, 9, 2)''.
-    First index is agent_id, second and third index is x and y of the cell.
-    It should memorize two information per cell.
-    One is the shortest distance from the destination, and the other is the pointing direction of the cell.
-    
-    Pointing Direction
-        - 0 : 12 o'clock(up)
-        - 1 : 3 o'clock(right)
-        - 2 : 6 o'clock(down)
-        - 3 : 9 o'clock(left)
-    """
-
-    done: bool = False
-    """
-    Boolean value indicating whether the game is done.
-    """
-
-    def __str__(self) -> str:
-        """
-        Generate a human-readable string representation of the board.
-        Uses unicode box drawing characters.
-        """
-
-        table_top = "┌───┬───┬───┬───┬───┬───┬───┬───┬───┐"
-        vertical_wall = "│"
-        vertical_wall_bold = "┃"
-        horizontal_wall = "───"
-        horizontal_wall_bold = "━━━"
-        left_intersection = "├"
-        middle_intersection = "┼"
-        middle_intersection_bold = "╋"
-        right_intersection = "┤"
-        left_intersection_bottom = "└"
-        middle_intersection_bottom = "┴"
-        right_intersection_bottom = "┘"
-        result = table_top + "\n"
-
-        for y in range(9):
-            board_line = self.board[:, :, y]
-            result += vertical_wall
-            for x in range(9):
-                board_cell = board_line[:, x]
-                if board_cell[0]:
-                    result += " 0 "
-                elif board_cell[1]:
-                    result += " 1 "
-                else:
-                    result += "   "
-                if board_cell[3]:
-                    result += vertical_wall_bold
-                elif x == 8:
-                    result += vertical_wall
-                else:
-                    result += " "
-                if x == 8:
-                    result += "\n"
-            result += left_intersection_bottom if y == 8 else left_intersection
-            for x in range(9):
-                board_cell = board_line[:, x]
-                if board_cell[2]:
-                    result += horizontal_wall_bold
-                elif y == 8:
-                    result += horizontal_wall
-                else:
-                    result += "   "
-                if x == 8:
-                    result += (
-                        right_intersection_bottom if y == 8 else right_intersection
-                    )
-                else:
-                    if np.any(self.board[4:, x, y]):
-                        result += middle_intersection_bold
-                    else:
-                        result += (
-                            middle_intersection_bottom
-                            if y == 8
-                            else middle_intersection
-                        )
-            result += "\n"
-
-        return result
-
-    def perspective(self, agent_id: int) -> NDArray[np.int_]:
-        """
-        Return board where specified agent with ``agent_id`` is on top.
-        :arg agent_id:
-            The ID of agent to use as base.
-        :returns:
-            A rotated ``board`` array. The board's channel 0 will contain position of
-            agent of id ``agent_id``, and channel 1 will contain the opponent's
-            position. In channel 2 and 3, walles labeled with 1 are set by agent of id
-            ``agent_id``, and the others are set by the opponent.
-        """
-        if agent_id == 0:
-            return self.board
-        inverted_walls = (self.board[2:4] == 2).astype(np.int_) + (
-            self.board[2:4] == 1
-        ).astype(np.int_) * 2
-        rotated = np.stack(
-            [
-                np.rot90(self.board[1], 2),
-                np.rot90(self.board[0], 2),
-                np.pad(
-                    np.rot90(inverted_walls[0], 2)[:, 1:],
-                    ((0, 0), (0, 1)),
-                    constant_values=0,
-                ),
-                np.pad(
-                    np.rot90(inverted_walls[1], 2)[1:],
-                    ((0, 1), (0, 0)),  # type: ignore
-                    constant_values=0,
-                ),
-                np.pad(
-                    np.rot90(self.board[4], 2)[1:, 1:],
-                    ((0, 1), (0, 1)),  # type: ignore
-                    constant_values=0,
-                ),
-                np.pad(
-                    np.rot90(self.board[5], 2)[1:, 1:],
-                    ((0, 1), (0, 1)),  # type: ignore
-                    constant_values=0,
-                ),
-            ]
-        )
-        return rotated
-
-    def to_dict(self) -> Dict:
-        """
-        Serialize state object to dict.
-        :returns:
-            A serialized dict.
-        """
-        return {
-            "board": self.board.tolist(),
-            "walls_remaining": self.walls_remaining.tolist(),
-            "memory_cells": self.memory_cells.tolist(),
-            "done": self.done,
-        }
-
-    @staticmethod
-    def from_dict(serialized) -> PuoriborState:
-        """
-        Deserialize from serialized dict.
-        :arg serialized:
-            A serialized dict.
-        :returns:
-            Deserialized ``PuoriborState`` object.
-        """
-        return PuoriborState(
-            board=np.array(serialized["board"]),
-            walls_remaining=np.array(serialized["walls_remaining"]),
-            memory_cells=np.array(serialized["memory_cells"]),
-            done=serialized["done"],
-        )
-
-
-class PuoriborEnv(BaseEnv[PuoriborState, PuoriborAction]):
-    env_id = ("puoribor", 3)  # type: ignore
-    """
-    Environment identifier in the form of ``(name, version)``.
-    """
-
-    board_size: int = 9
-    """
-    Size (width and height) of the board.
-    """
-
-    max_walls: int = 10
-    """
-    Maximum allowed walls per agent.
-    """
-
-    def step(
-        self,
-        state: PuoriborState,
-        agent_id: int,
-        action: PuoriborAction,
-        *,
-        pre_step_fn: Optional[
-            Callable[[PuoriborState, int, PuoriborAction], None]
-        ] = None,
-        post_step_fn: Optional[
-            Callable[[PuoriborState, int, PuoriborAction], None]
-        ] = None,
-    ) -> PuoriborState:
-        """
-        Step through the game, calculating the next state given the current state and
-        action to take.
-        :arg state:
-            Current state of the environment.
-        :arg agent_id:
-            ID of the agent that takes the action. (``0`` or ``1``)
-        :arg action:
-            Agent action, encoded in the form described by :obj:`PuoriborAction`.
-        :arg pre_step_fn:
-            Callback to run before executing action. ``state``, ``agent_id`` and
-            ``action`` will be provided as arguments.
-        :arg post_step_fn:
-            Callback to run after executing action. The calculated state, ``agent_id``
-            and ``action`` will be provided as arguments.
-        :returns:
-            A copy of the object with the restored state.
-        """
-
-        start = time.perf_counter()
-
-        if pre_step_fn is not None:
-            pre_step_fn(state, agent_id, action)
-
-        action = np.asanyarray(action).astype(np.int_)
-        action_type, x, y = action
-        if not self._check_in_range(np.array([x, y])):
-            raise ValueError(f"out of board: {(x, y)}")
-        if not 0 <= agent_id <= 1:
-            raise ValueError(f"invalid agent_id: {agent_id}")
-
-        board = np.copy(state.board)
-        walls_remaining = np.copy(state.walls_remaining)
-        memory_cells = np.copy(state.memory_cells)
-        cut_ones = [[], []]
-        open_ones = [[], []]
-
-        print(f"1 : {time.perf_counter() - start}")
-
-        if action_type == 0:  # Move piece
-            current_pos = np.argwhere(state.board[agent_id] == 1)[0]
-            new_pos = np.array([x, y])
-            opponent_pos = np.argwhere(state.board[1 - agent_id] == 1)[0]
-            if np.all(new_pos == opponent_pos):
-                raise ValueError("cannot move to opponent's position")
-
-            delta = new_pos - current_pos
-            taxicab_dist = np.abs(delta).sum()
-            if taxicab_dist == 0:
-                raise ValueError("cannot move zero blocks")
-            elif taxicab_dist > 2:
-                raise ValueError("cannot move more than two blocks")
-            elif (
-                taxicab_dist == 2
-                and np.any(delta == 0)
-                and not np.all(current_pos + delta // 2 == opponent_pos)
-            ):
-                raise ValueError("cannot jump over nothing")
-
-            if np.all(delta):  # If moving diagonally
-                if np.any(current_pos + delta * [0, 1] != opponent_pos) and np.any(
-                    current_pos + delta * [1, 0] != opponent_pos
-                ):
-                    # Only diagonal jumps are permitted.
-                    # Agents cannot simply move in diagonal direction.
-                    raise ValueError("cannot move diagonally")
-                elif self._check_wall_blocked(board, current_pos, opponent_pos):
-                    raise ValueError("cannot jump over walls")
-
-                original_jump_pos = current_pos + 2 * (opponent_pos - current_pos)
-                if self._check_in_range(
-                    original_jump_pos
-                ) and not self._check_wall_blocked(
-                    board, current_pos, original_jump_pos
-                ):
-                    raise ValueError(
-                        "cannot diagonally jump if linear jump is possible"
-                    )
-                elif self._check_wall_blocked(board, opponent_pos, new_pos):
-                    raise ValueError("cannot jump over walls")
-            elif self._check_wall_blocked(board, current_pos, new_pos):
-                raise ValueError("cannot jump over walls")
-
-            board[agent_id][tuple(current_pos)] = 0
-            board[agent_id][tuple(new_pos)] = 1
-
-        elif action_type == 1:  # Place wall horizontally
-            if walls_remaining[agent_id] == 0:
-                raise ValueError(f"no walls left for agent {agent_id}")
-            if y == self.board_size - 1:
-                raise ValueError("cannot place wall on the edge")
-            elif x == self.board_size - 1:
-                raise ValueError("right section out of board")
-            elif np.any(board[2, x : x + 2, y]):
-                raise ValueError("wall already placed")
-            elif board[5, x, y]:
-                raise ValueError("cannot create intersecting walls")
-            board[2, x, y] = 1 + agent_id
-            board[2, x + 1, y] = 1 + agent_id
-            walls_remaining[agent_id] -= 1
-            board[4, x, y] = 1
-
-            if memory_cells[0][x][y][1] == 2:   cut_ones[0].append((x, y))
-            if memory_cells[0][x][y+1][1] == 0:   cut_ones[0].append((x, y+1))
-            if memory_cells[1][x][y][1] == 2:   cut_ones[1].append((x, y))
-            if memory_cells[1][x][y+1][1] == 0:   cut_ones[1].append((x, y+1))
-
-            if memory_cells[0][x+1][y][1] == 2:   cut_ones[0].append((x+1, y))
-            if memory_cells[0][x+1][y+1][1] == 0:   cut_ones[0].append((x+1, y+1))
-            if memory_cells[1][x+1][y][1] == 2:   cut_ones[1].append((x+1, y))
-            if memory_cells[1][x+1][y+1][1] == 0:   cut_ones[1].append((x+1, y+1))
-
-        elif action_type == 2:  # Place wall vertically
-            if walls_remaining[agent_id] == 0:
-                raise ValueError(f"no walls left for agent {agent_id}")
-            if x == self.board_size - 1:
-                raise ValueError("cannot place wall on the edge")
-            elif y == self.board_size - 1:
-                raise ValueError("right section out of board")
-            elif np.any(board[3, x, y : y + 2]):
-                raise ValueError("wall already placed")
-            elif board[4, x, y]:
-                raise ValueError("cannot create intersecting walls")
-            board[3, x, y] = 1 + agent_id
-            board[3, x, y + 1] = 1 + agent_id
-            walls_remaining[agent_id] -= 1
-            board[5, x, y] = 1
-
-            if memory_cells[0][x][y][1] == 1:   cut_ones[0].append((x, y))
-            if memory_cells[0][x+1][y][1] == 3:   cut_ones[0].append((x+1, y))
-            if memory_cells[1][x][y][1] == 1:   cut_ones[1].append((x, y))
-            if memory_cells[1][x+1][y][1] == 3:   cut_ones[1].append((x+1, y))
-
-            if memory_cells[0][x][y+1][1] == 1:   cut_ones[0].append((x, y+1))
-            if memory_cells[0][x+1][y+1][1] == 3:   cut_ones[0].append((x+1, y+1))
-            if memory_cells[1][x][y+1][1] == 1:   cut_ones[1].append((x, y+1))
-            if memory_cells[1][x+1][y+1][1] == 3:   cut_ones[1].append((x+1, y+1))
-
-        elif action_type == 3:  # Rotate section
-            region_top_left = np.array([x, y])
-            if not self._check_in_range(
-                region_top_left,
-                bottom_right=np.array([self.board_size - 3, self.board_size - 3]),
-            ):
-                raise ValueError("rotation region out of board")
-            elif walls_remaining[agent_id] < 2:
-                raise ValueError(f"less than two walls left for agent {agent_id}")
-
-            horizontal_walls = set()
-            vertical_walls = set()
-
-            for coordinate_x in range(x, x+4, 1):
-                for coordinate_y in range(y-1, y+4, 1):
-                    if coordinate_y >= 0 and coordinate_y <= 7:
-                        if board[2][coordinate_x][coordinate_y]:
-                            horizontal_walls.add((coordinate_x, coordinate_y))
-                        if board[3][coordinate_y][coordinate_x]:
-                            vertical_walls.add((coordinate_y, coordinate_x))
-
-            padded_horizontal = np.pad(board[2], 1, constant_values=0)
-            padded_vertical = np.pad(board[3], 1, constant_values=0)
-            padded_horizontal_midpoints = np.pad(board[4], 1, constant_values=0)
-            padded_vertical_midpoints = np.pad(board[5], 1, constant_values=0)
-            px, py = x + 1, y + 1
-            horizontal_region = np.copy(padded_horizontal[px : px + 4, py - 1 : py + 4])
-            vertical_region = np.copy(padded_vertical[px - 1 : px + 4, py : py + 4])
-            padded_horizontal_midpoints[px - 1, py - 1 : py + 4] = 0
-            padded_horizontal_midpoints[px + 3, py - 1 : py + 4] = 0
-            padded_vertical_midpoints[px - 1 : px + 4, py - 1] = 0
-            padded_vertical_midpoints[px - 1 : px + 4, py + 3] = 0
-            horizontal_region_midpoints = np.copy(
-                padded_horizontal_midpoints[px : px + 4, py - 1 : py + 4]
-            )
-            vertical_region_midpoints = np.copy(
-                padded_vertical_midpoints[px - 1 : px + 4, py : py + 4]
-            )
-            horizontal_region_new = np.rot90(vertical_region)
-            vertical_region_new = np.rot90(horizontal_region)
-            horizontal_region_midpoints_new = np.rot90(vertical_region_midpoints)
-            vertical_region_midpoints_new = np.rot90(horizontal_region_midpoints)
-            padded_horizontal[px : px + 4, py - 1 : py + 4] = horizontal_region_new
-            padded_vertical[px - 1 : px + 4, py : py + 4] = vertical_region_new
-            padded_horizontal_midpoints[
-                px - 1 : px + 3, py - 1 : py + 4
-            ] = horizontal_region_midpoints_new
-            padded_vertical_midpoints[
-                px - 1 : px + 4, py : py + 4
-            ] = vertical_region_midpoints_new
-            board[2] = padded_horizontal[1:-1, 1:-1]
-            board[3] = padded_vertical[1:-1, 1:-1]
-            board[4] = padded_horizontal_midpoints[1:-1, 1:-1]
-            board[5] = padded_vertical_midpoints[1:-1, 1:-1]
-            board[2, :, 8] = 0
-            board[3, 8, :] = 0
-            board[4, :, 8] = 0
-            board[5, 8, :] = 0
-
-            walls_remaining[agent_id] -= 2
-
-            for coordinate_x in range(x, x+4, 1):
-                for coordinate_y in range(y-1, y+4, 1):
-                    if coordinate_y >= 0 and coordinate_y <= 7:
-                        if board[2][coordinate_x][coordinate_y]:
-                            if (coordinate_x, coordinate_y) not in horizontal_walls:
-                                for agent_id in range(2):
-                                    if memory_cells[agent_id][coordinate_x][coordinate_y][1] == 2:   cut_ones[agent_id].append((coordinate_x, coordinate_y))
-                                    if memory_cells[agent_id][coordinate_x][coordinate_y+1][1] == 0:   cut_ones[agent_id].append((coordinate_x, coordinate_y+1))
-                        else:
-                            if (coordinate_x, coordinate_y) in horizontal_walls:
-                                for agent_id in range(2):
-                                    if memory_cells[agent_id][coordinate_x][coordinate_y][0] > memory_cells[agent_id][coordinate_x][coordinate_y+1][0] + 1:
-                                        open_ones[agent_id].append((coordinate_x, coordinate_y+1))
-                                    if memory_cells[agent_id][coordinate_x][coordinate_y+1][0] > memory_cells[agent_id][coordinate_x][coordinate_y][0] + 1:
-                                        open_ones[agent_id].append((coordinate_x, coordinate_y))
-                        if board[3][coordinate_y][coordinate_x]:
-                            if (coordinate_y, coordinate_x) not in vertical_walls:
-                                for agent_id in range(2):
-                                    if memory_cells[agent_id][coordinate_y][coordinate_x][1] == 1:   cut_ones[agent_id].append((coordinate_y, coordinate_x))
-                                    if memory_cells[agent_id][coordinate_y+1][coordinate_x][1] == 3:   cut_ones[agent_id].append((coordinate_y+1, coordinate_x))
-                        else:
-                            if (coordinate_y, coordinate_x) in vertical_walls:
-                                for agent_id in range(2):
-                                    if memory_cells[agent_id][coordinate_y][coordinate_x][0] > memory_cells[agent_id][coordinate_y+1][coordinate_x][0] + 1:
-                                        open_ones[agent_id].append((coordinate_y+1, coordinate_x))
-                                    if memory_cells[agent_id][coordinate_y+1][coordinate_x][0] > memory_cells[agent_id][coordinate_y][coordinate_x][0] + 1:
-                                        open_ones[agent_id].append((coordinate_y, coordinate_x))
-        else:
-            raise ValueError(f"invalid action_type: {action_type}")
-        
-        print(f"2 : {time.perf_counter() - start}")
-
-        if action_type > 0:
-            
-            directions = [(0, -1), (1, 0), (0, 1), (-1, 0)]
-
-            for agent_id in range(2):
-
-                print(f"3 : {time.perf_counter() - start}")
-
-                visited = set(cut_ones[agent_id])
-                q = Deque(cut_ones[agent_id])
-                in_pri_q = set(open_ones[agent_id])
-                pri_q = PriorityQueue()
-                while q:
-                    here = q.popleft()
-                    memory_cells[agent_id][here[0]][here[1]][0] = 99999
-                    memory_cells[agent_id][here[0]][here[1]][1] = -1
-                    in_pri_q.discard(here)
-                    for dir_id, (dx, dy) in enumerate(directions):
-                        there = (here[0] + dx, here[1] + dy)
-                        if (not self._check_in_range(np.array(there))) or self._check_wall_blocked(board, np.array(here), np.array(there)):
-                            continue
-                        if there in visited:
-                            continue
-                        if memory_cells[agent_id][there[0]][there[1]][1] == (dir_id + 2) % 4:
-                            q.append(there)
-                            visited.add(there)
-                        else:
-                            if memory_cells[agent_id][there[0]][there[1]][0] < 99999:
-                                in_pri_q.add(there)
-
-                print(f"4 : {time.perf_counter() - start}")
-                
-                for element in in_pri_q:
-                    pri_q.put((memory_cells[agent_id][element[0]][element[1]][0], element))
-
-                print(f"5 : {time.perf_counter() - start}")
-
-                while not pri_q.empty():
-                    dist, here = pri_q.get()
-                    for dir_id, (dx, dy) in enumerate(directions):
-                        there = (here[0] + dx, here[1] + dy)
-                        if (not self._check_in_range(np.array(there))) or self._check_wall_blocked(board, np.array(here), np.array(there)):
-                            continue
-                        if memory_cells[agent_id][there[0]][there[1]][0] > dist + 1:
-                            memory_cells[agent_id][there[0]][there[1]][0] = dist + 1
-                            memory_cells[agent_id][there[0]][there[1]][1] = (dir_id + 2) % 4
-                            pri_q.put((memory_cells[agent_id][there[0]][there[1]][0], there))
-
-                print(f"6 : {time.perf_counter() - start}")
-            
-            if not self._check_path_exists(board, memory_cells, 0) or not self._check_path_exists(board, memory_cells, 1):
-                if action_type == 3:
-                    raise ValueError("cannot rotate to block all paths")
-                else:
-                    raise ValueError("cannot place wall blocking all paths")
-
-        next_state = PuoriborState(
-            board=board,
-            walls_remaining=walls_remaining,
-            memory_cells=memory_cells,
-            done=self._check_wins(board),
-        )
-        if post_step_fn is not None:
-            post_step_fn(next_state, agent_id, action)
-        return next_state
-
-    def _check_in_range(self, pos: NDArray[np.int_], bottom_right=None) -> np.bool_:
-        if bottom_right is None:
-            bottom_right = np.array([self.board_size, self.board_size])
-        return np.all(np.logical_and(np.array([0, 0]) <= pos, pos < bottom_right))
-
-    def _check_path_exists(self, board: NDArray[np.int_], memory_cells: NDArray[np.int_], agent_id: int) -> bool:
-        agent_pos = tuple(np.argwhere(board[agent_id] == 1)[0])
-        return memory_cells[agent_id][agent_pos[0]][agent_pos[1]][0] < 99999
-
-    def _check_wall_blocked(
-        self,
-        board: NDArray[np.int_],
-        current_pos: NDArray[np.int_],
-        new_pos: NDArray[np.int_],
-    ) -> bool:
-        delta = new_pos - current_pos
-        right_check = delta[0] > 0 and np.any(
-            board[3, current_pos[0] : new_pos[0], current_pos[1]]
-        )
-        left_check = delta[0] < 0 and np.any(
-            board[3, new_pos[0] : current_pos[0], current_pos[1]]
-        )
-        down_check = delta[1] > 0 and np.any(
-            board[2, current_pos[0], current_pos[1] : new_pos[1]]
-        )
-        up_check = delta[1] < 0 and np.any(
-            board[2, current_pos[0], new_pos[1] : current_pos[1]]
-        )
-        return bool(right_check or left_check or down_check or up_check)
-
-    def _check_wins(self, board: NDArray[np.int_]) -> bool:
-        return bool(board[0, :, -1].sum() or board[1, :, 0].sum())
-
-    def _build_state(self, board: NDArray[np.int_], walls_remaining: NDArray[np.int_], done: bool) -> PuoriborState:
-        """
-        Build a state(including memory_cells) from the current board information(board, walls_remaining and done).
-        :arg state:
-            Current state of the environment.
-        :returns:
-            A state which board is same as the input.
-        """
-        directions = [(0, -1), (1, 0), (0, 1), (-1, 0)]
-
-        memory_cells = np.zeros((2, self.board_size, self.board_size, 2), dtype=np.int_)
-
-        for agent_id in range(2):
-            
-            q = Deque()
-            visited = set()
-            if agent_id == 0:
-                for coordinate_x in range(self.board_size):
-                    q.append((coordinate_x, self.board_size-1))
-                    memory_cells[agent_id][coordinate_x][self.board_size-1][0] = 0
-                    memory_cells[agent_id][coordinate_x][self.board_size-1][1] = 2
-                    visited.add((coordinate_x, self.board_size-1))
-            else:
-                for coordinate_x in range(self.board_size):
-                    q.append((coordinate_x, 0))
-                    memory_cells[agent_id][coordinate_x][0][0] = 0
-                    memory_cells[agent_id][coordinate_x][0][1] = 0
-                    visited.add((coordinate_x, 0))
-            while q:
-                here = q.popleft()
-                for dir_id, (dx, dy) in enumerate(directions):
-                    there = (here[0] + dx, here[1] + dy)
-                    if (not self._check_in_range(np.array(there))) or self._check_wall_blocked(board, np.array(here), np.array(there)):
-                        continue
-                    if there in visited:
-                        continue
-                    memory_cells[agent_id][there[0]][there[1]][0] = memory_cells[agent_id][here[0]][here[1]][0] + 1
-                    memory_cells[agent_id][there[0]][there[1]][1] = (dir_id + 2) % 4
-                    q.append(there)
-                    visited.add(there)
-        
-        new_state = PuoriborState(
-            board=board,
-            walls_remaining=walls_remaining,
-            memory_cells=memory_cells,
-            done=done,
-        )
-
-        return new_state
-
-    def initialize_state(self) -> PuoriborState:
-        """
-        Initialize a :obj:`PuoriborState` object with correct environment parameters.
-        :returns:
-            Created initial state object.
-        """
-        if self.board_size % 2 == 0:
-            raise ValueError(
-                f"cannot center pieces with even board_size={self.board_size}, please "
-                "initialize state manually"
-            )
-
-        starting_pos_0 = np.zeros((self.board_size, self.board_size), dtype=np.int_)
-        starting_pos_0[(self.board_size - 1) // 2, 0] = 1
-
-        starting_board = np.stack(
-            [
-                np.copy(starting_pos_0),
-                np.fliplr(starting_pos_0),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-            ]
-        )
-
-        return self._build_state(starting_board, np.array((self.max_walls, self.max_walls)), False)
\ No newline at end of file
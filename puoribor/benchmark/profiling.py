@@ -1,17 +1,23 @@
 """
 Puoribor Environment Profiling
+Plays a few random games with the profiling hooks of :mod:`new.cythonfn` enabled,
+prints the per-phase counters and timers of ``fast_step`` and ``legal_actions``
+and writes them as collapsed stacks for ``flamegraph.pl`` or speedscope.
+
+    python benchmark/profiling.py --output puoribor.folded
 """
 
+import argparse
+import json
+
 import numpy as np
-import time
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
 from fights.base import BaseAgent
-from new import new_env
-import prof_env
+from new import cythonfn, new_env
 
 class FasterAgent(BaseAgent):
     env_id = ("puoribor", 3)  # type: ignore
@@ -38,23 +44,42 @@ class FasterAgent(BaseAgent):
         actions = self._get_all_actions(state)
         return self._rng.choice(actions)
 
-def run():
+def run(num_games: int = 2, max_plies: int = 40, seed: int = 0) -> dict:
+    """
+    Play ``num_games`` games of :obj:`FasterAgent`, whose trial steps exercise
+    every rejection path, and call ``legal_actions`` before each ply.
+    :returns:
+        The :func:`cythonfn.profile_stats` of the games.
+    """
     assert new_env.PuoriborEnv.env_id == FasterAgent.env_id
 
-    state = new_env.PuoriborEnv().initialize_state()
-    agents = [FasterAgent(0, 0), FasterAgent(1, 0)]
-
-    where_step = 5
+    env = new_env.PuoriborEnv()
+    cythonfn.reset_profile()
+    cythonfn.set_profiling(True)
+    try:
+        for game in range(num_games):
+            state = env.initialize_state()
+            agents = [FasterAgent(0, seed + game), FasterAgent(1, seed + game)]
+            for ply in range(max_plies):
+                agent = agents[ply % 2]
+                env.legal_actions(state, agent.agent_id)
+                state = env.step(state, agent.agent_id, agent(state))
+                if state.done:
+                    break
+    finally:
+        cythonfn.set_profiling(False)
+    return cythonfn.profile_stats()
 
-    for step in range(where_step):
-    
-        for agent in agents:
+if __name__ == "__main__":
 
-            action = agent(state)
-            state = new_env.PuoriborEnv().step(state, agent.agent_id, action)
-        
-    action = agents[0](state)
-    state = prof_env.PuoriborEnv().step(state, agent.agent_id, action)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--num-games", type=int, default=2)
+    parser.add_argument("--max-plies", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write collapsed stacks to this file")
+    args = parser.parse_args()
 
-if __name__ == "__main__":
-    run()
+    print(json.dumps(run(args.num_games, args.max_plies, args.seed), indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(cythonfn.profile_collapsed())
@@ -3,25 +3,272 @@
 import numpy as np
 cimport numpy as np
 
-from cython.parallel import prange, parallel
+from cython.parallel import prange, parallel, threadid
+cimport openmp
+from libc.stdlib cimport malloc, calloc, realloc, free
+from libc.string cimport memset
+
+# Element type of boards, wall counters and legal action arrays (``BOARD_DTYPE``).
+ctypedef unsigned char cell_t
+ctypedef unsigned long long u64
+
+BOARD_DTYPE = np.uint8
+
+cdef struct UndoRecord:
+    signed char agent_id
+    signed char action_type
+    signed char x
+    signed char y
+    # Previous pawn position, only used by moves.
+    signed char prev_x
+    signed char prev_y
+    unsigned char done
+    # Wall and midpoint channels of the window ``[x-1, x+3] x [y-1, y+3]``,
+    # only used by rotations.
+    unsigned char region[4][5][5]
+    u64 hash
+
+include "../../common/transposition.pxi"
+
+cdef enum:
+    MAX_BOARD_SIZE = 13
+    MAX_CELLS = MAX_BOARD_SIZE * MAX_BOARD_SIZE
+
+cdef int _check_board_size(int board_size, board = None) except -1:
+    """
+    Reject board sizes the kernels do not support and, if ``board`` is given,
+    boards whose last two axes are not ``board_size`` long.
+    """
+    if not 5 <= board_size <= MAX_BOARD_SIZE or board_size % 2 == 0:
+        raise ValueError(f"unsupported board_size: {board_size}")
+    if board is not None and tuple(board.shape[-2:]) != (board_size, board_size):
+        raise ValueError(f"invalid board shape: {tuple(board.shape)}")
+    return 0
+
+cdef extern from "<time.h>" nogil:
+    cdef struct timespec:
+        long long tv_sec
+        long tv_nsec
+    int timespec_get(timespec *ts, int base)
+    enum: TIME_UTC
+
+cdef enum:
+    # Phases of ``fast_step`` and ``legal_actions``. Moves, walls and rotations
+    # include their own validation; the path check covers walls and rotations.
+    PHASE_FAST_STEP = 0
+    PHASE_COPY
+    PHASE_HASH
+    PHASE_MOVE
+    PHASE_WALL
+    PHASE_ROTATION
+    PHASE_PATH_CHECK
+    PHASE_LEGAL_ACTIONS
+    PHASE_LEGAL_MOVES
+    PHASE_LEGAL_CANDIDATES
+    NUM_PHASES
+    COUNTER_FAST_STEP_CALLS = 0
+    COUNTER_LEGAL_ACTIONS_CALLS
+    NUM_COUNTERS
+    # Path searches may run on any OpenMP thread, so they are counted per thread.
+    PROFILE_SLOTS = 64
+
+_PHASE_NAMES = (
+    "fast_step",
+    "fast_step;copy",
+    "fast_step;hash",
+    "fast_step;move",
+    "fast_step;wall",
+    "fast_step;rotation",
+    "fast_step;path_check",
+    "legal_actions",
+    "legal_actions;moves",
+    "legal_actions;candidates",
+)
+
+cdef bint _profiling = 0
+cdef long long _phase_ns[NUM_PHASES]
+cdef u64 _phase_calls[NUM_PHASES]
+cdef u64 _counters[NUM_COUNTERS]
+cdef u64 _path_search_calls[PROFILE_SLOTS]
+cdef u64 _path_search_nodes[PROFILE_SLOTS]
+
+cdef inline long long _now_ns() noexcept nogil:
+    cdef timespec ts
+    timespec_get(&ts, TIME_UTC)
+    return ts.tv_sec * 1000000000LL + ts.tv_nsec
+
+cdef inline long long _phase_time(int phase, long long lap) noexcept nogil:
+    """
+    Add the time since ``lap`` to ``phase`` and start the next lap.
+    """
+    cdef long long now = _now_ns()
+    _phase_ns[phase] += now - lap
+    return now
+
+cdef inline long long _phase_lap(int phase, long long lap) noexcept nogil:
+    _phase_calls[phase] += 1
+    return _phase_time(phase, lap)
+
+cdef void _record_path_search(int expanded) noexcept nogil:
+    cdef int slot = min(openmp.omp_get_thread_num(), PROFILE_SLOTS - 1)
+    _path_search_calls[slot] += 1
+    _path_search_nodes[slot] += expanded
+
+def set_profiling(bint enabled):
+    """
+    Turn the per-phase counters and timers of :func:`fast_step` and
+    :func:`legal_actions` on or off. They are off by default, where every hook is a
+    single branch on a module flag.
+    """
+    global _profiling
+    _profiling = enabled
+
+def reset_profile():
+    """
+    Clear every counter and timer.
+    """
+    memset(_phase_ns, 0, sizeof(_phase_ns))
+    memset(_phase_calls, 0, sizeof(_phase_calls))
+    memset(_counters, 0, sizeof(_counters))
+    memset(_path_search_calls, 0, sizeof(_path_search_calls))
+    memset(_path_search_nodes, 0, sizeof(_path_search_nodes))
+
+def profile_stats():
+    """
+    Read the counters and timers collected since the last :func:`reset_profile`.
+    :returns:
+        A dict with ``"phases"``, mapping ``;``-separated phase paths to their
+        completed ``calls`` and inclusive ``total_ns``, and ``"counters"``:
+        ``fast_step_calls``, ``legal_actions_calls``, ``exceptions_raised`` (calls
+        that did not return), ``path_search_calls`` and ``path_search_nodes``
+        (cells expanded by the path searches).
+    """
+    cdef int phase
+    phases = {
+        _PHASE_NAMES[phase]: {"calls": _phase_calls[phase], "total_ns": _phase_ns[phase]}
+        for phase in range(NUM_PHASES)
+    }
+    return {
+        "phases": phases,
+        "counters": {
+            "fast_step_calls": _counters[COUNTER_FAST_STEP_CALLS],
+            "legal_actions_calls": _counters[COUNTER_LEGAL_ACTIONS_CALLS],
+            "exceptions_raised": (
+                _counters[COUNTER_FAST_STEP_CALLS] - _phase_calls[PHASE_FAST_STEP]
+                + _counters[COUNTER_LEGAL_ACTIONS_CALLS] - _phase_calls[PHASE_LEGAL_ACTIONS]
+            ),
+            "path_search_calls": sum(_path_search_calls),
+            "path_search_nodes": sum(_path_search_nodes),
+        },
+    }
+
+def profile_collapsed():
+    """
+    Dump the phase timers in the collapsed stack format read by ``flamegraph.pl``
+    and speedscope: one ``path;to;phase <self time in ns>`` line per phase.
+    """
+    phases = profile_stats()["phases"]
+    self_ns = {name: phase["total_ns"] for name, phase in phases.items()}
+    for name, phase in phases.items():
+        if ";" in name:
+            self_ns[name.rsplit(";", 1)[0]] -= phase["total_ns"]
+    return "".join(f"{name} {max(ns, 0)}\n" for name, ns in self_ns.items() if ns > 0)
 
 def fast_step(
     pre_board,
     pre_walls_remaining,
     int agent_id,
     action,
-    int board_size
+    int board_size,
+    pre_hash = None,
+    pre_memory_cells = None
 ):
+    """
+    Apply ``action`` on a copy of the position.
+    :arg pre_memory_cells:
+        Distance maps of the position as built by :func:`build_memory_cells`, or
+        ``None``. If given, they are repaired incrementally and the path checks
+        become lookups.
+    :returns:
+        A tuple of ``(board, walls_remaining, done, hash, memory_cells)``, where
+        ``memory_cells`` is ``None`` if ``pre_memory_cells`` is.
+    """
 
     cdef int action_type = action[0]
     cdef int x = action[1]
     cdef int y = action[2]
+    cdef u64 hash = 0
+    cdef cell_t [:,:,:] pre_board_view
+    cdef int [:,:,:,::1] memory_cells_view
+    cdef long long started = 0
+    cdef long long lap = 0
 
+    if _profiling:
+        _counters[COUNTER_FAST_STEP_CALLS] += 1
+        started = lap = _now_ns()
+    _check_board_size(board_size, pre_board)
     board = np.copy(pre_board)
     walls_remaining = np.copy(pre_walls_remaining)
+    memory_cells = pre_memory_cells
+
+    cdef cell_t [:,:,:] board_view = board
+    cdef cell_t [:] walls_remaining_view = walls_remaining
+    if _profiling:
+        lap = _phase_lap(PHASE_COPY, lap)
+
+    if pre_hash is not None and 0 <= agent_id <= 1:
+        hash = <u64> pre_hash ^ _zobrist_touched(
+            board_view, walls_remaining_view, agent_id, action_type, x, y, board_size
+        )
+        if _profiling:
+            lap = _phase_time(PHASE_HASH, lap)
+    _step_in_place(board_view, walls_remaining_view, agent_id, action_type, x, y, board_size)
+    if _profiling:
+        lap = _phase_lap(
+            PHASE_MOVE if action_type == 0 else PHASE_WALL if action_type < 3 else PHASE_ROTATION,
+            lap,
+        )
+    if pre_memory_cells is None:
+        _check_paths_after(board_view, action_type, board_size)
+    elif action_type > 0:
+        pre_board_view = pre_board
+        memory_cells = pre_memory_cells.copy()
+        memory_cells_view = memory_cells
+        _repair_memory_cells(pre_board_view, board_view, memory_cells_view, board_size, x, y)
+        if not _memory_path_exists(board_view, memory_cells_view, 0, board_size) or not _memory_path_exists(
+            board_view, memory_cells_view, 1, board_size
+        ):
+            if action_type == 3:
+                raise ValueError("cannot rotate to block all paths")
+            else:
+                raise ValueError("cannot place wall blocking all paths")
+    if _profiling and action_type > 0:
+        lap = _phase_lap(PHASE_PATH_CHECK, lap)
+    if pre_hash is None:
+        hash = _zobrist_hash(board_view, walls_remaining_view, board_size)
+    else:
+        hash ^= _zobrist_touched(
+            board_view, walls_remaining_view, agent_id, action_type, x, y, board_size
+        )
+    if _profiling:
+        _phase_lap(PHASE_HASH, lap)
+        _phase_lap(PHASE_FAST_STEP, started)
 
-    cdef int [:,:,:] board_view = board
-    cdef int [:] walls_remaining_view = walls_remaining
+    return (board, walls_remaining, _check_wins(board_view, board_size), hash, memory_cells)
+
+cdef int _step_in_place(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    int agent_id,
+    int action_type,
+    int x,
+    int y,
+    int board_size
+) except -1:
+    """
+    Validate and apply the action on ``board`` without checking paths to the goal.
+    Raises before touching the board if the action is illegal.
+    """
 
     cdef int curpos_x, curpos_y, newpos_x, newpos_y, opppos_x, opppos_y, delpos_x, delpos_y
     cdef int taxicab_dist, original_jump_pos_x, original_jump_pos_y
@@ -118,11 +365,14 @@ def fast_step(
         elif walls_remaining_view[agent_id] < 2:
             raise ValueError(f"less than two walls left for agent {agent_id}")
 
-        board_rotation(board, board_view, walls_remaining_view, agent_id, board_size, x, y)
+        board_rotation(board_view, walls_remaining_view, agent_id, board_size, x, y)
 
     else:
         raise ValueError(f"invalid action_type: {action_type}")
 
+    return 0
+
+cdef int _check_paths_after(cell_t [:,:,:] board_view, int action_type, int board_size) except -1:
     if action_type > 0:
         
         if not _check_path_exists(board_view, 0, board_size) or not _check_path_exists(board_view, 1, board_size):
@@ -130,63 +380,20 @@ def fast_step(
                 raise ValueError("cannot rotate to block all paths")
             else:
                 raise ValueError("cannot place wall blocking all paths")
-
-    return (board, walls_remaining, _check_wins(board_view, board_size))
+    return 0
 
 cdef void board_rotation(
-    board,
-    int [:,:,:] board_view,
-    int [:] walls_remaining_view,
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
     int agent_id,
     int board_size,
     int x,
-    int y):
-
-    cdef int px, py
-
-    padded_horizontal = np.pad(board[2], 1, constant_values=0)
-    padded_vertical = np.pad(board[3], 1, constant_values=0)
-    padded_horizontal_midpoints = np.pad(board[4], 1, constant_values=0)
-    padded_vertical_midpoints = np.pad(board[5], 1, constant_values=0)
-    px, py = x + 1, y + 1
-    horizontal_region = np.copy(padded_horizontal[px : px + 4, py - 1 : py + 4])
-    vertical_region = np.copy(padded_vertical[px - 1 : px + 4, py : py + 4])
-    padded_horizontal_midpoints[px - 1, py - 1 : py + 4] = 0
-    padded_horizontal_midpoints[px + 3, py - 1 : py + 4] = 0
-    padded_vertical_midpoints[px - 1 : px + 4, py - 1] = 0
-    padded_vertical_midpoints[px - 1 : px + 4, py + 3] = 0
-    horizontal_region_midpoints = np.copy(
-        padded_horizontal_midpoints[px : px + 4, py - 1 : py + 4]
-    )
-    vertical_region_midpoints = np.copy(
-        padded_vertical_midpoints[px - 1 : px + 4, py : py + 4]
-    )
-    horizontal_region_new = np.rot90(vertical_region)
-    vertical_region_new = np.rot90(horizontal_region)
-    horizontal_region_midpoints_new = np.rot90(vertical_region_midpoints)
-    vertical_region_midpoints_new = np.rot90(horizontal_region_midpoints)
-    padded_horizontal[px : px + 4, py - 1 : py + 4] = horizontal_region_new
-    padded_vertical[px - 1 : px + 4, py : py + 4] = vertical_region_new
-    padded_horizontal_midpoints[
-        px - 1 : px + 3, py - 1 : py + 4
-    ] = horizontal_region_midpoints_new
-    padded_vertical_midpoints[
-        px - 1 : px + 4, py : py + 4
-    ] = vertical_region_midpoints_new
-    board[2] = padded_horizontal[1:-1, 1:-1]
-    board[3] = padded_vertical[1:-1, 1:-1]
-    board[4] = padded_horizontal_midpoints[1:-1, 1:-1]
-    board[5] = padded_vertical_midpoints[1:-1, 1:-1]
-    board_view[2, :, board_size-1] = 0
-    board_view[3, board_size-1, :] = 0
-    board_view[4, :, board_size-1] = 0
-    board_view[5, board_size-1, :] = 0
+    int y) noexcept nogil:
 
+    _rotate_section(board_view, x, y, board_size)
     walls_remaining_view[agent_id] -= 2
 
-    return
-
-cdef int _is_moving_legal(int [:,:,:] board_view, int x, int y, int agent_id, int board_size):
+cdef int _is_moving_legal(cell_t [:,:,:] board_view, int x, int y, int agent_id, int board_size):
 
     cdef int curpos_x, curpos_y, newpos_x, newpos_y, opppos_x, opppos_y, delpos_x, delpos_y
     cdef int taxicab_dist, original_jump_pos_x, original_jump_pos_y
@@ -235,12 +442,126 @@ cdef int _is_moving_legal(int [:,:,:] board_view, int x, int y, int agent_id, in
 
     return 1
 
+cdef enum:
+    ROTATION_KEEP = -1
+    ROTATION_CLEAR = -2
+
+# Source of every wall and midpoint cell of the rotation window ``[x-1, x+3] x
+# [y-1, y+3]``, indexed ``[channel - 2][i][j]``: ``c * 25 + i * 5 + j`` to read
+# channel ``2 + c`` of the window before rotating, ``ROTATION_KEEP`` or
+# ``ROTATION_CLEAR``. Horizontal walls and midpoints turn into vertical ones and
+# vice versa, rotated a quarter turn counterclockwise.
+cdef int _rotation_source[4][5][5]
+
+cdef void _init_rotation_tables() noexcept nogil:
+    cdef int i, j
+    for i in range(5):
+        for j in range(5):
+            # Horizontal walls: rows x..x+3 from vertical walls.
+            _rotation_source[0][i][j] = ROTATION_KEEP if i == 0 else 25 + j * 5 + (5 - i)
+            # Vertical walls: columns y..y+3 from horizontal walls.
+            _rotation_source[1][i][j] = ROTATION_KEEP if j == 0 else j * 5 + (4 - i)
+            # Midpoints on the border of the window are cleared.
+            _rotation_source[2][i][j] = 75 + j * 5 + (4 - i) if 0 < i < 4 else ROTATION_CLEAR
+            _rotation_source[3][i][j] = 50 + j * 5 + (4 - i) if 0 < j < 4 else ROTATION_CLEAR
+
+_init_rotation_tables()
+
+cdef void _rotate_section(cell_t [:,:,:] board_view, int x, int y, int board_size) noexcept nogil:
+    """
+    Rotate the walls and midpoints of the section at ``(x, y)`` in place through
+    ``_rotation_source``. Only the window ``[x-1, x+3] x [y-1, y+3]`` changes.
+    """
+    cdef cell_t region[4][5][5]
+    cdef int c, i, j, source, row, col
+
+    for c in range(4):
+        for i in range(5):
+            for j in range(5):
+                if _check_in_range(x - 1 + i, y - 1 + j, board_size):
+                    region[c][i][j] = board_view[2 + c, x - 1 + i, y - 1 + j]
+                else:
+                    region[c][i][j] = 0
+
+    for c in range(4):
+        for i in range(5):
+            row = x - 1 + i
+            if not 0 <= row < board_size:
+                continue
+            for j in range(5):
+                col = y - 1 + j
+                if not 0 <= col < board_size:
+                    continue
+                source = _rotation_source[c][i][j]
+                # Walls and midpoints never lie on the last column (horizontal) or
+                # row (vertical) of the board.
+                if source == ROTATION_CLEAR or (col == board_size - 1 if c % 2 == 0 else row == board_size - 1):
+                    board_view[2 + c, row, col] = 0
+                elif source != ROTATION_KEEP:
+                    board_view[2 + c, row, col] = region[source // 25][(source // 5) % 5][source % 5]
+
+cdef int _is_wall_legal(cell_t [:,:,:] scratch_view, int action_type, int x, int y, int board_size) noexcept nogil:
+    """
+    Check a wall placement of an agent with walls left. The wall is placed on
+    ``scratch_view`` for the path search and removed again.
+    """
+    cdef int legal
+    if action_type == 1:
+        if scratch_view[2, x, y] or scratch_view[2, x + 1, y] or scratch_view[5, x, y]:
+            return 0
+        scratch_view[2, x, y] = 1
+        scratch_view[2, x + 1, y] = 1
+        legal = _check_path_exists(scratch_view, 0, board_size) and _check_path_exists(scratch_view, 1, board_size)
+        scratch_view[2, x, y] = 0
+        scratch_view[2, x + 1, y] = 0
+    else:
+        if scratch_view[3, x, y] or scratch_view[3, x, y + 1] or scratch_view[4, x, y]:
+            return 0
+        scratch_view[3, x, y] = 1
+        scratch_view[3, x, y + 1] = 1
+        legal = _check_path_exists(scratch_view, 0, board_size) and _check_path_exists(scratch_view, 1, board_size)
+        scratch_view[3, x, y] = 0
+        scratch_view[3, x, y + 1] = 0
+    return legal
+
+cdef int _is_rotation_legal(cell_t [:,:,:] scratch_view, int x, int y, int board_size) noexcept nogil:
+    """
+    Check a rotation of an agent with at least two walls left. The section is
+    rotated on ``scratch_view`` for the path search and restored again.
+    """
+    cdef cell_t region[4][5][5]
+    cdef int legal, c, i, j
+    for c in range(4):
+        for i in range(5):
+            for j in range(5):
+                if _check_in_range(x - 1 + i, y - 1 + j, board_size):
+                    region[c][i][j] = scratch_view[2 + c, x - 1 + i, y - 1 + j]
+    _rotate_section(scratch_view, x, y, board_size)
+    legal = _check_path_exists(scratch_view, 0, board_size) and _check_path_exists(scratch_view, 1, board_size)
+    for c in range(4):
+        for i in range(5):
+            for j in range(5):
+                if _check_in_range(x - 1 + i, y - 1 + j, board_size):
+                    scratch_view[2 + c, x - 1 + i, y - 1 + j] = region[c][i][j]
+    return legal
+
 def legal_actions(state, int agent_id, int board_size):
     
     cdef int dir_id, action_type, next_pos_x, next_pos_y, cx, cy, nowpos_x, nowpos_y
     cdef int directions[12][2]
-    cdef int [:,:,:] board_view = state.board
+    cdef cell_t [:,:,:] board_view = state.board
+    cdef cell_t [:] walls_remaining_view = state.walls_remaining
+    cdef int num_walls, num_candidates, num_threads, k, wall_cnt
+    cdef cell_t [:,:,:,:] scratch_view
+    cdef long long started = 0
+    cdef long long lap = 0
 
+    if _profiling:
+        _counters[COUNTER_LEGAL_ACTIONS_CALLS] += 1
+        started = lap = _now_ns()
+    _check_board_size(board_size, state.board)
+    if not 0 <= agent_id <= 1:
+        raise ValueError(f"invalid agent_id: {agent_id}")
     directions[0][:] = [0, -2]
     directions[1][:] = [-1, -1]
     directions[2][:] = [0, -1]
@@ -254,8 +575,8 @@ def legal_actions(state, int agent_id, int board_size):
     directions[10][:] = [1, 1]
     directions[11][:] = [0, 2]
 
-    legal_actions_np = np.zeros((4, 9, 9), dtype=np.int_)
-    cdef int [:,:,:] legal_actions_np_view = legal_actions_np
+    legal_actions_np = np.zeros((4, board_size, board_size), dtype=BOARD_DTYPE)
+    cdef cell_t [:,:,:] legal_actions_np_view = legal_actions_np
     (nowpos_x, nowpos_y) = _agent_pos(board_view, agent_id, board_size)
     
     for dir_id in range(12):
@@ -263,147 +584,608 @@ def legal_actions(state, int agent_id, int board_size):
         next_pos_y = nowpos_y + directions[dir_id][1]
         if _is_moving_legal(board_view, next_pos_x, next_pos_y, agent_id, board_size):
             legal_actions_np_view[0, next_pos_x, next_pos_y] = 1
-    for action_type in range(1, 3):
-        for cx in range(board_size-1):
-            for cy in range(board_size-1):
-                try:
-                    fast_step(state.board, state.walls_remaining, agent_id, (action_type, cx, cy), board_size)
-                except:
-                    ...
-                else:
-                    legal_actions_np_view[action_type, cx, cy] = 1
-    for cx in range(board_size-3):
-        for cy in range(board_size-3):
-            try:
-                fast_step(state.board, state.walls_remaining, agent_id, (3, cx, cy), board_size)
-            except:
-                ...
+    if _profiling:
+        lap = _phase_lap(PHASE_LEGAL_MOVES, lap)
+
+    # Candidates are numbered horizontal walls, vertical walls, then rotations.
+    # Each thread checks them on its own copy of the board.
+    num_walls = (board_size-1) * (board_size-1)
+    wall_cnt = walls_remaining_view[agent_id]
+    num_candidates = 0
+    if wall_cnt >= 1:
+        num_candidates = 2 * num_walls
+    if wall_cnt >= 2:
+        num_candidates += (board_size-3) * (board_size-3)
+    if num_candidates == 0:
+        if _profiling:
+            _phase_lap(PHASE_LEGAL_ACTIONS, started)
+        return legal_actions_np
+
+    num_threads = min(openmp.omp_get_max_threads(), num_candidates)
+    scratch = np.repeat(np.asarray(board_view)[np.newaxis], num_threads, axis=0)
+    scratch_view = scratch
+
+    with nogil, parallel(num_threads=num_threads):
+        for k in prange(num_candidates, schedule="dynamic"):
+            if k < 2 * num_walls:
+                action_type = 1 + k // num_walls
+                cx = (k % num_walls) // (board_size-1)
+                cy = (k % num_walls) % (board_size-1)
+                legal_actions_np_view[action_type, cx, cy] = _is_wall_legal(
+                    scratch_view[threadid()], action_type, cx, cy, board_size
+                )
             else:
-                legal_actions_np_view[3, cx, cy] = 1
+                cx = (k - 2 * num_walls) // (board_size-3)
+                cy = (k - 2 * num_walls) % (board_size-3)
+                legal_actions_np_view[3, cx, cy] = _is_rotation_legal(
+                    scratch_view[threadid()], cx, cy, board_size
+                )
+    if _profiling:
+        _phase_lap(PHASE_LEGAL_CANDIDATES, lap)
+        _phase_lap(PHASE_LEGAL_ACTIONS, started)
     return legal_actions_np
 
-cdef int _check_in_range(int pos_x, int pos_y, int bottom_right = 9):
+def zobrist_hash(board, walls_remaining, int board_size):
+    """
+    Compute the 64-bit Zobrist hash of a position from scratch. ``fast_step``
+    updates it incrementally when given the previous hash.
+    """
+    _check_board_size(board_size, board)
+    return _zobrist_hash(board, walls_remaining, board_size)
+
+# Keys are indexed by ``[channel][label][x][y]``; label 0 keys stay zero so empty
+# cells do not contribute to the hash.
+cdef u64 _zobrist_cells[6][3][MAX_BOARD_SIZE][MAX_BOARD_SIZE]
+cdef u64 _zobrist_walls_remaining[2][256]
+
+cdef void _init_zobrist() noexcept nogil:
+    cdef u64 seed = 0x50756F7269626F72ULL
+    cdef int c, label, i, j
+    for c in range(6):
+        for i in range(MAX_BOARD_SIZE):
+            for j in range(MAX_BOARD_SIZE):
+                _zobrist_cells[c][0][i][j] = 0
+                for label in range(1, 3):
+                    _zobrist_cells[c][label][i][j] = _splitmix64(&seed)
+    for c in range(2):
+        for i in range(256):
+            _zobrist_walls_remaining[c][i] = _splitmix64(&seed)
+
+_init_zobrist()
+
+cdef u64 _zobrist_hash(
+    cell_t [:,:,:] board_view, cell_t [:] walls_remaining_view, int board_size
+) noexcept nogil:
+    cdef u64 hash = 0
+    cdef int c, i, j
+    for c in range(6):
+        for i in range(board_size):
+            for j in range(board_size):
+                hash ^= _zobrist_cells[c][board_view[c, i, j]][i][j]
+    hash ^= _zobrist_walls_remaining[0][walls_remaining_view[0]]
+    hash ^= _zobrist_walls_remaining[1][walls_remaining_view[1]]
+    return hash
+
+cdef inline u64 _zobrist_cell(cell_t [:,:,:] board_view, int c, int i, int j, int board_size) noexcept nogil:
+    if not (0 <= i < board_size and 0 <= j < board_size):
+        return 0
+    return _zobrist_cells[c][board_view[c, i, j]][i][j]
+
+cdef u64 _zobrist_touched(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    int agent_id,
+    int action_type,
+    int x,
+    int y,
+    int board_size
+):
+    """
+    Hash of every cell the action can change and of the agent's wall count. Taking
+    it before and after the action gives the hash difference.
+    """
+    cdef u64 hash = _zobrist_walls_remaining[agent_id][walls_remaining_view[agent_id]]
+    cdef int c, i, j, pos_x, pos_y
+    if action_type == 0:
+        (pos_x, pos_y) = _agent_pos(board_view, agent_id, board_size)
+        hash ^= _zobrist_cell(board_view, agent_id, pos_x, pos_y, board_size)
+    elif action_type == 1:
+        hash ^= _zobrist_cell(board_view, 2, x, y, board_size)
+        hash ^= _zobrist_cell(board_view, 2, x + 1, y, board_size)
+        hash ^= _zobrist_cell(board_view, 4, x, y, board_size)
+    elif action_type == 2:
+        hash ^= _zobrist_cell(board_view, 3, x, y, board_size)
+        hash ^= _zobrist_cell(board_view, 3, x, y + 1, board_size)
+        hash ^= _zobrist_cell(board_view, 5, x, y, board_size)
+    elif action_type == 3:
+        for c in range(2, 6):
+            for i in range(x - 1, x + 4):
+                for j in range(y - 1, y + 4):
+                    hash ^= _zobrist_cell(board_view, c, i, j, board_size)
+    return hash
+
+cdef int _check_in_range(int pos_x, int pos_y, int bottom_right) noexcept nogil:
     return (0 <= pos_x < bottom_right and 0 <= pos_y < bottom_right)
 
-cdef int _check_path_exists(int [:,:,:] board_view, int agent_id, int board_size):
+cdef int _check_path_exists(cell_t [:,:,:] board_view, int agent_id, int board_size) noexcept nogil:
+    cdef int expanded = 0
+    cdef int found = _search_path(board_view, agent_id, board_size, &expanded)
+    if _profiling:
+        _record_path_search(expanded)
+    return found
 
-    cdef int pos_x, pos_y
-    cdef int i, j, k
-    cdef int there_x, there_y
-    cdef int goal = (1-agent_id) * 8
-    cdef (int, int) frontier[81]
-    cdef (int, int) new_frontier[81][4]
-    cdef int frontier_cnt_old = 0, frontier_cnt_now = 0
-    cdef int new_frontier_cnt[81]
-    cdef int visited[81][81]
+cdef int _search_path(cell_t [:,:,:] board_view, int agent_id, int board_size, int *expanded) noexcept nogil:
+    """
+    Depth-first search from the pawn of ``agent_id`` to its goal row, trying the
+    step towards the goal first. Counts popped cells in ``expanded``.
+    """
 
-    for i in range(9):
-        for j in range(9):
-            visited[i][j] = 0
+    cdef int pos_x, pos_y, cell
+    cdef int goal = (1-agent_id) * (board_size-1)
+    cdef int forward = 1 if agent_id == 0 else -1
+    cdef int stack[MAX_CELLS]
+    cdef int stack_cnt = 0
+    cdef unsigned char visited[MAX_CELLS]
 
     (pos_x, pos_y) = _agent_pos(board_view, agent_id, board_size)
     if pos_y == goal:   return 1
-    
-    frontier[frontier_cnt_old] = (pos_x, pos_y)
-    frontier_cnt_old += 1
-    visited[pos_x][pos_y] = 1
-
-    for i in range(board_size * board_size):
-        if frontier_cnt_old == 0:   break
-
-        if agent_id == 0:
-            with nogil, parallel():
-                for j in prange(frontier_cnt_old, schedule="dynamic"):
-                    (pos_x, pos_y) = frontier[j]
-                    new_frontier_cnt[j] = 0
-
-                    there_x = pos_x
-                    there_y = pos_y + 1
-                    if there_y < board_size:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[2, pos_x, pos_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-                                if there_y == goal: break
-                    
-                    there_x = pos_x + 1
-                    there_y = pos_y
-                    if there_x < board_size:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[3, pos_x, pos_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-
-                    there_x = pos_x - 1
-                    there_y = pos_y
-                    if there_x >= 0:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[3, there_x, pos_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-                    
-                    there_x = pos_x
-                    there_y = pos_y - 1
-                    if there_y >= 0:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[2, pos_x, there_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-        else:
-            with nogil, parallel():
-                for j in prange(frontier_cnt_old, schedule="dynamic"):
-                    (pos_x, pos_y) = frontier[j]
-                    new_frontier_cnt[j] = 0
-
-                    there_x = pos_x
-                    there_y = pos_y - 1
-                    if there_y >= 0:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[2, pos_x, there_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-                                if there_y == goal: break
-                    
-                    there_x = pos_x + 1
-                    there_y = pos_y
-                    if there_x < board_size:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[3, pos_x, pos_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-
-                    there_x = pos_x - 1
-                    there_y = pos_y
-                    if there_x >= 0:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[3, there_x, pos_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-                    
-                    there_x = pos_x
-                    there_y = pos_y + 1
-                    if there_y < board_size:
-                        if visited[there_x][there_y] == 0:
-                            if board_view[2, pos_x, pos_y] == 0:
-                                new_frontier[j][new_frontier_cnt[j]] = (there_x, there_y)
-                                new_frontier_cnt[j] += 1
-        
-        frontier_cnt_now = 0
-        for j in range(frontier_cnt_old):
-            for k in range(new_frontier_cnt[j]):
-                (pos_x, pos_y) = new_frontier[j][k]
-                if pos_y == goal:
+
+    memset(visited, 0, board_size * board_size)
+    cell = pos_x * board_size + pos_y
+    visited[cell] = 1
+    stack[stack_cnt] = cell
+    stack_cnt += 1
+
+    while stack_cnt:
+        stack_cnt -= 1
+        expanded[0] += 1
+        cell = stack[stack_cnt]
+        pos_x = cell // board_size
+        pos_y = cell % board_size
+
+        # Pushed last so that it is popped first.
+        if pos_y - forward >= 0 and pos_y - forward < board_size and not visited[cell - forward]:
+            if board_view[2, pos_x, pos_y - (forward > 0)] == 0:
+                visited[cell - forward] = 1
+                stack[stack_cnt] = cell - forward
+                stack_cnt += 1
+        if pos_x > 0 and not visited[cell - board_size] and board_view[3, pos_x - 1, pos_y] == 0:
+            visited[cell - board_size] = 1
+            stack[stack_cnt] = cell - board_size
+            stack_cnt += 1
+        if pos_x + 1 < board_size and not visited[cell + board_size] and board_view[3, pos_x, pos_y] == 0:
+            visited[cell + board_size] = 1
+            stack[stack_cnt] = cell + board_size
+            stack_cnt += 1
+        if pos_y + forward >= 0 and pos_y + forward < board_size and not visited[cell + forward]:
+            if board_view[2, pos_x, pos_y - (forward < 0)] == 0:
+                if pos_y + forward == goal:
                     return 1
-                if visited[pos_x][pos_y] == 0:
-                    visited[pos_x][pos_y] = 1
-                    frontier[frontier_cnt_now] = (pos_x, pos_y)
-                    frontier_cnt_now += 1
-        
-        frontier_cnt_old = frontier_cnt_now
+                visited[cell + forward] = 1
+                stack[stack_cnt] = cell + forward
+                stack_cnt += 1
 
     return 0
 
-cdef int _check_wall_blocked(int [:,:,:] board_view, int cx, int cy, int nx, int ny):
+cdef enum:
+    UNREACHABLE = 99999
+    # Upper bound of the heap in ``_repair_memory_cells``: every cell enters it at
+    # most once as a seed per neighbour, once per changed edge and once per
+    # improving relaxation.
+    MEMORY_HEAP_SIZE = 12 * MAX_CELLS
+
+MEMORY_UNREACHABLE = UNREACHABLE
+"""
+Distance stored in ``memory_cells`` for cells with no path to the goal row.
+"""
+
+# Pointing directions of ``memory_cells``: up (-y), right (+x), down (+y), left (-x).
+cdef int _memory_dx[4]
+cdef int _memory_dy[4]
+_memory_dx[:] = [0, 1, 0, -1]
+_memory_dy[:] = [-1, 0, 1, 0]
+
+cdef inline bint _memory_step_open(cell_t [:,:,:] board_view, int x, int y, int direction, int board_size) noexcept nogil:
+    """
+    Whether the pawn can step from ``(x, y)`` towards ``direction`` on the board.
+    """
+    if direction == 0:
+        return y > 0 and board_view[2, x, y - 1] == 0
+    elif direction == 1:
+        return x + 1 < board_size and board_view[3, x, y] == 0
+    elif direction == 2:
+        return y + 1 < board_size and board_view[2, x, y] == 0
+    return x > 0 and board_view[3, x - 1, y] == 0
+
+cdef void _build_memory_cells(cell_t [:,:,:] board_view, int [:,:,:,::1] memory_cells_view, int board_size) noexcept nogil:
+    """
+    Breadth-first search from the goal row of each agent, storing the distance of
+    every cell and the direction of its next step towards the goal.
+    """
+    cdef int queue[MAX_CELLS]
+    cdef int head, tail, agent_id, x, y, nx, ny, direction, goal
+
+    for agent_id in range(2):
+        goal = (1-agent_id) * (board_size-1)
+        head = 0
+        tail = 0
+        for x in range(board_size):
+            for y in range(board_size):
+                memory_cells_view[agent_id, x, y, 0] = UNREACHABLE
+                memory_cells_view[agent_id, x, y, 1] = -1
+        for x in range(board_size):
+            memory_cells_view[agent_id, x, goal, 0] = 0
+            memory_cells_view[agent_id, x, goal, 1] = 2 if agent_id == 0 else 0
+            queue[tail] = x * board_size + goal
+            tail += 1
+        while head < tail:
+            x = queue[head] // board_size
+            y = queue[head] % board_size
+            head += 1
+            for direction in range(4):
+                if not _memory_step_open(board_view, x, y, direction, board_size):
+                    continue
+                nx = x + _memory_dx[direction]
+                ny = y + _memory_dy[direction]
+                if memory_cells_view[agent_id, nx, ny, 0] != UNREACHABLE:
+                    continue
+                memory_cells_view[agent_id, nx, ny, 0] = memory_cells_view[agent_id, x, y, 0] + 1
+                memory_cells_view[agent_id, nx, ny, 1] = (direction + 2) % 4
+                queue[tail] = nx * board_size + ny
+                tail += 1
+
+cdef inline void _memory_heap_push(int *heap, int *heap_cnt, int distance, int cell) noexcept nogil:
+    # Binary min-heap of ``distance * MAX_CELLS + cell`` keys.
+    cdef int i = heap_cnt[0]
+    cdef int key = distance * MAX_CELLS + cell
+    heap_cnt[0] += 1
+    while i > 0 and heap[(i - 1) // 2] > key:
+        heap[i] = heap[(i - 1) // 2]
+        i = (i - 1) // 2
+    heap[i] = key
+
+cdef inline int _memory_heap_pop(int *heap, int *heap_cnt) noexcept nogil:
+    cdef int top = heap[0]
+    cdef int last, i, child
+    heap_cnt[0] -= 1
+    last = heap[heap_cnt[0]]
+    i = 0
+    while 2 * i + 1 < heap_cnt[0]:
+        child = 2 * i + 1
+        if child + 1 < heap_cnt[0] and heap[child + 1] < heap[child]:
+            child += 1
+        if heap[child] >= last:
+            break
+        heap[i] = heap[child]
+        i = child
+    heap[i] = last
+    return top
+
+cdef void _repair_memory_cells(
+    cell_t [:,:,:] pre_board_view,
+    cell_t [:,:,:] board_view,
+    int [:,:,:,::1] memory_cells_view,
+    int board_size,
+    int x0,
+    int y0
+) noexcept nogil:
+    """
+    Update distance maps of ``pre_board`` to ``board``, which may only differ in
+    the walls of the window ``[x0-1, x0+3] x [y0-1, y0+3]``. Cells whose pointer
+    chain crosses a new wall are cut off, then a Dijkstra search seeded from
+    their intact neighbours and from both ends of opened edges restores every
+    distance that grew or shrank.
+    """
+    cdef int cut[MAX_CELLS]
+    cdef unsigned char in_cut[MAX_CELLS]
+    cdef int heap[MEMORY_HEAP_SIZE]
+    # Changed edges as ``cell * 4 + direction`` (right or down), opened or closed.
+    cdef int changed[50]
+    cdef bint opened[50]
+    cdef int changed_cnt = 0
+    cdef int cut_cnt, cut_head, heap_cnt, agent_id, x, y, nx, ny, direction, cell, distance, i
+    cdef bint was_open, is_open
+
+    for x in range(max(x0 - 1, 0), min(x0 + 4, board_size)):
+        for y in range(max(y0 - 1, 0), min(y0 + 4, board_size)):
+            for direction in range(1, 3):
+                was_open = _memory_step_open(pre_board_view, x, y, direction, board_size)
+                is_open = _memory_step_open(board_view, x, y, direction, board_size)
+                if was_open != is_open:
+                    changed[changed_cnt] = (x * board_size + y) * 4 + direction
+                    opened[changed_cnt] = is_open
+                    changed_cnt += 1
+
+    for agent_id in range(2):
+        cut_cnt = 0
+        heap_cnt = 0
+        memset(in_cut, 0, board_size * board_size)
+
+        # Cut the cells stepping over new walls and seed both ends of opened edges.
+        for i in range(changed_cnt):
+            direction = changed[i] % 4
+            x = changed[i] // 4 // board_size
+            y = changed[i] // 4 % board_size
+            nx = x + _memory_dx[direction]
+            ny = y + _memory_dy[direction]
+            if opened[i]:
+                if memory_cells_view[agent_id, x, y, 0] != UNREACHABLE:
+                    _memory_heap_push(heap, &heap_cnt, memory_cells_view[agent_id, x, y, 0], x * board_size + y)
+                if memory_cells_view[agent_id, nx, ny, 0] != UNREACHABLE:
+                    _memory_heap_push(heap, &heap_cnt, memory_cells_view[agent_id, nx, ny, 0], nx * board_size + ny)
+            else:
+                if memory_cells_view[agent_id, x, y, 1] == direction and not in_cut[x * board_size + y]:
+                    in_cut[x * board_size + y] = 1
+                    cut[cut_cnt] = x * board_size + y
+                    cut_cnt += 1
+                if memory_cells_view[agent_id, nx, ny, 1] == (direction + 2) % 4 and not in_cut[nx * board_size + ny]:
+                    in_cut[nx * board_size + ny] = 1
+                    cut[cut_cnt] = nx * board_size + ny
+                    cut_cnt += 1
+
+        # Everything pointing into a cut cell loses its path too.
+        cut_head = 0
+        while cut_head < cut_cnt:
+            cell = cut[cut_head]
+            cut_head += 1
+            x = cell // board_size
+            y = cell % board_size
+            memory_cells_view[agent_id, x, y, 0] = UNREACHABLE
+            memory_cells_view[agent_id, x, y, 1] = -1
+            for direction in range(4):
+                nx = x + _memory_dx[direction]
+                ny = y + _memory_dy[direction]
+                if not (0 <= nx < board_size and 0 <= ny < board_size):
+                    continue
+                if not in_cut[nx * board_size + ny] and memory_cells_view[agent_id, nx, ny, 1] == (direction + 2) % 4:
+                    in_cut[nx * board_size + ny] = 1
+                    cut[cut_cnt] = nx * board_size + ny
+                    cut_cnt += 1
+
+        # Intact neighbours of cut cells.
+        for cut_head in range(cut_cnt):
+            x = cut[cut_head] // board_size
+            y = cut[cut_head] % board_size
+            for direction in range(4):
+                if not _memory_step_open(board_view, x, y, direction, board_size):
+                    continue
+                nx = x + _memory_dx[direction]
+                ny = y + _memory_dy[direction]
+                if not in_cut[nx * board_size + ny] and memory_cells_view[agent_id, nx, ny, 0] != UNREACHABLE:
+                    _memory_heap_push(heap, &heap_cnt, memory_cells_view[agent_id, nx, ny, 0], nx * board_size + ny)
+
+        while heap_cnt:
+            cell = _memory_heap_pop(heap, &heap_cnt)
+            distance = cell // MAX_CELLS
+            cell = cell % MAX_CELLS
+            x = cell // board_size
+            y = cell % board_size
+            if distance != memory_cells_view[agent_id, x, y, 0]:
+                continue
+            for direction in range(4):
+                if not _memory_step_open(board_view, x, y, direction, board_size):
+                    continue
+                nx = x + _memory_dx[direction]
+                ny = y + _memory_dy[direction]
+                if memory_cells_view[agent_id, nx, ny, 0] > distance + 1:
+                    memory_cells_view[agent_id, nx, ny, 0] = distance + 1
+                    memory_cells_view[agent_id, nx, ny, 1] = (direction + 2) % 4
+                    _memory_heap_push(heap, &heap_cnt, distance + 1, nx * board_size + ny)
+
+cdef inline bint _memory_path_exists(
+    cell_t [:,:,:] board_view, int [:,:,:,::1] memory_cells_view, int agent_id, int board_size
+) noexcept nogil:
+    cdef int x, y
+    (x, y) = _agent_pos(board_view, agent_id, board_size)
+    return memory_cells_view[agent_id, x, y, 0] != UNREACHABLE
+
+def build_memory_cells(board, int board_size):
+    """
+    Build the distance maps of a position from scratch.
+    :returns:
+        An ``np.intc`` array of shape ``(2, board_size, board_size, 2)``. Entry
+        ``[agent_id, x, y, 0]`` is the number of steps from ``(x, y)`` to the goal
+        row of ``agent_id`` ignoring pawns (:data:`MEMORY_UNREACHABLE` if there
+        is no path), ``[agent_id, x, y, 1]`` the direction of the next step
+        (0: up, 1: right, 2: down, 3: left, -1 if unreachable).
+    """
+    cdef cell_t [:,:,:] board_view = board
+    _check_board_size(board_size, board)
+    memory_cells = np.empty((2, board_size, board_size, 2), dtype=np.intc)
+    cdef int [:,:,:,::1] memory_cells_view = memory_cells
+    _build_memory_cells(board_view, memory_cells_view, board_size)
+    return memory_cells
+
+cdef enum:
+    STATE_VERSION = 1
+    STATE_HEADER_SIZE = 16
+    # Horizontal walls of agent 0 and 1, vertical walls of agent 0 and 1, then
+    # horizontal and vertical wall midpoints.
+    STATE_WALL_MASKS = 6
+    STATE_NO_PAWN = 255
+
+STATE_FORMAT_VERSION = STATE_VERSION
+"""
+Version byte leading every record written by :func:`pack_state`.
+"""
+
+cdef inline int _mask_bytes(int board_size) noexcept nogil:
+    return (board_size * board_size + 7) // 8
+
+cdef inline int _state_record_size(int board_size) noexcept nogil:
+    return STATE_HEADER_SIZE + STATE_WALL_MASKS * _mask_bytes(board_size)
+
+def state_record_size(int board_size):
+    """
+    Size in bytes of every record written by :func:`pack_state` for ``board_size``.
+    """
+    _check_board_size(board_size)
+    return _state_record_size(board_size)
+
+cdef void _pack_state(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    bint done,
+    u64 zobrist,
+    int board_size,
+    unsigned char *record
+) noexcept nogil:
+    cdef unsigned char *masks = record + STATE_HEADER_SIZE
+    cdef int mask_bytes = _mask_bytes(board_size)
+    cdef int x, y, i, channel, label
+    memset(record, 0, _state_record_size(board_size))
+    record[0] = STATE_VERSION
+    record[1] = board_size
+    record[2] = done
+    record[3] = STATE_NO_PAWN
+    record[4] = STATE_NO_PAWN
+    record[5] = walls_remaining_view[0]
+    record[6] = walls_remaining_view[1]
+    for i in range(8):
+        record[8 + i] = (zobrist >> (8 * i)) & 0xFF
+    for x in range(board_size):
+        for y in range(board_size):
+            i = x * board_size + y
+            if board_view[0, x, y]:
+                record[3] = i
+            if board_view[1, x, y]:
+                record[4] = i
+            for channel in range(2):
+                label = board_view[2 + channel, x, y]
+                if label == 1 or label == 2:
+                    masks[(2 * channel + label - 1) * mask_bytes + (i >> 3)] |= 1 << (i & 7)
+                if board_view[4 + channel, x, y]:
+                    masks[(4 + channel) * mask_bytes + (i >> 3)] |= 1 << (i & 7)
+
+cdef bint _unpack_state(
+    const unsigned char *record,
+    int board_size,
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    u64 *zobrist
+) noexcept nogil:
+    cdef const unsigned char *masks = record + STATE_HEADER_SIZE
+    cdef int mask_bytes = _mask_bytes(board_size)
+    cdef int x, y, i, channel
+    cdef u64 hash = 0
+    for x in range(board_size):
+        for y in range(board_size):
+            i = x * board_size + y
+            board_view[0, x, y] = record[3] == i
+            board_view[1, x, y] = record[4] == i
+            for channel in range(2):
+                board_view[2 + channel, x, y] = (
+                    ((masks[2 * channel * mask_bytes + (i >> 3)] >> (i & 7)) & 1)
+                    | (((masks[(2 * channel + 1) * mask_bytes + (i >> 3)] >> (i & 7)) & 1) << 1)
+                )
+                board_view[4 + channel, x, y] = (
+                    masks[(4 + channel) * mask_bytes + (i >> 3)] >> (i & 7)
+                ) & 1
+    walls_remaining_view[0] = record[5]
+    walls_remaining_view[1] = record[6]
+    for i in range(8):
+        hash |= (<u64>record[8 + i]) << (8 * i)
+    zobrist[0] = hash
+    return record[2] & 1
+
+cdef int _check_record(const unsigned char *record, int board_size) except -1:
+    if record[0] != STATE_VERSION:
+        raise ValueError(f"unsupported state format version: {record[0]}")
+    if record[1] != board_size:
+        raise ValueError(f"unsupported board_size: {record[1]}")
+    return 0
+
+def pack_state(board, walls_remaining, bint done, u64 zobrist, int board_size):
+    """
+    Encode a position as a fixed-size record of :func:`state_record_size` bytes.
+
+    Layout: format version, ``board_size``, flags (bit 0: ``done``), cell index
+    ``x * board_size + y`` of each pawn, ``walls_remaining``, one padding byte and
+    the little-endian Zobrist hash, followed by the masks of horizontal walls of
+    agent 0 and 1, vertical walls of agent 0 and 1, and horizontal and vertical
+    wall midpoints. Cell ``i`` is bit ``i % 8`` of byte ``i // 8`` of a mask.
+    """
+    cdef cell_t [:,:,:] board_view = board
+    cdef cell_t [:] walls_remaining_view = walls_remaining
+    _check_board_size(board_size, board)
+    record = bytearray(_state_record_size(board_size))
+    cdef unsigned char [:] record_view = record
+    _pack_state(board_view, walls_remaining_view, done, zobrist, board_size, &record_view[0])
+    return bytes(record)
+
+def unpack_state(data):
+    """
+    Decode a record written by :func:`pack_state`.
+
+    :returns:
+        A tuple of ``(board, walls_remaining, done, zobrist)``.
+    """
+    cdef const unsigned char [:] data_view = data
+    if data_view.shape[0] < STATE_HEADER_SIZE:
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    cdef int board_size = data_view[1]
+    _check_board_size(board_size)
+    if data_view.shape[0] != _state_record_size(board_size):
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    _check_record(&data_view[0], board_size)
+
+    board = np.empty((6, board_size, board_size), dtype=BOARD_DTYPE)
+    walls_remaining = np.empty((2,), dtype=BOARD_DTYPE)
+    cdef u64 zobrist
+    done = _unpack_state(&data_view[0], board_size, board, walls_remaining, &zobrist)
+    return board, walls_remaining, done, zobrist
+
+def unpack_states(data, boards, walls_remaining, done, zobrist):
+    """
+    Decode consecutive records written by :func:`pack_state` straight into
+    preallocated arrays. ``data`` is read in place, so it can be a slice of a
+    file mapping or a shared memory block.
+
+    :arg boards:
+        :data:`BOARD_DTYPE` array of shape ``(N, 6, board_size, board_size)``.
+    :arg walls_remaining:
+        :data:`BOARD_DTYPE` array of shape ``(N, 2)``.
+    :arg done:
+        ``np.bool_`` array of shape ``(N,)``.
+    :arg zobrist:
+        ``np.uint64`` array of shape ``(N,)``.
+    :returns:
+        Number of decoded records, which fill the first rows of each array.
+    """
+    cdef const unsigned char [:] data_view = data
+    cdef cell_t [:,:,:,:] boards_view = boards
+    cdef cell_t [:,:] walls_remaining_view = walls_remaining
+    cdef np.uint8_t [:] done_view = done.view(np.uint8)
+    cdef u64 [:] zobrist_view = zobrist
+    cdef int board_size = boards_view.shape[2]
+    cdef Py_ssize_t record_size, count, index
+    _check_board_size(board_size, boards)
+    record_size = _state_record_size(board_size)
+    if data_view.shape[0] % record_size:
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    count = data_view.shape[0] // record_size
+    if count > min(
+        boards_view.shape[0],
+        walls_remaining_view.shape[0],
+        done_view.shape[0],
+        zobrist_view.shape[0],
+    ):
+        raise ValueError(f"too many records for the output arrays: {count}")
+    for index in range(count):
+        _check_record(&data_view[index * record_size], board_size)
+
+    with nogil:
+        for index in range(count):
+            done_view[index] = _unpack_state(
+                &data_view[index * record_size],
+                board_size,
+                boards_view[index],
+                walls_remaining_view[index],
+                &zobrist_view[index],
+            )
+    return count
+
+cdef int _check_wall_blocked(cell_t [:,:,:] board_view, int cx, int cy, int nx, int ny):
     cdef int i
     if nx > cx:
         for i in range(cx, nx):
@@ -427,7 +1209,7 @@ cdef int _check_wall_blocked(int [:,:,:] board_view, int cx, int cy, int nx, int
         return 0
     return 0
 
-cdef int _check_wins(int [:,:,:] board_view, int board_size):
+cdef int _check_wins(cell_t [:,:,:] board_view, int board_size):
     cdef int i
     for i in range(board_size):
         if board_view[0, i, board_size-1]:
@@ -436,10 +1218,155 @@ cdef int _check_wins(int [:,:,:] board_view, int board_size):
             return 1
     return 0
 
-cdef (int, int) _agent_pos(int [:,:,:] board_view, int agent_id, int board_size):
+cdef (int, int) _agent_pos(cell_t [:,:,:] board_view, int agent_id, int board_size) noexcept nogil:
     cdef int i, j
     for i in range(board_size):
         for j in range(board_size):
             if board_view[agent_id, i, j]:
                 return (i, j)
-    return (-1, -1)
\ No newline at end of file
+    return (-1, -1)
+
+cdef class PuoriborSearchState:
+    """
+    ``PuoriborSearchState`` is a mutable game state for tree search. ``apply`` and
+    ``undo`` change ``board`` and ``walls_remaining`` in place and keep a compact
+    undo stack. Rotations store the rotated wall window so they can be undone.
+    """
+
+    cdef readonly object board
+    cdef readonly object walls_remaining
+    cdef readonly int board_size
+    cdef readonly bint done
+    cdef u64 _hash
+    cdef cell_t [:,:,:] board_view
+    cdef cell_t [:] walls_remaining_view
+    cdef UndoRecord *stack
+    cdef int depth
+    cdef int capacity
+
+    def __cinit__(self, board, walls_remaining, int board_size = 9, bint done = False):
+        _check_board_size(board_size, board)
+        self.board = np.array(board, dtype=BOARD_DTYPE)
+        self.walls_remaining = np.array(walls_remaining, dtype=BOARD_DTYPE)
+        self.board_view = self.board
+        self.walls_remaining_view = self.walls_remaining
+        self.board_size = board_size
+        self.done = done
+        self._hash = _zobrist_hash(self.board_view, self.walls_remaining_view, board_size)
+        self.depth = 0
+        self.capacity = 64
+        self.stack = <UndoRecord *> malloc(self.capacity * sizeof(UndoRecord))
+        if self.stack == NULL:
+            raise MemoryError()
+
+    def __dealloc__(self):
+        free(self.stack)
+
+    def __len__(self):
+        return self.depth
+
+    @property
+    def hash(self):
+        """
+        Zobrist hash of the current position, as computed by :func:`zobrist_hash`.
+        """
+        return self._hash
+
+    def apply(self, action, int agent_id):
+        """
+        Play ``action`` for agent ``agent_id`` in place.
+        :returns:
+            Whether the game is done after the action.
+        """
+        cdef int action_type = action[0]
+        cdef int x = action[1]
+        cdef int y = action[2]
+        cdef UndoRecord *record
+        cdef int c, i, j
+
+        if self.depth == self.capacity:
+            record = <UndoRecord *> realloc(self.stack, 2 * self.capacity * sizeof(UndoRecord))
+            if record == NULL:
+                raise MemoryError()
+            self.stack = record
+            self.capacity *= 2
+        record = &self.stack[self.depth]
+        record.agent_id = agent_id
+        record.action_type = action_type
+        record.x = x
+        record.y = y
+        record.done = self.done
+        record.hash = self._hash
+        if action_type == 0 and 0 <= agent_id <= 1:
+            (record.prev_x, record.prev_y) = _agent_pos(self.board_view, agent_id, self.board_size)
+        elif action_type == 3 and _check_in_range(x, y, bottom_right=self.board_size-3):
+            for c in range(4):
+                for i in range(5):
+                    for j in range(5):
+                        if _check_in_range(x - 1 + i, y - 1 + j, self.board_size):
+                            record.region[c][i][j] = self.board_view[2 + c, x - 1 + i, y - 1 + j]
+        if 0 <= agent_id <= 1:
+            self._hash ^= _zobrist_touched(
+                self.board_view, self.walls_remaining_view, agent_id, action_type, x, y, self.board_size
+            )
+
+        try:
+            _step_in_place(
+                self.board_view, self.walls_remaining_view, agent_id, action_type, x, y, self.board_size
+            )
+        except ValueError:
+            self._hash = record.hash
+            raise
+        self.depth += 1
+        try:
+            _check_paths_after(self.board_view, action_type, self.board_size)
+        except ValueError:
+            self.undo()
+            raise
+        self._hash ^= _zobrist_touched(
+            self.board_view, self.walls_remaining_view, agent_id, action_type, x, y, self.board_size
+        )
+        self.done = _check_wins(self.board_view, self.board_size)
+        return self.done
+
+    def undo(self):
+        """
+        Take back the last applied action.
+        """
+        cdef UndoRecord *record
+        cdef int c, i, j, x, y
+        if self.depth == 0:
+            raise IndexError("no action to undo")
+        self.depth -= 1
+        record = &self.stack[self.depth]
+        x = record.x
+        y = record.y
+        if record.action_type == 0:
+            self.board_view[record.agent_id, x, y] = 0
+            self.board_view[record.agent_id, record.prev_x, record.prev_y] = 1
+        elif record.action_type == 1:
+            self.board_view[2, x, y] = 0
+            self.board_view[2, x + 1, y] = 0
+            self.board_view[4, x, y] = 0
+            self.walls_remaining_view[record.agent_id] += 1
+        elif record.action_type == 2:
+            self.board_view[3, x, y] = 0
+            self.board_view[3, x, y + 1] = 0
+            self.board_view[5, x, y] = 0
+            self.walls_remaining_view[record.agent_id] += 1
+        else:
+            for c in range(4):
+                for i in range(5):
+                    for j in range(5):
+                        if _check_in_range(x - 1 + i, y - 1 + j, self.board_size):
+                            self.board_view[2 + c, x - 1 + i, y - 1 + j] = record.region[c][i][j]
+            self.walls_remaining_view[record.agent_id] += 2
+        self.done = record.done
+        self._hash = record.hash
+
+    def legal_actions(self, int agent_id):
+        """
+        Find possible actions for the agent, in the same form as
+        ``PuoriborEnv.legal_actions``.
+        """
+        return legal_actions(self, agent_id, self.board_size)
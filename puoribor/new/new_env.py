@@ -13,7 +13,7 @@ from __future__ import annotations
 
 import sys
 from dataclasses import dataclass
-from typing import Callable, Deque, Dict, Optional
+from typing import Callable, Deque, Dict, Optional, Tuple
 
 import numpy as np
 from numpy.typing import ArrayLike, NDArray
@@ -31,6 +31,12 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 from . import cythonfn
 
+BOARD_DTYPE = cythonfn.BOARD_DTYPE
+"""
+Compact dtype (``uint8``) of ``board``, ``walls_remaining`` and legal action arrays.
+Every kernel in :mod:`cythonfn` expects arrays of this dtype.
+"""
+
 PuoriborAction: TypeAlias = ArrayLike
 """
 Alias of :obj:`ArrayLike` to describe the action type.
@@ -54,7 +60,7 @@ class PuoriborState(BaseState):
     ``PuoriborState`` represents the game state.
     """
 
-    board: NDArray[np.int_]
+    board: NDArray[np.uint8]
     """
     Array of shape ``(C, W, H)``, where C is channel index and W, H is board width,
     height.
@@ -69,7 +75,7 @@ class PuoriborState(BaseState):
         - ``C = 5``: one-hot encoded positions of vertical walls' midpoints.
     """
 
-    walls_remaining: NDArray[np.int_]
+    walls_remaining: NDArray[np.uint8]
     """
     Array of shape ``(2,)``, in the form of [ `agent0_remaining_walls`,
     `agent1_remaining_walls` ].
@@ -80,13 +86,30 @@ class PuoriborState(BaseState):
     Boolean value indicating whether the game is done.
     """
 
+    zobrist: Optional[int] = None
+    """
+    64-bit Zobrist hash of ``board`` and ``walls_remaining``, maintained
+    incrementally by :meth:`PuoriborEnv.step`. ``None`` if unknown, in which case
+    the next step computes it from scratch.
+    """
+
+    memory_cells: Optional[NDArray[np.intc]] = None
+    """
+    Optional array of shape ``(2, W, H, 2)`` built by
+    :func:`cythonfn.build_memory_cells`. ``[agent_id, x, y, 0]`` is the distance
+    from ``(x, y)`` to the goal row of ``agent_id`` and ``[agent_id, x, y, 1]``
+    the direction of the next step towards it. When present, :meth:`PuoriborEnv.step`
+    repairs it incrementally and checks paths with lookups.
+    """
+
     def __str__(self) -> str:
         """
         Generate a human-readable string representation of the board.
         Uses unicode box drawing characters.
         """
 
-        table_top = "┌───┬───┬───┬───┬───┬───┬───┬───┬───┐"
+        board_size = self.board.shape[1]
+        table_top = "┌" + "───┬" * (board_size - 1) + "───┐"
         vertical_wall = "│"
         vertical_wall_bold = "┃"
         horizontal_wall = "───"
@@ -100,10 +123,10 @@ class PuoriborState(BaseState):
         right_intersection_bottom = "┘"
         result = table_top + "\n"
 
-        for y in range(9):
+        for y in range(board_size):
             board_line = self.board[:, :, y]
             result += vertical_wall
-            for x in range(9):
+            for x in range(board_size):
                 board_cell = board_line[:, x]
                 if board_cell[0]:
                     result += " 0 "
@@ -113,24 +136,24 @@ class PuoriborState(BaseState):
                     result += "   "
                 if board_cell[3]:
                     result += vertical_wall_bold
-                elif x == 8:
+                elif x == board_size - 1:
                     result += vertical_wall
                 else:
                     result += " "
-                if x == 8:
+                if x == board_size - 1:
                     result += "\n"
-            result += left_intersection_bottom if y == 8 else left_intersection
-            for x in range(9):
+            result += left_intersection_bottom if y == board_size - 1 else left_intersection
+            for x in range(board_size):
                 board_cell = board_line[:, x]
                 if board_cell[2]:
                     result += horizontal_wall_bold
-                elif y == 8:
+                elif y == board_size - 1:
                     result += horizontal_wall
                 else:
                     result += "   "
-                if x == 8:
+                if x == board_size - 1:
                     result += (
-                        right_intersection_bottom if y == 8 else right_intersection
+                        right_intersection_bottom if y == board_size - 1 else right_intersection
                     )
                 else:
                     if np.any(self.board[4:, x, y]):
@@ -138,14 +161,14 @@ class PuoriborState(BaseState):
                     else:
                         result += (
                             middle_intersection_bottom
-                            if y == 8
+                            if y == board_size - 1
                             else middle_intersection
                         )
             result += "\n"
 
         return result
 
-    def perspective(self, agent_id: int) -> NDArray[np.int_]:
+    def perspective(self, agent_id: int) -> NDArray[np.uint8]:
         """
         Return board where specified agent with ``agent_id`` is on top.
         :arg agent_id:
@@ -158,9 +181,9 @@ class PuoriborState(BaseState):
         """
         if agent_id == 0:
             return self.board
-        inverted_walls = (self.board[2:4] == 2).astype(np.int_) + (
+        inverted_walls = (self.board[2:4] == 2).astype(BOARD_DTYPE) + (
             self.board[2:4] == 1
-        ).astype(np.int_) * 2
+        ).astype(BOARD_DTYPE) * 2
         rotated = np.stack(
             [
                 np.rot90(self.board[1], 2),
@@ -189,17 +212,53 @@ class PuoriborState(BaseState):
         )
         return rotated
 
+    def to_compact(self) -> PuoriborState:
+        """
+        Convert a state holding ``np.int_`` arrays to :data:`BOARD_DTYPE`.
+        :returns:
+            The state itself if it is already compact, otherwise a converted copy.
+        """
+        if (
+            self.board.dtype == BOARD_DTYPE
+            and self.walls_remaining.dtype == BOARD_DTYPE
+        ):
+            return self
+        return PuoriborState(
+            board=self.board.astype(BOARD_DTYPE),
+            walls_remaining=self.walls_remaining.astype(BOARD_DTYPE),
+            done=self.done,
+            zobrist=self.zobrist,
+            memory_cells=self.memory_cells,
+        )
+
+    def to_legacy(self) -> PuoriborState:
+        """
+        Convert the state to the former ``np.int_`` layout.
+        :returns:
+            A copy of the state holding ``np.int_`` arrays.
+        """
+        return PuoriborState(
+            board=self.board.astype(np.int_),
+            walls_remaining=self.walls_remaining.astype(np.int_),
+            done=self.done,
+            zobrist=self.zobrist,
+            memory_cells=self.memory_cells,
+        )
+
     def to_dict(self) -> Dict:
         """
         Serialize state object to dict.
         :returns:
             A serialized dict.
         """
-        return {
+        serialized = {
             "board": self.board.tolist(),
             "walls_remaining": self.walls_remaining.tolist(),
             "done": self.done,
         }
+        if self.memory_cells is not None:
+            serialized["memory_cells"] = self.memory_cells.tolist()
+        return serialized
 
     @staticmethod
     def from_dict(serialized) -> PuoriborState:
@@ -210,10 +269,94 @@ class PuoriborState(BaseState):
         :returns:
             Deserialized ``PuoriborState`` object.
         """
+        board = np.array(serialized["board"], dtype=BOARD_DTYPE)
+        walls_remaining = np.array(serialized["walls_remaining"], dtype=BOARD_DTYPE)
         return PuoriborState(
-            board=np.array(serialized["board"]),
-            walls_remaining=np.array(serialized["walls_remaining"]),
+            board=board,
+            walls_remaining=walls_remaining,
             done=serialized["done"],
+            zobrist=cythonfn.zobrist_hash(board, walls_remaining, board.shape[1]),
+            memory_cells=(
+                np.array(serialized["memory_cells"], dtype=np.intc)
+                if "memory_cells" in serialized
+                else None
+            ),
+        )
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize state object to a fixed-size binary record.
+        :returns:
+            A record of :func:`cythonfn.state_record_size` bytes, laid out as
+            described in :func:`cythonfn.pack_state`. ``memory_cells`` are not
+            stored since :meth:`with_memory_cells` rebuilds them.
+        """
+        state = self.to_compact()
+        board_size = self.board.shape[1]
+        zobrist = self.zobrist
+        if zobrist is None:
+            zobrist = cythonfn.zobrist_hash(state.board, state.walls_remaining, board_size)
+        return cythonfn.pack_state(
+            state.board, state.walls_remaining, self.done, zobrist, board_size
+        )
+
+    @staticmethod
+    def from_bytes(data) -> PuoriborState:
+        """
+        Deserialize from a record written by :meth:`to_bytes`.
+        :arg data:
+            A bytes-like object.
+        :returns:
+            Deserialized ``PuoriborState`` object.
+        """
+        board, walls_remaining, done, zobrist = cythonfn.unpack_state(data)
+        return PuoriborState(
+            board=board, walls_remaining=walls_remaining, done=done, zobrist=zobrist
+        )
+
+    @staticmethod
+    def from_bytes_batch(
+        data, board_size: int = 9, out: Optional[Tuple[NDArray, ...]] = None
+    ) -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.bool_], NDArray[np.uint64]]:
+        """
+        Deserialize concatenated records written by :meth:`to_bytes` into arrays,
+        without creating a state object per record.
+        :arg data:
+            A bytes-like object. It is read in place.
+        :arg board_size:
+            Size (width and height) of the encoded boards.
+        :arg out:
+            Optional tuple of preallocated ``(boards, walls_remaining, done,
+            zobrist)`` arrays as accepted by :func:`cythonfn.unpack_states`, with
+            room for every record.
+        :returns:
+            The ``(boards, walls_remaining, done, zobrist)`` arrays, trimmed to the
+            number of records. They are views of ``out`` if given.
+        """
+        if out is None:
+            count = len(memoryview(data).cast("B")) // cythonfn.state_record_size(board_size)
+            out = (
+                np.empty((count, 6, board_size, board_size), dtype=BOARD_DTYPE),
+                np.empty((count, 2), dtype=BOARD_DTYPE),
+                np.empty((count,), dtype=np.bool_),
+                np.empty((count,), dtype=np.uint64),
+            )
+        count = cythonfn.unpack_states(data, *out)
+        return tuple(array[:count] for array in out)  # type: ignore
+
+
+    def with_memory_cells(self) -> PuoriborState:
+        """
+        Attach distance maps built from scratch.
+        :returns:
+            A copy of the state whose ``memory_cells`` is set.
+        """
+        return PuoriborState(
+            board=self.board,
+            walls_remaining=self.walls_remaining,
+            done=self.done,
+            zobrist=self.zobrist,
+            memory_cells=cythonfn.build_memory_cells(self.board, self.board.shape[1]),
         )
 
 
@@ -233,6 +376,12 @@ class PuoriborEnv(BaseEnv[PuoriborState, PuoriborAction]):
     Maximum allowed walls per agent.
     """
 
+    track_memory_cells: bool = False
+    """
+    Whether :meth:`initialize_state` attaches ``memory_cells`` distance maps, which
+    every following step keeps up to date.
+    """
+
     def step(
         self,
         state: PuoriborState,
@@ -268,19 +417,29 @@ class PuoriborEnv(BaseEnv[PuoriborState, PuoriborAction]):
         if pre_step_fn is not None:
             pre_step_fn(state, agent_id, action)
 
-        next_information = cythonfn.fast_step(state.board, state.walls_remaining, agent_id, action, self.board_size)
+        next_information = cythonfn.fast_step(
+            state.board,
+            state.walls_remaining,
+            agent_id,
+            action,
+            self.board_size,
+            state.zobrist,
+            state.memory_cells,
+        )
 
         next_state = PuoriborState(
             board=next_information[0],
             walls_remaining=next_information[1],
             done=next_information[2],
+            zobrist=next_information[3],
+            memory_cells=next_information[4],
         )
 
         if post_step_fn is not None:
             post_step_fn(next_state, agent_id, action)
         return next_state
     
-    def legal_actions(self, state: PuoriborState, agent_id: int) -> NDArray[np.int_]:
+    def legal_actions(self, state: PuoriborState, agent_id: int) -> NDArray[np.uint8]:
         """
         Find possible actions for the agent.
 
@@ -294,6 +453,127 @@ class PuoriborEnv(BaseEnv[PuoriborState, PuoriborAction]):
         """
         return cythonfn.legal_actions(state, agent_id, self.board_size)
 
+    @property
+    def num_actions(self) -> int:
+        """
+        Size of the flat action index space, ``4 * board_size * board_size``.
+        """
+        return 4 * self.board_size * self.board_size
+
+    def encode_action(self, action: PuoriborAction) -> int:
+        """
+        Convert an action to its flat index
+        ``(action_type * board_size + x) * board_size + y``.
+        """
+        return (action[0] * self.board_size + action[1]) * self.board_size + action[2]
+
+    def decode_action(self, idx: int) -> PuoriborAction:
+        """
+        Convert a flat action index back to ``[action_type, x, y]``.
+        """
+        if not 0 <= idx < self.num_actions:
+            raise ValueError(f"invalid action index: {idx}")
+        rest, y = divmod(idx, self.board_size)
+        action_type, x = divmod(rest, self.board_size)
+        return [action_type, x, y]
+
+    def step_index(
+        self,
+        state: PuoriborState,
+        agent_id: int,
+        idx: int,
+        *,
+        pre_step_fn: Optional[
+            Callable[[PuoriborState, int, PuoriborAction], None]
+        ] = None,
+        post_step_fn: Optional[
+            Callable[[PuoriborState, int, PuoriborAction], None]
+        ] = None,
+    ) -> PuoriborState:
+        """
+        Step through the game with an action given as a flat index, which is
+        decoded and passed to :meth:`step` together with the callbacks.
+
+        :arg state:
+            Current state of the environment.
+        :arg agent_id:
+            ID of the agent that takes the action. (``0`` or ``1``)
+        :arg idx:
+            Flat action index, as described by :meth:`encode_action`.
+        :arg pre_step_fn:
+            See :meth:`step`.
+        :arg post_step_fn:
+            See :meth:`step`.
+
+        :returns:
+            The next state.
+        """
+        return self.step(
+            state,
+            agent_id,
+            self.decode_action(idx),
+            pre_step_fn=pre_step_fn,
+            post_step_fn=post_step_fn,
+        )
+
+    def legal_mask_flat(self, state: PuoriborState, agent_id: int) -> NDArray[np.bool_]:
+        """
+        Find possible actions for the agent as a flat mask.
+
+        :arg state:
+            Current state of the environment.
+        :arg agent_id:
+            Agent_id of the agent.
+
+        :returns:
+            A contiguous boolean array of shape ``(num_actions,)`` indexed by
+            :meth:`encode_action`.
+        """
+        return self.legal_actions(state, agent_id).reshape(-1).view(np.bool_)
+
+    def distances(self, state: PuoriborState) -> Tuple[NDArray[np.intc], NDArray[np.intc]]:
+        """
+        Measure how far each agent is from its goal row, ignoring pawns.
+
+        :arg state:
+            Current state of the environment. Its ``memory_cells`` are reused when
+            present, otherwise the maps are built once from the board.
+
+        :returns:
+            A tuple of ``(distance_maps, lengths)``. ``distance_maps`` has shape
+            ``(2, board_size, board_size)`` and holds, for each agent, the number of
+            steps from every cell to its goal row, or
+            :data:`cythonfn.MEMORY_UNREACHABLE`.
+            ``lengths`` has shape ``(2,)`` and holds the shortest-path length of
+            each agent from its current position.
+        """
+        pawn_cells = state.board[:2].reshape(2, -1)
+        for agent_id in range(2):
+            if not pawn_cells[agent_id].any():
+                raise ValueError(f"no pawn for agent {agent_id}")
+        memory_cells = state.memory_cells
+        if memory_cells is None:
+            memory_cells = cythonfn.build_memory_cells(state.board, self.board_size)
+        distance_maps = np.ascontiguousarray(memory_cells[..., 0])
+        pawns = pawn_cells.argmax(axis=1)
+        lengths = distance_maps.reshape(2, -1)[[0, 1], pawns]
+        return distance_maps, lengths
+
+    def search_state(self, state: PuoriborState) -> cythonfn.PuoriborSearchState:
+        """
+        Create a mutable copy of the state for tree search.
+
+        :arg state:
+            State to start the search from. It is not modified.
+
+        :returns:
+            A :obj:`cythonfn.PuoriborSearchState` supporting in-place ``apply(action,
+            agent_id)`` and ``undo()``.
+        """
+        return cythonfn.PuoriborSearchState(
+            state.board, state.walls_remaining, self.board_size, state.done
+        )
+
     def _check_in_range(self, pos: tuple, bottom_right: int = None) -> np.bool_:
         if bottom_right is None:
             bottom_right = self.board_size
@@ -301,7 +581,7 @@ class PuoriborEnv(BaseEnv[PuoriborState, PuoriborAction]):
 
     def _check_wall_blocked(
         self,
-        board: NDArray[np.int_],
+        board: NDArray[np.uint8],
         current_pos: tuple,
         new_pos: tuple,
     ) -> bool:
@@ -315,7 +595,7 @@ class PuoriborEnv(BaseEnv[PuoriborState, PuoriborAction]):
             return np.any(board[2, current_pos[0], new_pos[1] : current_pos[1]])
         return False
 
-    def _check_wins(self, board: NDArray[np.int_]) -> bool:
+    def _check_wins(self, board: NDArray[np.uint8]) -> bool:
         return board[0, :, -1].any() or board[1, :, 0].any()
 
     def initialize_state(self) -> PuoriborState:
@@ -330,24 +610,28 @@ class PuoriborEnv(BaseEnv[PuoriborState, PuoriborAction]):
                 "initialize state manually"
             )
 
-        starting_pos_0 = np.zeros((self.board_size, self.board_size), dtype=np.int_)
+        starting_pos_0 = np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE)
         starting_pos_0[(self.board_size - 1) // 2, 0] = 1
 
         starting_board = np.stack(
             [
                 np.copy(starting_pos_0),
                 np.fliplr(starting_pos_0),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
+                np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE),
+                np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE),
+                np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE),
+                np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE),
             ]
         )
 
+        walls_remaining = np.array((self.max_walls, self.max_walls), dtype=BOARD_DTYPE)
         new_state = PuoriborState(
             board=starting_board,
-            walls_remaining=np.array((self.max_walls, self.max_walls)),
+            walls_remaining=walls_remaining,
             done=False,
+            zobrist=cythonfn.zobrist_hash(starting_board, walls_remaining, self.board_size),
         )
+        if self.track_memory_cells:
+            new_state = new_state.with_memory_cells()
 
         return new_state
\ No newline at end of file
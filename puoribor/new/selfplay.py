@@ -0,0 +1,55 @@
+"""
+Puoribor Self-Play Runner
+:class:`common.selfplay.BaseSelfPlayRunner` playing :obj:`PuoriborEnv` games.
+Positions are stored as :meth:`PuoriborState.to_bytes` records and actions as
+flat indices (see :meth:`PuoriborEnv.encode_action`).
+
+    with SelfPlayRunner((RandomAgent, RandomAgent), num_workers=8) as runner:
+        for trajectories in runner:
+            boards, walls_remaining, done, zobrist = trajectories.states()
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.selfplay import AgentFactory, BaseSelfPlayRunner, BaseTrajectories
+from .new_env import PuoriborEnv, PuoriborState
+
+
+class Trajectories(BaseTrajectories):
+    """
+    Plies of Puoribor games; ``outcomes`` is ``0`` only for games cut off at
+    ``max_plies``.
+    """
+
+    def states(
+        self,
+    ) -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.bool_], NDArray[np.uint64]]:
+        """
+        Decode every position with :meth:`PuoriborState.from_bytes_batch`.
+        """
+        return PuoriborState.from_bytes_batch(self.records.reshape(-1), PuoriborEnv.board_size)
+
+
+def _outcome(state: PuoriborState, last_agent_id: int) -> int:
+    if not state.done:
+        return 0
+    return 1 if last_agent_id == 0 else -1
+
+
+class SelfPlayRunner(BaseSelfPlayRunner):
+    """
+    Self-play of Puoribor games; see :class:`common.selfplay.BaseSelfPlayRunner`.
+    """
+
+    env_class = PuoriborEnv
+    trajectories_class = Trajectories
+    outcome = staticmethod(_outcome)
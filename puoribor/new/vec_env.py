@@ -0,0 +1,34 @@
+"""
+Vectorized Puoribor Environment
+:class:`common.vec_env.BaseVecEnv` stepping :obj:`PuoriborEnv` games with
+:meth:`PuoriborEnv.step_index`.
+
+    vec_env = VecEnv(64)
+    obs = vec_env.reset()
+    legal_masks = vec_env.legal_masks
+    while training:
+        obs, rewards, dones, legal_masks = vec_env.step(policy(obs, legal_masks))
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.vec_env import BaseVecEnv
+from .new_env import PuoriborEnv, PuoriborState
+
+
+class VecEnv(BaseVecEnv):
+    """
+    ``N`` Puoribor games stepped together; see :class:`common.vec_env.BaseVecEnv`.
+    Observations of shape ``(N, C, board_size, board_size)`` stack
+    :meth:`PuoriborState.perspective`.
+    """
+
+    env_class = PuoriborEnv
+
+    def _reward(self, state: PuoriborState, agent_id: int) -> float:
+        # Only a move onto the goal line ends the game.
+        return 1
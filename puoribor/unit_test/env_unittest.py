@@ -7,6 +7,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
+from new import cythonfn
 from new.new_env import PuoriborEnv, PuoriborState
 
 
@@ -418,6 +419,36 @@ class TestPuoriborEnv(unittest.TestCase):
         expected_vwall[4, 2:4] = 1
         np.testing.assert_array_equal(issue_26.board[3], expected_vwall)
 
+    def test_search_state(self):
+        search_state = self.env.search_state(self.initial_state)
+        actions = [[1, 0, 0], [1, 3, 2], [2, 2, 0], [2, 1, 2], [3, 0, 0], [0, 4, 1]]
+        expected = self.initial_state
+        history = [expected]
+        for action in actions:
+            expected = self.env.step(expected, 0, action)
+            history.append(expected)
+            search_state.apply(action, 0)
+            np.testing.assert_array_equal(search_state.board, expected.board)
+            np.testing.assert_array_equal(
+                search_state.walls_remaining, expected.walls_remaining
+            )
+        np.testing.assert_array_equal(self.initial_state.board, history[0].board)
+
+        self.assertRaisesRegex(
+            ValueError,
+            "intersecting walls",
+            lambda: search_state.apply([1, 2, 0], 1),
+        )
+        self.assertEqual(len(search_state), len(actions))
+
+        for state in reversed(history[:-1]):
+            search_state.undo()
+            np.testing.assert_array_equal(search_state.board, state.board)
+            np.testing.assert_array_equal(
+                search_state.walls_remaining, state.walls_remaining
+            )
+        self.assertRaises(IndexError, search_state.undo)
+
     def test_step_callback(self):
         class StepLogger:
             log = []
@@ -507,6 +538,221 @@ class TestPuoriborEnv(unittest.TestCase):
             + 6 * 6,
         )
 
+    def test_legal_actions(self):
+        state = PuoriborEnv().step(self.initial_state, 0, [1, 2, 3])
+        state = PuoriborEnv().step(state, 1, [2, 1, 6])
+        state = PuoriborEnv().step(state, 0, [3, 2, 5])
+        state = PuoriborEnv().step(state, 1, [1, 0, 4])
+        state = PuoriborEnv().step(state, 0, [2, 5, 1])
+        for agent_id in [0, 1]:
+            legal_actions = PuoriborEnv().legal_actions(state, agent_id)
+            self.assertListEqual(
+                np.argwhere(legal_actions).tolist(),
+                self._get_all_actions(state, agent_id),
+            )
+
+        no_walls = PuoriborState(
+            board=state.board, walls_remaining=np.array([0, 1], dtype=state.walls_remaining.dtype)
+        )
+        legal_actions = PuoriborEnv().legal_actions(no_walls, 0)
+        self.assertFalse(legal_actions[1:].any())
+        legal_actions = PuoriborEnv().legal_actions(no_walls, 1)
+        self.assertTrue(legal_actions[1:3].any())
+        self.assertFalse(legal_actions[3].any())
+
+
+    def test_board_sizes(self):
+        for board_size in [5, 7]:
+            env = PuoriborEnv()
+            env.board_size = board_size
+            state = env.initialize_state()
+            legal_actions = env.legal_actions(state, 0)
+            self.assertEqual(legal_actions.shape, (4, board_size, board_size))
+            self.assertEqual(
+                legal_actions.sum(),
+                3 + (board_size - 1) ** 2 * 2 + (board_size - 3) ** 2,
+            )
+            for action in np.ndindex(*legal_actions.shape):
+                try:
+                    env.step(state, 0, list(action))
+                except ValueError:
+                    self.assertFalse(legal_actions[action], action)
+                else:
+                    self.assertTrue(legal_actions[action], action)
+
+        env = PuoriborEnv()
+        env.board_size = 5
+        state = env.initialize_state()
+        state = env.step(state, 0, [1, 2, 0])
+        state = env.step(state, 1, [2, 1, 0])
+        with self.assertRaisesRegex(ValueError, "cannot place wall blocking all paths"):
+            env.step(state, 0, [2, 3, 0])
+        for board_size in [3, 8, 15]:
+            with self.assertRaisesRegex(ValueError, f"unsupported board_size: {board_size}"):
+                cythonfn.fast_step(state.board, state.walls_remaining, 0, [0, 1, 0], board_size)
+        with self.assertRaisesRegex(ValueError, "invalid board shape"):
+            cythonfn.fast_step(state.board, state.walls_remaining, 0, [0, 1, 0], 7)
+        with self.assertRaisesRegex(ValueError, "invalid board shape"):
+            cythonfn.zobrist_hash(self.initial_state.board, self.initial_state.walls_remaining, 13)
+
+
+    def test_flat_actions(self):
+        self.assertEqual(self.env.num_actions, 324)
+        mask = self.env.legal_mask_flat(self.initial_state, 0)
+        self.assertEqual(mask.shape, (324,))
+        self.assertEqual(mask.dtype, np.bool_)
+        self.assertTrue(mask.flags.c_contiguous)
+        np.testing.assert_array_equal(
+            mask, self.env.legal_actions(self.initial_state, 0).reshape(-1) == 1
+        )
+
+        idx = self.env.encode_action([1, 2, 3])
+        self.assertEqual(idx, 81 + 2 * 9 + 3)
+        self.assertEqual(self.env.decode_action(idx), [1, 2, 3])
+        np.testing.assert_array_equal(
+            self.env.step_index(self.initial_state, 0, idx).board,
+            self.env.step(self.initial_state, 0, [1, 2, 3]).board,
+        )
+        with self.assertRaisesRegex(ValueError, "invalid action index: 324"):
+            self.env.step_index(self.initial_state, 0, 324)
+
+        calls = []
+        next_state = self.env.step_index(
+            self.initial_state,
+            0,
+            idx,
+            pre_step_fn=lambda *args: calls.append(("pre",) + args),
+            post_step_fn=lambda *args: calls.append(("post",) + args),
+        )
+        self.assertEqual(
+            calls,
+            [("pre", self.initial_state, 0, [1, 2, 3]), ("post", next_state, 0, [1, 2, 3])],
+        )
+        with self.assertRaisesRegex(ValueError, "cannot place wall on the edge"):
+            self.env.step_index(self.initial_state, 0, self.env.encode_action([1, 2, 8]))
+
+
+    def test_zobrist(self):
+        def from_scratch(state):
+            return cythonfn.zobrist_hash(state.board, state.walls_remaining, 9)
+
+        self.assertEqual(self.initial_state.zobrist, from_scratch(self.initial_state))
+        state = self.env.step(self.initial_state, 0, [1, 2, 3])
+        state = self.env.step(state, 1, [2, 4, 4])
+        state = self.env.step(state, 0, [3, 2, 2])
+        self.assertEqual(state.zobrist, from_scratch(state))
+        state = self.env.step(state, 1, [0, 4, 7])
+        self.assertEqual(state.zobrist, from_scratch(state))
+
+        search_state = self.env.search_state(self.initial_state)
+        search_state.apply([1, 2, 3], 0)
+        search_state.apply([2, 4, 4], 1)
+        search_state.apply([3, 2, 2], 0)
+        search_state.apply([0, 4, 7], 1)
+        self.assertEqual(search_state.hash, state.zobrist)
+        self.assertRaises(ValueError, search_state.apply, [1, 8, 0], 1)
+        self.assertEqual(search_state.hash, state.zobrist)
+        while len(search_state):
+            search_state.undo()
+        self.assertEqual(search_state.hash, self.initial_state.zobrist)
+
+        table = cythonfn.TranspositionTable(1024)
+        table.store(state.zobrist, "value", 3)
+        self.assertEqual(table.lookup(state.zobrist), "value")
+        self.assertEqual(table.depth(state.zobrist), 3)
+        self.assertIsNone(table.lookup(self.initial_state.zobrist))
+
+    def test_memory_cells(self):
+        env = PuoriborEnv()
+        env.track_memory_cells = True
+        state = env.initialize_state()
+        self.assertEqual(state.memory_cells.shape, (2, 9, 9, 2))
+        self.assertEqual(state.memory_cells[0, 4, 0, 0], 8)
+        self.assertEqual(state.memory_cells[1, 4, 0, 0], 0)
+        self.assertIsNone(self.initial_state.memory_cells)
+
+        for agent_id, action in [
+            (0, [1, 3, 0]),
+            (1, [2, 4, 4]),
+            (0, [3, 2, 2]),
+            (1, [0, 4, 7]),
+            (0, [1, 5, 0]),
+        ]:
+            state = env.step(state, agent_id, action)
+            np.testing.assert_array_equal(
+                state.memory_cells[..., 0],
+                cythonfn.build_memory_cells(state.board, 9)[..., 0],
+            )
+        # The walls below agent 0 make it take a detour.
+        self.assertGreater(state.memory_cells[0, 4, 0, 0], 8)
+
+        restored = PuoriborState.from_dict(state.to_dict())
+        np.testing.assert_array_equal(restored.memory_cells, state.memory_cells)
+
+        block_path = env.step(env.initialize_state(), 0, [1, 4, 0])
+        block_path = env.step(block_path, 1, [2, 5, 0])
+        with self.assertRaisesRegex(ValueError, "blocking all paths"):
+            env.step(block_path, 0, [2, 3, 0])
+
+    def test_distances(self):
+        distance_maps, lengths = self.env.distances(self.initial_state)
+        self.assertEqual(distance_maps.shape, (2, 9, 9))
+        np.testing.assert_array_equal(lengths, [8, 8])
+        np.testing.assert_array_equal(distance_maps[0, 2], np.arange(8, -1, -1))
+
+        env = PuoriborEnv()
+        env.track_memory_cells = True
+        state = env.step(env.initialize_state(), 0, [1, 4, 0])
+        distance_maps, lengths = env.distances(state)
+        np.testing.assert_array_equal(distance_maps, state.memory_cells[..., 0])
+        np.testing.assert_array_equal(lengths, [9, 9])
+        np.testing.assert_array_equal(
+            self.env.distances(
+                PuoriborState(board=state.board, walls_remaining=state.walls_remaining)
+            )[0],
+            distance_maps,
+        )
+        board = state.board.copy()
+        board[0] = 0
+        with self.assertRaisesRegex(ValueError, "no pawn for agent 0"):
+            self.env.distances(PuoriborState(board=board, walls_remaining=state.walls_remaining))
+
+    def test_profiling(self):
+        cythonfn.reset_profile()
+        self.env.step(self.initial_state, 0, [1, 2, 3])
+        self.assertEqual(cythonfn.profile_stats()["counters"]["fast_step_calls"], 0)
+
+        cythonfn.set_profiling(True)
+        try:
+            state = self.env.step(self.initial_state, 0, [1, 2, 3])
+            state = self.env.step(state, 1, [3, 3, 3])
+            with self.assertRaises(ValueError):
+                self.env.step(state, 0, [0, 0, 0])
+            self.env.legal_actions(state, 0)
+        finally:
+            cythonfn.set_profiling(False)
+        stats = cythonfn.profile_stats()
+        self.assertEqual(
+            {key: stats["counters"][key] for key in ("fast_step_calls", "legal_actions_calls", "exceptions_raised")},
+            {"fast_step_calls": 3, "legal_actions_calls": 1, "exceptions_raised": 1},
+        )
+        for name, calls in (
+            ("fast_step", 2),
+            ("fast_step;move", 0),
+            ("fast_step;wall", 1),
+            ("fast_step;rotation", 1),
+            ("fast_step;path_check", 2),
+            ("legal_actions", 1),
+        ):
+            self.assertEqual(stats["phases"][name]["calls"], calls)
+        self.assertGreater(stats["counters"]["path_search_calls"], 2)
+        self.assertGreater(
+            stats["counters"]["path_search_nodes"], stats["counters"]["path_search_calls"]
+        )
+        self.assertIn("legal_actions;candidates ", cythonfn.profile_collapsed())
+
+        cythonfn.reset_profile()
+        self.assertEqual(cythonfn.profile_stats()["counters"]["path_search_calls"], 0)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -6,7 +6,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
-from new.new_env import PuoriborEnv, PuoriborState
+from new.new_env import BOARD_DTYPE, PuoriborEnv, PuoriborState
 
 
 class TestPuoriborState(unittest.TestCase):
@@ -38,6 +38,24 @@ class TestPuoriborState(unittest.TestCase):
         )
         self.assertEqual(state.done, self.initial_state.done)
 
+    def test_compact(self):
+        self.assertEqual(self.state.board.dtype, BOARD_DTYPE)
+        self.assertEqual(self.state.walls_remaining.dtype, BOARD_DTYPE)
+        self.assertIs(self.state.to_compact(), self.state)
+
+        legacy = self.state.to_legacy()
+        self.assertEqual(legacy.board.dtype, np.int_)
+        self.assertEqual(legacy.walls_remaining.dtype, np.int_)
+        compact = legacy.to_compact()
+        np.testing.assert_array_equal(compact.board, self.state.board)
+        self.assertEqual(compact.board.dtype, BOARD_DTYPE)
+        next_state = self.env.step(compact, 1, [3, 2, 2])
+        self.assertEqual(next_state.board.dtype, BOARD_DTYPE)
+
+        state = PuoriborState.from_dict(legacy.to_dict())
+        self.assertEqual(state.board.dtype, BOARD_DTYPE)
+        self.assertEqual(state.walls_remaining.dtype, BOARD_DTYPE)
+
     def test_perspective(self):
         before_rotation = self.env.step(self.initial_state, 0, [1, 2, 3])
         before_rotation = self.env.step(before_rotation, 1, [2, 3, 5])
@@ -49,6 +67,38 @@ class TestPuoriborState(unittest.TestCase):
         rotated_state = self.env.step(rotated_state, 0, [2, 4, 2])
         np.testing.assert_array_equal(rotated_board[2:], rotated_state.board[2:])
 
+    def test_to_bytes(self):
+        data = self.state.to_bytes()
+        self.assertEqual(len(data), 82)
+        state = PuoriborState.from_bytes(data)
+        np.testing.assert_array_equal(state.board, self.state.board)
+        np.testing.assert_array_equal(state.walls_remaining, self.state.walls_remaining)
+        self.assertEqual(state.done, self.state.done)
+        self.assertEqual(state.zobrist, self.state.zobrist)
+        self.assertEqual(self.state.to_legacy().to_bytes(), data)
+        self.assertEqual(self.state.with_memory_cells().to_bytes(), data)
+
+        with self.assertRaisesRegex(ValueError, "invalid state record size"):
+            PuoriborState.from_bytes(data[:-1])
+        with self.assertRaisesRegex(ValueError, "unsupported state format version"):
+            PuoriborState.from_bytes(b"\xff" + data[1:])
+
+        records = self.initial_state.to_bytes() + data
+        boards, walls_remaining, done, zobrist = PuoriborState.from_bytes_batch(records)
+        np.testing.assert_array_equal(boards, [self.initial_state.board, self.state.board])
+        self.assertEqual(zobrist[1], self.state.zobrist)
+
+        out = (
+            np.zeros((4, 6, 9, 9), dtype=BOARD_DTYPE),
+            np.zeros((4, 2), dtype=BOARD_DTYPE),
+            np.zeros((4,), dtype=np.bool_),
+            np.zeros((4,), dtype=np.uint64),
+        )
+        decoded = PuoriborState.from_bytes_batch(memoryview(records), out=out)
+        self.assertEqual(len(decoded[0]), 2)
+        self.assertTrue(np.shares_memory(decoded[0], out[0]))
+        np.testing.assert_array_equal(out[1][:2], walls_remaining)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Quoridor Move Generation Perft
+Counts the leaf nodes of the legal-move tree below fixed positions with both the
+``pre`` and ``new`` environments, checks them against known node counts and
+reports nodes/sec per backend.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+import numpy as np
+import time
+
+from pre import pre_env
+from new import new_env
+
+KNOWN_POSITIONS = {
+    "initial": ([], [131, 16677, 2062264]),
+    "midgame": (
+        [[1, 2, 3], [1, 5, 5], [0, 4, 1], [2, 3, 6]],
+        [120, 13861, 1565471],
+    ),
+}
+"""
+Actions played from the initial position, starting with agent 0, and the known
+node counts for depth 1, 2, 3 from the resulting position.
+"""
+
+BACKENDS = {
+    "pre": (pre_env.QuoridorEnv, 1),
+    "new": (new_env.QuoridorEnv, 3),
+}
+"""
+Environment class of each backend and the deepest depth checked with it.
+"""
+
+
+def legal_actions(env, state, agent_id: int):
+    if isinstance(env, new_env.QuoridorEnv):
+        return np.argwhere(env.legal_actions(state, agent_id))
+    # The original environment has no move generator, so every action is tried.
+    actions = []
+    for action_type in range(3):
+        for coordinate_x in range(env.board_size):
+            for coordinate_y in range(env.board_size):
+                action = [action_type, coordinate_x, coordinate_y]
+                try:
+                    env.step(state, agent_id, action)
+                except ValueError:
+                    ...
+                else:
+                    actions.append(action)
+    return actions
+
+
+def perft(state, agent_id: int, depth: int, env=None) -> int:
+    """
+    Count the positions exactly ``depth`` plies below ``state``. Agents alternate
+    every ply and a finished game has no children.
+    """
+    if env is None:
+        env = new_env.QuoridorEnv()
+    if depth == 0:
+        return 1
+    if state.done:
+        return 0
+    actions = legal_actions(env, state, agent_id)
+    if depth == 1:
+        return len(actions)
+    return sum(
+        perft(env.step(state, agent_id, action), 1 - agent_id, depth - 1, env)
+        for action in actions
+    )
+
+
+def known_position(env, name: str):
+    actions, counts = KNOWN_POSITIONS[name]
+    state = env.initialize_state()
+    for ply, action in enumerate(actions):
+        state = env.step(state, ply % 2, action)
+    return state, len(actions) % 2, counts
+
+
+def run(backend: str) -> bool:
+    """
+    Check every known position up to the backend's depth and print nodes/sec.
+    :returns:
+        ``True`` if every count matches.
+    """
+    env_class, max_depth = BACKENDS[backend]
+    env = env_class()
+    matched = True
+    nodes = 0
+    elapsed = 0.0
+    for name in KNOWN_POSITIONS:
+        state, agent_id, counts = known_position(env, name)
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            start = time.perf_counter()
+            count = perft(state, agent_id, depth, env)
+            elapsed += time.perf_counter() - start
+            nodes += count
+            matched &= count == expected
+            status = "ok" if count == expected else f"MISMATCH (expected {expected})"
+            print(f"{backend} {name} depth {depth}: {count} {status}")
+    print(f"{backend}: {nodes / elapsed:.0f} nodes/sec")
+    return matched
+
+if __name__ == "__main__":
+
+    matched = run("pre")
+    matched &= run("new")
+    sys.exit(0 if matched else 1)
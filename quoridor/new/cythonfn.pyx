@@ -2,163 +2,234 @@
 
 import numpy as np
 cimport numpy as np
+from libc.stdlib cimport malloc, calloc, realloc, free
+from libc.string cimport memset
+
+ctypedef unsigned long long u64
+# Element type of boards, wall counters and legal action arrays (``BOARD_DTYPE``).
+ctypedef unsigned char cell_t
+
+BOARD_DTYPE = np.uint8
+
+cdef extern from *:
+    int __builtin_ctzll(unsigned long long) nogil
+
+cdef enum:
+    # Three words hold every cell of the largest supported board (13x13).
+    BB_WORDS = 3
+    MAX_CELLS = BB_WORDS * 64
+    MAX_BOARD_SIZE = 13
+    UNREACHABLE = 99999
+
+DISTANCE_UNREACHABLE = UNREACHABLE
+"""
+Distance reported by :func:`distances` for cells with no path to the goal row.
+"""
+
+cdef struct Bitboard:
+    # Cell (x, y) is stored at bit index x * board_size + y.
+    u64 w[BB_WORDS]
+
+cdef enum:
+    ACTION_OK = 0
+    ERR_OUT_OF_BOARD
+    ERR_INVALID_AGENT_ID
+    ERR_INVALID_ACTION_TYPE
+    ERR_OPPONENT_POSITION
+    ERR_ZERO_BLOCKS
+    ERR_TOO_FAR
+    ERR_JUMP_OVER_NOTHING
+    ERR_DIAGONAL_MOVE
+    ERR_JUMP_OVER_WALL
+    ERR_DIAGONAL_JUMP
+    ERR_NO_WALLS_LEFT
+    ERR_WALL_ON_EDGE
+    ERR_WALL_OUT_OF_BOARD
+    ERR_WALL_ALREADY_PLACED
+    ERR_INTERSECTING_WALLS
+    ERR_BLOCKING_PATHS
+
+cdef struct UndoRecord:
+    signed char agent_id
+    signed char action_type
+    signed char x
+    signed char y
+    # Previous pawn position, only used by moves.
+    signed char prev_x
+    signed char prev_y
+    unsigned char done
+    u64 hash
+
+include "../../common/transposition.pxi"
+
+cdef struct ActionContext:
+    # Pawn positions and open edge masks shared by every candidate of one board.
+    int pos_x[2]
+    int pos_y[2]
+    int has_edges
+    Bitboard open_xp
+    Bitboard open_yp
+    # Edges used by each agent's shortest path, set by ``_shortest_paths``.
+    int has_paths
+    Bitboard path_xp[2]
+    Bitboard path_yp[2]
+
+cdef int _check_board_size(int board_size, board = None) except -1:
+    """
+    Reject board sizes the kernels do not support and, if ``board`` is given,
+    boards whose last two axes are not ``board_size`` long.
+    """
+    if not 5 <= board_size <= MAX_BOARD_SIZE or board_size % 2 == 0:
+        raise ValueError(f"unsupported board_size: {board_size}")
+    if board is not None and tuple(board.shape[-2:]) != (board_size, board_size):
+        raise ValueError(f"invalid board shape: {tuple(board.shape)}")
+    return 0
 
 def fast_step(
     pre_board,
     pre_walls_remaining,
     int agent_id,
     action,
-    int board_size
+    int board_size,
+    pre_hash = None
 ):
 
     cdef int action_type = action[0]
     cdef int x = action[1]
     cdef int y = action[2]
 
-    board = np.copy(pre_board)
-    walls_remaining = np.copy(pre_walls_remaining)
+    cdef cell_t [:,:,:] pre_board_view = pre_board
+    cdef cell_t [:] pre_walls_remaining_view = pre_walls_remaining
+    cdef ActionContext ctx
+    cdef int error
 
-    cdef int [:,:,:] board_view = board
-    cdef int [:] walls_remaining_view = walls_remaining
+    _check_board_size(board_size, pre_board)
+    _action_context(pre_board_view, board_size, &ctx)
+    error = _validate_action(
+        pre_board_view, pre_walls_remaining_view, agent_id, action_type, x, y, board_size, &ctx
+    )
+    if error != ACTION_OK:
+        raise ValueError(_error_message(error, agent_id, action_type, x, y))
 
-    cdef int curpos_x, curpos_y, newpos_x, newpos_y, opppos_x, opppos_y, delpos_x, delpos_y
-    cdef int taxicab_dist, original_jump_pos_x, original_jump_pos_y
-    cdef int cx, cy, zero_index
+    cdef u64 hash = 0
+    if pre_hash is not None:
+        hash = <u64> pre_hash ^ _zobrist_delta(
+            pre_board_view, pre_walls_remaining_view, agent_id, action_type, x, y, &ctx
+        )
 
-    if not _check_in_range(x, y, board_size):
-        raise ValueError(f"out of board: {(x, y)}")
-    if not 0 <= agent_id <= 1:
-        raise ValueError(f"invalid agent_id: {agent_id}")
+    board = np.copy(pre_board)
+    walls_remaining = np.copy(pre_walls_remaining)
 
-    if action_type == 0:  # Move piece
-        (curpos_x, curpos_y) = _agent_pos(board_view, agent_id, board_size)
-        (opppos_x, opppos_y) = _agent_pos(board_view, 1-agent_id, board_size)
-        newpos_x = x
-        newpos_y = y
-
-        if newpos_x == opppos_x and newpos_y == opppos_y:
-            raise ValueError("cannot move to opponent's position")
-
-        delpos_x = newpos_x - curpos_x
-        delpos_y = newpos_y - curpos_y
-        taxicab_dist = abs(delpos_x) + abs(delpos_y)
-        if taxicab_dist == 0:
-            raise ValueError("cannot move zero blocks")
-        elif taxicab_dist > 2:
-            raise ValueError("cannot move more than two blocks")
-        elif (
-            taxicab_dist == 2
-            and (delpos_x == 0 or delpos_y == 0)
-            and not (curpos_x + delpos_x / 2 == opppos_x and curpos_y + delpos_y / 2 == opppos_y)
-        ):
-            raise ValueError("cannot jump over nothing")
-
-        if delpos_x and delpos_y:  # If moving diagonally
-            if (curpos_x + delpos_x != opppos_x or curpos_y != opppos_y) and (
-                curpos_x != opppos_x or curpos_y + delpos_y != opppos_y
-            ):
-                # Only diagonal jumps are permitted.
-                # Agents cannot simply move in diagonal direction.
-                raise ValueError("cannot move diagonally")
-            elif _check_wall_blocked(board_view, curpos_x, curpos_y, opppos_x, opppos_y):
-                raise ValueError("cannot jump over walls")
-
-            original_jump_pos_x = curpos_x + 2 * (opppos_x - curpos_x)
-            original_jump_pos_y = curpos_y + 2 * (opppos_y - curpos_y)
-            if _check_in_range(original_jump_pos_x, original_jump_pos_y, board_size) and not _check_wall_blocked(
-                board_view, curpos_x, curpos_y, original_jump_pos_x, original_jump_pos_y
-            ):
-                raise ValueError(
-                    "cannot diagonally jump if linear jump is possible"
-                )
-            elif _check_wall_blocked(board_view, opppos_x, opppos_y, newpos_x, newpos_y):
-                raise ValueError("cannot jump over walls")
-        elif _check_wall_blocked(board_view, curpos_x, curpos_y, newpos_x, newpos_y):
-            raise ValueError("cannot jump over walls")
+    cdef cell_t [:,:,:] board_view = board
+    cdef cell_t [:] walls_remaining_view = walls_remaining
 
-        board_view[agent_id, curpos_x, curpos_y] = 0
-        board_view[agent_id, newpos_x, newpos_y] = 1
+    _apply_action(board_view, walls_remaining_view, agent_id, action_type, x, y, &ctx)
+    if pre_hash is None:
+        hash = _zobrist_hash(board_view, walls_remaining_view, board_size)
 
-    elif action_type == 1:  # Place wall horizontally
-        if walls_remaining_view[agent_id] == 0:
-            raise ValueError(f"no walls left for agent {agent_id}")
-        if y == board_size-1:
-            raise ValueError("cannot place wall on the edge")
-        if x == board_size-1:
-            raise ValueError("right section out of board")
-        if board_view[2, x, y] or board_view[2, x+1, y]:
-            raise ValueError("wall already placed")
-        zero_index = -1
-        for cy in range(y, -1, -1):
-            if board_view[3, x, cy] == 0:
-                zero_index = cy
-                break
-        if zero_index == -1:
-            if y % 2 == 0:
-                raise ValueError("cannot create intersecting walls")
-        elif (y - zero_index) % 2 == 1:
-            raise ValueError("cannot create intersecting walls")
-        board_view[2, x, y] = 1 + agent_id
-        board_view[2, x + 1, y] = 1 + agent_id
-        walls_remaining_view[agent_id] -= 1
+    return (board, walls_remaining, _check_wins(board_view, board_size), hash)
 
-    elif action_type == 2:  # Place wall vertically
-        if walls_remaining_view[agent_id] == 0:
-            raise ValueError(f"no walls left for agent {agent_id}")
-        if x == board_size-1:
-            raise ValueError("cannot place wall on the edge")
-        if y == board_size-1:
-            raise ValueError("right section out of board")
-        if board_view[3, x, y] or board_view[3, x, y+1]:
-            raise ValueError("wall already placed")
-        zero_index = -1
-        for cx in range(x, -1, -1):
-            if board_view[2, cx, y] == 0:
-                zero_index = cx
-                break
-        if zero_index == -1:
-            if x % 2 == 0:
-                raise ValueError("cannot create intersecting walls")
-        elif (x - zero_index) % 2 == 1:
-            raise ValueError("cannot create intersecting walls")
-        board_view[3, x, y] = 1 + agent_id
-        board_view[3, x, y + 1] = 1 + agent_id
-        walls_remaining_view[agent_id] -= 1
-
-    else:
-        raise ValueError(f"invalid action_type: {action_type}")
+cdef str _error_message(int error, int agent_id, int action_type, int x, int y):
+    if error == ERR_OUT_OF_BOARD:
+        return f"out of board: {(x, y)}"
+    if error == ERR_INVALID_AGENT_ID:
+        return f"invalid agent_id: {agent_id}"
+    if error == ERR_INVALID_ACTION_TYPE:
+        return f"invalid action_type: {action_type}"
+    if error == ERR_OPPONENT_POSITION:
+        return "cannot move to opponent's position"
+    if error == ERR_ZERO_BLOCKS:
+        return "cannot move zero blocks"
+    if error == ERR_TOO_FAR:
+        return "cannot move more than two blocks"
+    if error == ERR_JUMP_OVER_NOTHING:
+        return "cannot jump over nothing"
+    if error == ERR_DIAGONAL_MOVE:
+        return "cannot move diagonally"
+    if error == ERR_JUMP_OVER_WALL:
+        return "cannot jump over walls"
+    if error == ERR_DIAGONAL_JUMP:
+        return "cannot diagonally jump if linear jump is possible"
+    if error == ERR_NO_WALLS_LEFT:
+        return f"no walls left for agent {agent_id}"
+    if error == ERR_WALL_ON_EDGE:
+        return "cannot place wall on the edge"
+    if error == ERR_WALL_OUT_OF_BOARD:
+        return "right section out of board"
+    if error == ERR_WALL_ALREADY_PLACED:
+        return "wall already placed"
+    if error == ERR_INTERSECTING_WALLS:
+        return "cannot create intersecting walls"
+    if error == ERR_BLOCKING_PATHS:
+        return "cannot place wall blocking all paths"
+    return f"unknown error code: {error}"
 
-    if action_type > 0:
-        if not _check_path_exists(board_view, 0, board_size) or not _check_path_exists(board_view, 1, board_size):
-            raise ValueError("cannot place wall blocking all paths")
+cdef void _action_context(cell_t [:,:,:] board_view, int board_size, ActionContext *ctx) noexcept nogil:
+    cdef int agent_id
+    for agent_id in range(2):
+        (ctx.pos_x[agent_id], ctx.pos_y[agent_id]) = _agent_pos(board_view, agent_id, board_size)
+    ctx.has_edges = 0
+    ctx.has_paths = 0
 
-    return (board, walls_remaining, _check_wins(board_view, board_size))
+cdef int _validate_action(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    int agent_id,
+    int action_type,
+    int x,
+    int y,
+    int board_size,
+    ActionContext *ctx
+) noexcept nogil:
+    """
+    Check whether the action is legal without touching the board.
+    Returns ``ACTION_OK`` or the reason code of the first rule it breaks.
+    """
+    if not _check_in_range(x, y, board_size):
+        return ERR_OUT_OF_BOARD
+    if not 0 <= agent_id <= 1:
+        return ERR_INVALID_AGENT_ID
+    if action_type == 0:
+        return _validate_move(board_view, agent_id, x, y, board_size, ctx)
+    if action_type == 1 or action_type == 2:
+        return _validate_wall(board_view, walls_remaining_view, agent_id, action_type, x, y, board_size, ctx)
+    return ERR_INVALID_ACTION_TYPE
 
-cdef int _is_moving_legal(int [:,:,:] board_view, int x, int y, int agent_id, int board_size):
+cdef int _validate_move(
+    cell_t [:,:,:] board_view,
+    int agent_id,
+    int x,
+    int y,
+    int board_size,
+    ActionContext *ctx
+) noexcept nogil:
 
     cdef int curpos_x, curpos_y, newpos_x, newpos_y, opppos_x, opppos_y, delpos_x, delpos_y
     cdef int taxicab_dist, original_jump_pos_x, original_jump_pos_y
-    
-    if not _check_in_range(x, y, board_size):
-        return 0
 
-    (curpos_x, curpos_y) = _agent_pos(board_view, agent_id, board_size)
-    (opppos_x, opppos_y) = _agent_pos(board_view, 1-agent_id, board_size)
+    curpos_x = ctx.pos_x[agent_id]
+    curpos_y = ctx.pos_y[agent_id]
+    opppos_x = ctx.pos_x[1-agent_id]
+    opppos_y = ctx.pos_y[1-agent_id]
     newpos_x = x
     newpos_y = y
 
     if newpos_x == opppos_x and newpos_y == opppos_y:
-        return 0
+        return ERR_OPPONENT_POSITION
 
     delpos_x = newpos_x - curpos_x
     delpos_y = newpos_y - curpos_y
     taxicab_dist = abs(delpos_x) + abs(delpos_y)
-    if (
+    if taxicab_dist == 0:
+        return ERR_ZERO_BLOCKS
+    elif taxicab_dist > 2:
+        return ERR_TOO_FAR
+    elif (
         taxicab_dist == 2
         and (delpos_x == 0 or delpos_y == 0)
         and not (curpos_x + delpos_x / 2 == opppos_x and curpos_y + delpos_y / 2 == opppos_y)
     ):
-        return 0
+        return ERR_JUMP_OVER_NOTHING
 
     if delpos_x and delpos_y:  # If moving diagonally
         if (curpos_x + delpos_x != opppos_x or curpos_y != opppos_y) and (
@@ -166,28 +237,154 @@ cdef int _is_moving_legal(int [:,:,:] board_view, int x, int y, int agent_id, in
         ):
             # Only diagonal jumps are permitted.
             # Agents cannot simply move in diagonal direction.
-            return 0
+            return ERR_DIAGONAL_MOVE
         elif _check_wall_blocked(board_view, curpos_x, curpos_y, opppos_x, opppos_y):
-            return 0
+            return ERR_JUMP_OVER_WALL
 
         original_jump_pos_x = curpos_x + 2 * (opppos_x - curpos_x)
         original_jump_pos_y = curpos_y + 2 * (opppos_y - curpos_y)
         if _check_in_range(original_jump_pos_x, original_jump_pos_y, board_size) and not _check_wall_blocked(
             board_view, curpos_x, curpos_y, original_jump_pos_x, original_jump_pos_y
         ):
-            return 0
+            return ERR_DIAGONAL_JUMP
         elif _check_wall_blocked(board_view, opppos_x, opppos_y, newpos_x, newpos_y):
-            return 0
+            return ERR_JUMP_OVER_WALL
     elif _check_wall_blocked(board_view, curpos_x, curpos_y, newpos_x, newpos_y):
-        return 0
+        return ERR_JUMP_OVER_WALL
 
-    return 1
+    return ACTION_OK
+
+cdef int _validate_wall(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    int agent_id,
+    int action_type,
+    int x,
+    int y,
+    int board_size,
+    ActionContext *ctx
+) noexcept nogil:
+
+    cdef int cx, cy, zero_index, first, second, check_id
+    cdef Bitboard open_xp, open_yp, path
+
+    if walls_remaining_view[agent_id] == 0:
+        return ERR_NO_WALLS_LEFT
+
+    if action_type == 1:  # Place wall horizontally
+        if y == board_size-1:
+            return ERR_WALL_ON_EDGE
+        if x == board_size-1:
+            return ERR_WALL_OUT_OF_BOARD
+        if board_view[2, x, y] or board_view[2, x+1, y]:
+            return ERR_WALL_ALREADY_PLACED
+        zero_index = -1
+        for cy in range(y, -1, -1):
+            if board_view[3, x, cy] == 0:
+                zero_index = cy
+                break
+        if zero_index == -1:
+            if y % 2 == 0:
+                return ERR_INTERSECTING_WALLS
+        elif (y - zero_index) % 2 == 1:
+            return ERR_INTERSECTING_WALLS
+    else:  # Place wall vertically
+        if x == board_size-1:
+            return ERR_WALL_ON_EDGE
+        if y == board_size-1:
+            return ERR_WALL_OUT_OF_BOARD
+        if board_view[3, x, y] or board_view[3, x, y+1]:
+            return ERR_WALL_ALREADY_PLACED
+        zero_index = -1
+        for cx in range(x, -1, -1):
+            if board_view[2, cx, y] == 0:
+                zero_index = cx
+                break
+        if zero_index == -1:
+            if x % 2 == 0:
+                return ERR_INTERSECTING_WALLS
+        elif (x - zero_index) % 2 == 1:
+            return ERR_INTERSECTING_WALLS
+
+    if not ctx.has_edges:
+        _open_edges(board_view, board_size, &ctx.open_xp, &ctx.open_yp)
+        ctx.has_edges = 1
+    open_xp = ctx.open_xp
+    open_yp = ctx.open_yp
+    if action_type == 1:
+        first = x * board_size + y
+        second = (x + 1) * board_size + y
+        _bb_clear(&open_yp, first)
+        _bb_clear(&open_yp, second)
+    else:
+        first = x * board_size + y
+        second = x * board_size + y + 1
+        _bb_clear(&open_xp, first)
+        _bb_clear(&open_xp, second)
+    for check_id in range(2):
+        if ctx.has_paths:
+            # A wall which leaves an agent's shortest path intact cannot cut the
+            # agent off from its goal row.
+            if action_type == 1:
+                path = ctx.path_yp[check_id]
+            else:
+                path = ctx.path_xp[check_id]
+            if not (_bb_test(path, first) or _bb_test(path, second)):
+                continue
+        if not _check_path_exists(ctx, check_id, open_xp, open_yp, board_size):
+            return ERR_BLOCKING_PATHS
+
+    return ACTION_OK
+
+cdef void _apply_action(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    int agent_id,
+    int action_type,
+    int x,
+    int y,
+    ActionContext *ctx
+) noexcept nogil:
+    """
+    Apply an action which already passed ``_validate_action``.
+    """
+    if action_type == 0:
+        board_view[agent_id, ctx.pos_x[agent_id], ctx.pos_y[agent_id]] = 0
+        board_view[agent_id, x, y] = 1
+    elif action_type == 1:
+        board_view[2, x, y] = 1 + agent_id
+        board_view[2, x + 1, y] = 1 + agent_id
+        walls_remaining_view[agent_id] -= 1
+    else:
+        board_view[3, x, y] = 1 + agent_id
+        board_view[3, x, y + 1] = 1 + agent_id
+        walls_remaining_view[agent_id] -= 1
 
 def fast_legal_actions(state, int agent_id, int board_size):
-    
-    cdef int dir_id, action_type, next_pos_x, next_pos_y, cx, cy, nowpos_x, nowpos_y
+
+    cdef cell_t [:,:,:] board_view = state.board
+    cdef cell_t [:] walls_remaining_view = state.walls_remaining
+
+    _check_board_size(board_size, state.board)
+    if not 0 <= agent_id <= 1:
+        raise ValueError(f"invalid agent_id: {agent_id}")
+
+    legal_actions_np = np.zeros((3, board_size, board_size), dtype=BOARD_DTYPE)
+    cdef cell_t [:,:,:] legal_actions_np_view = legal_actions_np
+    _legal_actions(board_view, walls_remaining_view, agent_id, board_size, legal_actions_np_view)
+    return legal_actions_np
+
+cdef void _legal_actions(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    int agent_id,
+    int board_size,
+    cell_t [:,:,:] legal_actions_view
+) noexcept nogil:
+
+    cdef int dir_id, action_type, next_pos_x, next_pos_y, cx, cy
     cdef int directions[12][2]
-    cdef int [:,:,:] board_view = state.board
+    cdef ActionContext ctx
 
     directions[0][:] = [0, -2]
     directions[1][:] = [-1, -1]
@@ -202,88 +399,398 @@ def fast_legal_actions(state, int agent_id, int board_size):
     directions[10][:] = [1, 1]
     directions[11][:] = [0, 2]
 
-    legal_actions_np = np.zeros((3, 9, 9), dtype=np.int_)
-    cdef int [:,:,:] legal_actions_np_view = legal_actions_np
-    (nowpos_x, nowpos_y) = _agent_pos(board_view, agent_id, board_size)
-    
+    _action_context(board_view, board_size, &ctx)
+
     for dir_id in range(12):
-        next_pos_x = nowpos_x + directions[dir_id][0]
-        next_pos_y = nowpos_y + directions[dir_id][1]
-        if _is_moving_legal(board_view, next_pos_x, next_pos_y, agent_id, board_size):
-            legal_actions_np_view[0, next_pos_x, next_pos_y] = 1
+        next_pos_x = ctx.pos_x[agent_id] + directions[dir_id][0]
+        next_pos_y = ctx.pos_y[agent_id] + directions[dir_id][1]
+        if not _check_in_range(next_pos_x, next_pos_y, board_size):
+            continue
+        if _validate_move(board_view, agent_id, next_pos_x, next_pos_y, board_size, &ctx) == ACTION_OK:
+            legal_actions_view[0, next_pos_x, next_pos_y] = 1
+    if walls_remaining_view[agent_id] == 0:
+        return
+    _shortest_paths(board_view, board_size, &ctx)
     for action_type in range(1, 3):
         for cx in range(board_size-1):
             for cy in range(board_size-1):
-                try:
-                    fast_step(state.board, state.walls_remaining, agent_id, (action_type, cx, cy), board_size)
-                except:
-                    ...
-                else:
-                    legal_actions_np_view[action_type, cx, cy] = 1
+                if _validate_wall(
+                    board_view, walls_remaining_view, agent_id, action_type, cx, cy, board_size, &ctx
+                ) == ACTION_OK:
+                    legal_actions_view[action_type, cx, cy] = 1
+
+def fast_step_batch(
+    boards,
+    walls_remaining,
+    agent_ids,
+    actions,
+    int board_size
+):
+    """
+    Step ``N`` games at once, in place and without the GIL.
+    ``boards`` has shape ``(N, 4, W, H)`` and ``walls_remaining`` ``(N, 2)``, both of
+    ``BOARD_DTYPE``; ``agent_ids`` ``(N,)`` and ``actions`` ``(N, 3)`` are ``np.intc``.
+    Games whose action is illegal are left untouched; nothing is raised.
+    :returns:
+        A tuple of ``(dones, errors)``, both of shape ``(N,)``. ``errors`` is 0 for
+        games which were stepped, and a reason code readable with
+        :func:`error_message` otherwise.
+    """
+    cdef cell_t [:,:,:,:] boards_view = boards
+    cdef cell_t [:,:] walls_remaining_view = walls_remaining
+    cdef int [:] agent_ids_view = agent_ids
+    cdef int [:,:] actions_view = actions
+    cdef int n = boards_view.shape[0]
+    cdef int i, agent_id, action_type, x, y, error
+    cdef ActionContext ctx
+
+    _check_board_size(board_size, boards)
+    dones = np.zeros((n,), dtype=np.intc)
+    errors = np.zeros((n,), dtype=np.intc)
+    cdef int [:] dones_view = dones
+    cdef int [:] errors_view = errors
+
+    with nogil:
+        for i in range(n):
+            agent_id = agent_ids_view[i]
+            action_type = actions_view[i, 0]
+            x = actions_view[i, 1]
+            y = actions_view[i, 2]
+            _action_context(boards_view[i], board_size, &ctx)
+            error = _validate_action(
+                boards_view[i], walls_remaining_view[i], agent_id, action_type, x, y, board_size, &ctx
+            )
+            errors_view[i] = error
+            if error == ACTION_OK:
+                _apply_action(boards_view[i], walls_remaining_view[i], agent_id, action_type, x, y, &ctx)
+            dones_view[i] = _check_wins(boards_view[i], board_size)
+
+    return (dones, errors)
+
+def fast_legal_actions_batch(boards, walls_remaining, agent_ids, int board_size):
+    """
+    Find possible actions for ``N`` games at once without the GIL.
+    :returns:
+        A numpy array of shape ``(N, 3, W, H)`` which is one-hot encoding of possible
+        actions of each game.
+    """
+    cdef cell_t [:,:,:,:] boards_view = boards
+    cdef cell_t [:,:] walls_remaining_view = walls_remaining
+    cdef int [:] agent_ids_view = agent_ids
+    cdef int n = boards_view.shape[0]
+    cdef int i
+
+    _check_board_size(board_size, boards)
+    for i in range(n):
+        if not 0 <= agent_ids_view[i] <= 1:
+            raise ValueError(f"invalid agent_id: {agent_ids_view[i]}")
+
+    legal_actions_np = np.zeros((n, 3, board_size, board_size), dtype=BOARD_DTYPE)
+    cdef cell_t [:,:,:,:] legal_actions_view = legal_actions_np
+
+    with nogil:
+        for i in range(n):
+            _legal_actions(
+                boards_view[i], walls_remaining_view[i], agent_ids_view[i], board_size, legal_actions_view[i]
+            )
+
     return legal_actions_np
 
-cdef int _check_in_range(int pos_x, int pos_y, int bottom_right = 9):
+cdef inline u64 _next_random(u64 *state) noexcept nogil:
+    # xorshift64*
+    state[0] ^= state[0] >> 12
+    state[0] ^= state[0] << 25
+    state[0] ^= state[0] >> 27
+    return state[0] * 2685821657736338717ULL
+
+cdef int _winner(cell_t [:,:,:] board_view, int board_size) noexcept nogil:
+    cdef int i
+    for i in range(board_size):
+        if board_view[0, i, board_size-1]:
+            return 0
+        if board_view[1, i, 0]:
+            return 1
+    return -1
+
+cdef void _rollout(
+    cell_t [:,:,:] root_board_view,
+    cell_t [:] root_walls_remaining_view,
+    int agent_id,
+    int board_size,
+    int max_plies,
+    u64 *random_state,
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    cell_t [:,:,:] legal_actions_view,
+    int *winner,
+    int *length
+) noexcept nogil:
+    cdef int c, i, j, ply, count, pick, action_type, x, y
+    cdef ActionContext ctx
+
+    for c in range(4):
+        for i in range(board_size):
+            for j in range(board_size):
+                board_view[c, i, j] = root_board_view[c, i, j]
+    walls_remaining_view[0] = root_walls_remaining_view[0]
+    walls_remaining_view[1] = root_walls_remaining_view[1]
+
+    winner[0] = _winner(board_view, board_size)
+    length[0] = 0
+    ply = 0
+    while winner[0] == -1 and ply < max_plies:
+        for c in range(3):
+            for i in range(board_size):
+                for j in range(board_size):
+                    legal_actions_view[c, i, j] = 0
+        _legal_actions(board_view, walls_remaining_view, agent_id, board_size, legal_actions_view)
+        count = 0
+        for c in range(3):
+            for i in range(board_size):
+                for j in range(board_size):
+                    count += legal_actions_view[c, i, j]
+        if count == 0:
+            break
+        pick = <int>(_next_random(random_state) % <u64>count)
+        action_type = x = y = 0
+        for c in range(3):
+            for i in range(board_size):
+                for j in range(board_size):
+                    if legal_actions_view[c, i, j]:
+                        if pick == 0:
+                            action_type = c
+                            x = i
+                            y = j
+                        pick -= 1
+        _action_context(board_view, board_size, &ctx)
+        _apply_action(board_view, walls_remaining_view, agent_id, action_type, x, y, &ctx)
+        ply += 1
+        winner[0] = _winner(board_view, board_size)
+        agent_id = 1 - agent_id
+    length[0] = ply
+
+def rollout(state, int agent_id, unsigned long long seed, int max_plies = 1000, int board_size = 9):
+    """
+    Play a uniformly random game from ``state`` until it ends, entirely in native
+    code. ``agent_id`` is the agent to move first.
+    :returns:
+        A tuple of ``(winner, length)``. ``winner`` is ``-1`` if the game did not end
+        within ``max_plies`` plies.
+    """
+    winners, lengths = rollouts(state, agent_id, seed, 1, max_plies, board_size)
+    return (int(winners[0]), int(lengths[0]))
+
+def rollouts(
+    state,
+    int agent_id,
+    unsigned long long seed,
+    int n_rollouts,
+    int max_plies = 1000,
+    int board_size = 9
+):
+    """
+    Play ``n_rollouts`` independent random games from the same ``state``.
+    :returns:
+        A tuple of ``(winners, lengths)`` arrays of shape ``(n_rollouts,)``.
+    """
+    cdef cell_t [:,:,:] root_board_view = state.board
+    cdef cell_t [:] root_walls_remaining_view = state.walls_remaining
+    cdef int i
+    cdef u64 random_state = seed * 0x9E3779B97F4A7C15ULL + 0x2545F4914F6CDD1DULL
+
+    _check_board_size(board_size, state.board)
+    if not 0 <= agent_id <= 1:
+        raise ValueError(f"invalid agent_id: {agent_id}")
+    if random_state == 0:
+        random_state = 1
+
+    board = np.empty((4, board_size, board_size), dtype=BOARD_DTYPE)
+    walls_remaining = np.empty((2,), dtype=BOARD_DTYPE)
+    legal_actions_np = np.empty((3, board_size, board_size), dtype=BOARD_DTYPE)
+    winners = np.empty((n_rollouts,), dtype=np.intc)
+    lengths = np.empty((n_rollouts,), dtype=np.intc)
+    cdef cell_t [:,:,:] board_view = board
+    cdef cell_t [:] walls_remaining_view = walls_remaining
+    cdef cell_t [:,:,:] legal_actions_view = legal_actions_np
+    cdef int [:] winners_view = winners
+    cdef int [:] lengths_view = lengths
+
+    with nogil:
+        for i in range(n_rollouts):
+            _rollout(
+                root_board_view,
+                root_walls_remaining_view,
+                agent_id,
+                board_size,
+                max_plies,
+                &random_state,
+                board_view,
+                walls_remaining_view,
+                legal_actions_view,
+                &winners_view[i],
+                &lengths_view[i],
+            )
+
+    return (winners, lengths)
+
+def zobrist_hash(board, walls_remaining, int board_size):
+    """
+    Compute the 64-bit Zobrist hash of a position from scratch. ``fast_step``
+    updates it incrementally when given the previous hash.
+    """
+    _check_board_size(board_size, board)
+    return _zobrist_hash(board, walls_remaining, board_size)
+
+# Keys are indexed by ``[channel][label][x][y]``; label 0 keys stay zero so empty
+# cells do not contribute to the hash.
+cdef u64 _zobrist_cells[4][3][MAX_BOARD_SIZE][MAX_BOARD_SIZE]
+cdef u64 _zobrist_walls_remaining[2][256]
+
+cdef void _init_zobrist() noexcept nogil:
+    cdef u64 seed = 0x51756F7269646F72ULL
+    cdef int c, label, i, j
+    for c in range(4):
+        for i in range(MAX_BOARD_SIZE):
+            for j in range(MAX_BOARD_SIZE):
+                _zobrist_cells[c][0][i][j] = 0
+                for label in range(1, 3):
+                    _zobrist_cells[c][label][i][j] = _splitmix64(&seed)
+    for c in range(2):
+        for i in range(256):
+            _zobrist_walls_remaining[c][i] = _splitmix64(&seed)
+
+_init_zobrist()
+
+cdef u64 _zobrist_hash(
+    cell_t [:,:,:] board_view, cell_t [:] walls_remaining_view, int board_size
+) noexcept nogil:
+    cdef u64 hash = 0
+    cdef int c, i, j
+    for c in range(4):
+        for i in range(board_size):
+            for j in range(board_size):
+                hash ^= _zobrist_cells[c][board_view[c, i, j]][i][j]
+    hash ^= _zobrist_walls_remaining[0][walls_remaining_view[0]]
+    hash ^= _zobrist_walls_remaining[1][walls_remaining_view[1]]
+    return hash
+
+cdef u64 _zobrist_delta(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    int agent_id,
+    int action_type,
+    int x,
+    int y,
+    ActionContext *ctx
+) noexcept nogil:
+    """
+    Hash difference caused by a valid action, computed on the board before it is
+    applied.
+    """
+    cdef int walls = walls_remaining_view[agent_id]
+    if action_type == 0:
+        return (
+            _zobrist_cells[agent_id][1][ctx.pos_x[agent_id]][ctx.pos_y[agent_id]]
+            ^ _zobrist_cells[agent_id][1][x][y]
+        )
+    elif action_type == 1:
+        return (
+            _zobrist_cells[2][1 + agent_id][x][y]
+            ^ _zobrist_cells[2][1 + agent_id][x + 1][y]
+            ^ _zobrist_walls_remaining[agent_id][walls]
+            ^ _zobrist_walls_remaining[agent_id][walls - 1]
+        )
+    return (
+        _zobrist_cells[3][1 + agent_id][x][y]
+        ^ _zobrist_cells[3][1 + agent_id][x][y + 1]
+        ^ _zobrist_walls_remaining[agent_id][walls]
+        ^ _zobrist_walls_remaining[agent_id][walls - 1]
+    )
+
+def error_message(int error, int agent_id, action):
+    """
+    Describe an error code returned by :func:`fast_step_batch`.
+    """
+    return _error_message(error, agent_id, action[0], action[1], action[2])
+
+cdef int _check_in_range(int pos_x, int pos_y, int bottom_right) noexcept nogil:
     return (0 <= pos_x < bottom_right and 0 <= pos_y < bottom_right)
 
-cdef int _check_path_exists(int [:,:,:] board_view, int agent_id, int board_size):
+cdef int _check_path_exists(
+    ActionContext *ctx,
+    int agent_id,
+    Bitboard open_xp,
+    Bitboard open_yp,
+    int board_size
+) noexcept nogil:
 
-    cdef int pos_x, pos_y
-    cdef int i, j
-    cdef int cnt = 0, tail = 0
-    cdef int there_x, there_y
-    cdef int goal = (1-agent_id) * 8
-    cdef int queue_x[81]
-    cdef int queue_y[81]
-    cdef int visited[81][81]
-    cdef int directions[4][2]
-
-    for i in range(9):
-        for j in range(9):
-            visited[i][j] = 0
-    
-    if agent_id:
-        directions[0][:] = [0, -1]
-        directions[1][:] = [1, 0]
-        directions[2][:] = [-1, 0]
-        directions[3][:] = [0, 1]
-    else:
-        directions[0][:] = [0, 1]
-        directions[1][:] = [1, 0]
-        directions[2][:] = [-1, 0]
-        directions[3][:] = [0, -1]
-
-    (pos_x, pos_y) = _agent_pos(board_view, agent_id, board_size)
-    if pos_y == goal:   return 1
-    
-    queue_x[tail] = pos_x
-    queue_y[tail] = pos_y
-    tail += 1
-    visited[pos_x][pos_y] = 1
-
-    for i in range(board_size * board_size):
-        if cnt == tail: break
-        pos_x = queue_x[cnt]
-        pos_y = queue_y[cnt]
-        cnt += 1
-        for j in range(4):
-            there_x = pos_x + directions[j][0]
-            there_y = pos_y + directions[j][1]
-            if not (0 <= there_x < board_size and 0 <= there_y < board_size):
-                continue
-            if visited[there_x][there_y]:
-                continue
-            if _check_wall_blocked(board_view, pos_x, pos_y, there_x, there_y):
-                continue
-            if there_y == goal:
-                return 1
-            visited[there_x][there_y] = 1
-            queue_x[tail] = there_x
-            queue_y[tail] = there_y
-            tail += 1
+    cdef Bitboard pawn = _bb_zero()
 
-    return 0
+    _bb_set(&pawn, ctx.pos_x[agent_id] * board_size + ctx.pos_y[agent_id])
+    return _bb_reachable(pawn, _goal_bits(agent_id, board_size), open_xp, open_yp, board_size)
+
+cdef void _shortest_paths(cell_t [:,:,:] board_view, int board_size, ActionContext *ctx) noexcept nogil:
+    """
+    Record the edges of one shortest path to the goal row for each agent.
+    """
+    cdef Bitboard layers[MAX_CELLS]
+    cdef Bitboard reach, goal, expanded
+    cdef int agent_id, depth, index, cur, i, found
+    cdef int last = board_size * board_size
+
+    if not ctx.has_edges:
+        _open_edges(board_view, board_size, &ctx.open_xp, &ctx.open_yp)
+        ctx.has_edges = 1
 
-cdef int _check_wall_blocked(int [:,:,:] board_view, int cx, int cy, int nx, int ny):
+    for agent_id in range(2):
+        ctx.path_xp[agent_id] = _bb_zero()
+        ctx.path_yp[agent_id] = _bb_zero()
+        goal = _goal_bits(agent_id, board_size)
+        reach = _bb_zero()
+        _bb_set(&reach, ctx.pos_x[agent_id] * board_size + ctx.pos_y[agent_id])
+        layers[0] = reach
+        depth = 0
+        found = 1
+        while not _bb_any(_bb_and(layers[depth], goal)):
+            expanded = _bb_expand(reach, ctx.open_xp, ctx.open_yp, board_size)
+            if _bb_equal(expanded, reach):
+                found = 0
+                break
+            depth += 1
+            for i in range(BB_WORDS):
+                layers[depth].w[i] = expanded.w[i] & ~reach.w[i]
+            reach = expanded
+
+        if not found:
+            # Agent is already cut off, so every wall must be checked.
+            for i in range(BB_WORDS):
+                ctx.path_xp[agent_id].w[i] = ~(<u64>0)
+                ctx.path_yp[agent_id].w[i] = ~(<u64>0)
+            continue
+
+        # Walk back from the goal row through the distance layers.
+        cur = 0
+        for index in range(last):
+            if _bb_test(layers[depth], index) and _bb_test(goal, index):
+                cur = index
+                break
+        while depth > 0:
+            depth -= 1
+            if cur % board_size and _bb_test(ctx.open_yp, cur - 1) and _bb_test(layers[depth], cur - 1):
+                cur -= 1
+                _bb_set(&ctx.path_yp[agent_id], cur)
+            elif _bb_test(ctx.open_yp, cur) and _bb_test(layers[depth], cur + 1):
+                _bb_set(&ctx.path_yp[agent_id], cur)
+                cur += 1
+            elif cur >= board_size and _bb_test(ctx.open_xp, cur - board_size) and _bb_test(layers[depth], cur - board_size):
+                cur -= board_size
+                _bb_set(&ctx.path_xp[agent_id], cur)
+            else:
+                _bb_set(&ctx.path_xp[agent_id], cur)
+                cur += board_size
+    ctx.has_paths = 1
+
+cdef int _check_wall_blocked(cell_t [:,:,:] board_view, int cx, int cy, int nx, int ny) noexcept nogil:
     cdef int i
     if nx > cx:
         for i in range(cx, nx):
@@ -307,7 +814,7 @@ cdef int _check_wall_blocked(int [:,:,:] board_view, int cx, int cy, int nx, int
         return 0
     return 0
 
-cdef int _check_wins(int [:,:,:] board_view, int board_size):
+cdef int _check_wins(cell_t [:,:,:] board_view, int board_size) noexcept nogil:
     cdef int i
     for i in range(board_size):
         if board_view[0, i, board_size-1]:
@@ -316,10 +823,653 @@ cdef int _check_wins(int [:,:,:] board_view, int board_size):
             return 1
     return 0
 
-cdef (int, int) _agent_pos(int [:,:,:] board_view, int agent_id, int board_size):
+cdef (int, int) _agent_pos(cell_t [:,:,:] board_view, int agent_id, int board_size) noexcept nogil:
     cdef int i, j
     for i in range(board_size):
         for j in range(board_size):
             if board_view[agent_id, i, j]:
                 return (i, j)
-    return (-1, -1)
\ No newline at end of file
+    return (-1, -1)
+
+cdef inline Bitboard _bb_zero() noexcept nogil:
+    cdef Bitboard r
+    cdef int i
+    for i in range(BB_WORDS):
+        r.w[i] = 0
+    return r
+
+cdef inline void _bb_set(Bitboard *bb, int index) noexcept nogil:
+    bb.w[index >> 6] |= (<u64>1) << (index & 63)
+
+cdef inline void _bb_clear(Bitboard *bb, int index) noexcept nogil:
+    bb.w[index >> 6] &= ~((<u64>1) << (index & 63))
+
+cdef inline int _bb_test(Bitboard bb, int index) noexcept nogil:
+    return (bb.w[index >> 6] >> (index & 63)) & 1
+
+cdef inline Bitboard _bb_or(Bitboard a, Bitboard b) noexcept nogil:
+    cdef int i
+    for i in range(BB_WORDS):
+        a.w[i] |= b.w[i]
+    return a
+
+cdef inline Bitboard _bb_and(Bitboard a, Bitboard b) noexcept nogil:
+    cdef int i
+    for i in range(BB_WORDS):
+        a.w[i] &= b.w[i]
+    return a
+
+cdef inline int _bb_any(Bitboard a) noexcept nogil:
+    cdef int i
+    for i in range(BB_WORDS):
+        if a.w[i]:
+            return 1
+    return 0
+
+cdef inline int _bb_equal(Bitboard a, Bitboard b) noexcept nogil:
+    cdef int i
+    for i in range(BB_WORDS):
+        if a.w[i] != b.w[i]:
+            return 0
+    return 1
+
+cdef inline Bitboard _bb_shl(Bitboard a, int n) noexcept nogil:
+    # 0 < n < 64
+    cdef int i
+    for i in range(BB_WORDS - 1, 0, -1):
+        a.w[i] = (a.w[i] << n) | (a.w[i - 1] >> (64 - n))
+    a.w[0] <<= n
+    return a
+
+cdef inline Bitboard _bb_shr(Bitboard a, int n) noexcept nogil:
+    # 0 < n < 64
+    cdef int i
+    for i in range(BB_WORDS - 1):
+        a.w[i] = (a.w[i] >> n) | (a.w[i + 1] << (64 - n))
+    a.w[BB_WORDS - 1] >>= n
+    return a
+
+cdef Bitboard _goal_bits(int agent_id, int board_size) noexcept nogil:
+    cdef Bitboard goal = _bb_zero()
+    cdef int i
+    cdef int goal_y = (1 - agent_id) * (board_size - 1)
+    for i in range(board_size):
+        _bb_set(&goal, i * board_size + goal_y)
+    return goal
+
+cdef Bitboard _pawn_bits(cell_t [:,:,:] board_view, int agent_id, int board_size) noexcept nogil:
+    cdef Bitboard pawn = _bb_zero()
+    cdef int i, j
+    for i in range(board_size):
+        for j in range(board_size):
+            if board_view[agent_id, i, j]:
+                _bb_set(&pawn, i * board_size + j)
+                return pawn
+    return pawn
+
+cdef void _open_edges(
+    cell_t [:,:,:] board_view,
+    int board_size,
+    Bitboard *open_xp,
+    Bitboard *open_yp
+) noexcept nogil:
+    """
+    Build the masks of cells which can step to ``(x + 1, y)`` and ``(x, y + 1)``.
+    """
+    cdef int i, j
+    open_xp[0] = _bb_zero()
+    open_yp[0] = _bb_zero()
+    for i in range(board_size):
+        for j in range(board_size):
+            if i < board_size - 1 and board_view[3, i, j] == 0:
+                _bb_set(open_xp, i * board_size + j)
+            if j < board_size - 1 and board_view[2, i, j] == 0:
+                _bb_set(open_yp, i * board_size + j)
+
+cdef int _bb_reachable(
+    Bitboard reach,
+    Bitboard goal,
+    Bitboard open_xp,
+    Bitboard open_yp,
+    int board_size
+) noexcept nogil:
+    """
+    Flood fill from ``reach`` one step per iteration until it touches ``goal``.
+    """
+    cdef Bitboard expanded
+    while not _bb_any(_bb_and(reach, goal)):
+        expanded = _bb_expand(reach, open_xp, open_yp, board_size)
+        if _bb_equal(expanded, reach):
+            return 0
+        reach = expanded
+    return 1
+
+cdef inline Bitboard _bb_expand(
+    Bitboard reach,
+    Bitboard open_xp,
+    Bitboard open_yp,
+    int board_size
+) noexcept nogil:
+    """
+    Grow ``reach`` by one step, expanding the whole frontier in four directions
+    with shift-and-mask operations.
+    """
+    cdef Bitboard expanded
+    expanded = _bb_or(reach, _bb_shl(_bb_and(reach, open_yp), 1))
+    expanded = _bb_or(expanded, _bb_and(_bb_shr(reach, 1), open_yp))
+    expanded = _bb_or(expanded, _bb_shl(_bb_and(reach, open_xp), board_size))
+    expanded = _bb_or(expanded, _bb_and(_bb_shr(reach, board_size), open_xp))
+    return expanded
+
+cdef void _distance_map(
+    int agent_id,
+    Bitboard open_xp,
+    Bitboard open_yp,
+    int board_size,
+    int [:,:] distance_view
+) noexcept nogil:
+    """
+    Same flood fill as ``_bb_reachable``, started from the goal row, labelling each
+    frontier with its depth. Cells never reached keep their value.
+    """
+    cdef Bitboard reach = _goal_bits(agent_id, board_size)
+    cdef Bitboard frontier = reach
+    cdef Bitboard expanded
+    cdef int depth = 0
+    cdef int i, index
+    cdef u64 bits
+    while True:
+        for i in range(BB_WORDS):
+            bits = frontier.w[i]
+            while bits:
+                index = i * 64 + __builtin_ctzll(bits)
+                distance_view[index // board_size, index % board_size] = depth
+                bits &= bits - 1
+        expanded = _bb_expand(reach, open_xp, open_yp, board_size)
+        if _bb_equal(expanded, reach):
+            return
+        for i in range(BB_WORDS):
+            frontier.w[i] = expanded.w[i] & ~reach.w[i]
+        reach = expanded
+        depth += 1
+
+def distances(board, int board_size):
+    """
+    Compute the shortest-path distance from every cell to each agent's goal row.
+
+    :returns:
+        A tuple of ``(distance_maps, lengths)``. ``distance_maps`` is an
+        ``np.intc`` array of shape ``(2, board_size, board_size)`` whose entry
+        ``[agent_id, x, y]`` is the number of steps agent ``agent_id`` needs from
+        ``(x, y)``, ignoring the other pawn, or ``UNREACHABLE``. ``lengths`` is an
+        ``np.intc`` array of shape ``(2,)`` with the entry at each pawn. A board
+        without a pawn of either agent raises ``ValueError``.
+    """
+    cdef cell_t [:,:,:] board_view = board
+    cdef Bitboard open_xp, open_yp
+    cdef int agent_id
+    cdef int x, y
+    cdef int pos_x[2]
+    cdef int pos_y[2]
+
+    _check_board_size(board_size, board)
+    for agent_id in range(2):
+        x, y = _agent_pos(board_view, agent_id, board_size)
+        if x < 0:
+            raise ValueError(f"no pawn for agent {agent_id}")
+        pos_x[agent_id] = x
+        pos_y[agent_id] = y
+    distance_maps = np.full((2, board_size, board_size), UNREACHABLE, dtype=np.intc)
+    lengths = np.empty((2,), dtype=np.intc)
+    cdef int [:,:,:] distance_view = distance_maps
+    cdef int [:] lengths_view = lengths
+    with nogil:
+        _open_edges(board_view, board_size, &open_xp, &open_yp)
+        for agent_id in range(2):
+            _distance_map(agent_id, open_xp, open_yp, board_size, distance_view[agent_id])
+            lengths_view[agent_id] = distance_view[agent_id, pos_x[agent_id], pos_y[agent_id]]
+    return distance_maps, lengths
+
+cdef enum:
+    STATE_VERSION = 1
+    STATE_HEADER_SIZE = 16
+    # Horizontal walls of agent 0 and 1, then vertical walls of agent 0 and 1.
+    STATE_WALL_MASKS = 4
+    STATE_NO_PAWN = 255
+
+STATE_FORMAT_VERSION = STATE_VERSION
+"""
+Version byte leading every record written by :func:`pack_state`.
+"""
+
+cdef inline int _mask_bytes(int board_size) noexcept nogil:
+    return (board_size * board_size + 7) // 8
+
+cdef inline int _state_record_size(int board_size) noexcept nogil:
+    return STATE_HEADER_SIZE + STATE_WALL_MASKS * _mask_bytes(board_size)
+
+def state_record_size(int board_size):
+    """
+    Size in bytes of every record written by :func:`pack_state` for ``board_size``.
+    """
+    _check_board_size(board_size)
+    return _state_record_size(board_size)
+
+cdef void _pack_state(
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    bint done,
+    u64 zobrist,
+    int board_size,
+    unsigned char *record
+) noexcept nogil:
+    cdef unsigned char *masks = record + STATE_HEADER_SIZE
+    cdef int mask_bytes = _mask_bytes(board_size)
+    cdef int x, y, i, channel, label
+    memset(record, 0, _state_record_size(board_size))
+    record[0] = STATE_VERSION
+    record[1] = board_size
+    record[2] = done
+    record[3] = STATE_NO_PAWN
+    record[4] = STATE_NO_PAWN
+    record[5] = walls_remaining_view[0]
+    record[6] = walls_remaining_view[1]
+    for i in range(8):
+        record[8 + i] = (zobrist >> (8 * i)) & 0xFF
+    for x in range(board_size):
+        for y in range(board_size):
+            i = x * board_size + y
+            if board_view[0, x, y]:
+                record[3] = i
+            if board_view[1, x, y]:
+                record[4] = i
+            for channel in range(2):
+                label = board_view[2 + channel, x, y]
+                if label == 1 or label == 2:
+                    masks[(2 * channel + label - 1) * mask_bytes + (i >> 3)] |= 1 << (i & 7)
+
+cdef bint _unpack_state(
+    const unsigned char *record,
+    int board_size,
+    cell_t [:,:,:] board_view,
+    cell_t [:] walls_remaining_view,
+    u64 *zobrist
+) noexcept nogil:
+    cdef const unsigned char *masks = record + STATE_HEADER_SIZE
+    cdef int mask_bytes = _mask_bytes(board_size)
+    cdef int x, y, i, channel
+    cdef u64 hash = 0
+    for x in range(board_size):
+        for y in range(board_size):
+            i = x * board_size + y
+            board_view[0, x, y] = record[3] == i
+            board_view[1, x, y] = record[4] == i
+            for channel in range(2):
+                board_view[2 + channel, x, y] = (
+                    ((masks[2 * channel * mask_bytes + (i >> 3)] >> (i & 7)) & 1)
+                    | (((masks[(2 * channel + 1) * mask_bytes + (i >> 3)] >> (i & 7)) & 1) << 1)
+                )
+    walls_remaining_view[0] = record[5]
+    walls_remaining_view[1] = record[6]
+    for i in range(8):
+        hash |= (<u64>record[8 + i]) << (8 * i)
+    zobrist[0] = hash
+    return record[2] & 1
+
+cdef int _check_record(const unsigned char *record, int board_size) except -1:
+    if record[0] != STATE_VERSION:
+        raise ValueError(f"unsupported state format version: {record[0]}")
+    if record[1] != board_size:
+        raise ValueError(f"unsupported board_size: {record[1]}")
+    return 0
+
+def pack_state(board, walls_remaining, bint done, u64 zobrist, int board_size):
+    """
+    Encode a position as a fixed-size record of :func:`state_record_size` bytes.
+
+    Layout: format version, ``board_size``, flags (bit 0: ``done``), cell index
+    ``x * board_size + y`` of each pawn, ``walls_remaining``, one padding byte and
+    the little-endian Zobrist hash, followed by the masks of horizontal walls of
+    agent 0 and 1 and vertical walls of agent 0 and 1. Cell ``i`` is bit
+    ``i % 8`` of byte ``i // 8`` of a mask.
+    """
+    cdef cell_t [:,:,:] board_view = board
+    cdef cell_t [:] walls_remaining_view = walls_remaining
+    _check_board_size(board_size, board)
+    record = bytearray(_state_record_size(board_size))
+    cdef unsigned char [:] record_view = record
+    _pack_state(board_view, walls_remaining_view, done, zobrist, board_size, &record_view[0])
+    return bytes(record)
+
+def unpack_state(data):
+    """
+    Decode a record written by :func:`pack_state`.
+
+    :returns:
+        A tuple of ``(board, walls_remaining, done, zobrist)``.
+    """
+    cdef const unsigned char [:] data_view = data
+    if data_view.shape[0] < STATE_HEADER_SIZE:
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    cdef int board_size = data_view[1]
+    _check_board_size(board_size)
+    if data_view.shape[0] != _state_record_size(board_size):
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    _check_record(&data_view[0], board_size)
+
+    board = np.empty((4, board_size, board_size), dtype=BOARD_DTYPE)
+    walls_remaining = np.empty((2,), dtype=BOARD_DTYPE)
+    cdef u64 zobrist
+    done = _unpack_state(&data_view[0], board_size, board, walls_remaining, &zobrist)
+    return board, walls_remaining, done, zobrist
+
+def unpack_states(data, boards, walls_remaining, done, zobrist):
+    """
+    Decode consecutive records written by :func:`pack_state` straight into
+    preallocated arrays. ``data`` is read in place, so it can be a slice of a
+    file mapping or a shared memory block.
+
+    :arg boards:
+        :data:`BOARD_DTYPE` array of shape ``(N, 4, board_size, board_size)``.
+    :arg walls_remaining:
+        :data:`BOARD_DTYPE` array of shape ``(N, 2)``.
+    :arg done:
+        ``np.bool_`` array of shape ``(N,)``.
+    :arg zobrist:
+        ``np.uint64`` array of shape ``(N,)``.
+    :returns:
+        Number of decoded records, which fill the first rows of each array.
+    """
+    cdef const unsigned char [:] data_view = data
+    cdef cell_t [:,:,:,:] boards_view = boards
+    cdef cell_t [:,:] walls_remaining_view = walls_remaining
+    cdef np.uint8_t [:] done_view = done.view(np.uint8)
+    cdef u64 [:] zobrist_view = zobrist
+    cdef int board_size = boards_view.shape[2]
+    cdef Py_ssize_t record_size, count, index
+    _check_board_size(board_size, boards)
+    record_size = _state_record_size(board_size)
+    if data_view.shape[0] % record_size:
+        raise ValueError(f"invalid state record size: {data_view.shape[0]}")
+    count = data_view.shape[0] // record_size
+    if count > min(
+        boards_view.shape[0],
+        walls_remaining_view.shape[0],
+        done_view.shape[0],
+        zobrist_view.shape[0],
+    ):
+        raise ValueError(f"too many records for the output arrays: {count}")
+    for index in range(count):
+        _check_record(&data_view[index * record_size], board_size)
+
+    with nogil:
+        for index in range(count):
+            done_view[index] = _unpack_state(
+                &data_view[index * record_size],
+                board_size,
+                boards_view[index],
+                walls_remaining_view[index],
+                &zobrist_view[index],
+            )
+    return count
+
+cdef object _bb_to_int(Bitboard bb):
+    cdef int i
+    result = 0
+    for i in range(BB_WORDS - 1, -1, -1):
+        result = (result << 64) | bb.w[i]
+    return result
+
+cdef Bitboard _bb_from_int(object value):
+    cdef Bitboard bb
+    cdef int i
+    for i in range(BB_WORDS):
+        bb.w[i] = value & 0xFFFFFFFFFFFFFFFF
+        value >>= 64
+    return bb
+
+cdef class QuoridorBitboard:
+    """
+    ``QuoridorBitboard`` represents a ``QuoridorState`` board as bit masks.
+    Cell ``(x, y)`` is stored at bit ``x * board_size + y``, so boards up to 13x13
+    fit. Masks are exposed as Python integers.
+    """
+
+    cdef Bitboard _pawns[2]
+    cdef Bitboard _horizontal[2]
+    cdef Bitboard _vertical[2]
+    cdef readonly int board_size
+
+    def __init__(self, pawns, horizontal_walls, vertical_walls, int board_size = 9):
+        """
+        :arg pawns:
+            Pair of masks with the position of agent 0 and agent 1.
+        :arg horizontal_walls:
+            Pair of masks with the horizontal walls placed by agent 0 and agent 1.
+        :arg vertical_walls:
+            Pair of masks with the vertical walls placed by agent 0 and agent 1.
+        :arg board_size:
+            Size (width and height) of the board.
+        """
+        cdef int agent_id
+        _check_board_size(board_size)
+        self.board_size = board_size
+        for agent_id in range(2):
+            self._pawns[agent_id] = _bb_from_int(pawns[agent_id])
+            self._horizontal[agent_id] = _bb_from_int(horizontal_walls[agent_id])
+            self._vertical[agent_id] = _bb_from_int(vertical_walls[agent_id])
+
+    @staticmethod
+    def from_board(board, int board_size = 9):
+        """
+        Build masks from a ``QuoridorState.board`` array.
+        """
+        cdef cell_t [:,:,:] board_view = board
+        cdef QuoridorBitboard result = QuoridorBitboard.__new__(QuoridorBitboard)
+        cdef int agent_id, i, j
+        _check_board_size(board_size, board)
+        result.board_size = board_size
+        for agent_id in range(2):
+            result._pawns[agent_id] = _pawn_bits(board_view, agent_id, board_size)
+            result._horizontal[agent_id] = _bb_zero()
+            result._vertical[agent_id] = _bb_zero()
+        for i in range(board_size):
+            for j in range(board_size):
+                if board_view[2, i, j]:
+                    _bb_set(&result._horizontal[board_view[2, i, j] - 1], i * board_size + j)
+                if board_view[3, i, j]:
+                    _bb_set(&result._vertical[board_view[3, i, j] - 1], i * board_size + j)
+        return result
+
+    def to_board(self):
+        """
+        Expand masks back into a ``QuoridorState.board`` array.
+        """
+        cdef int board_size = self.board_size
+        board = np.zeros((4, board_size, board_size), dtype=BOARD_DTYPE)
+        cdef cell_t [:,:,:] board_view = board
+        cdef int agent_id, i, j, index
+        for i in range(board_size):
+            for j in range(board_size):
+                index = i * board_size + j
+                for agent_id in range(2):
+                    if _bb_test(self._pawns[agent_id], index):
+                        board_view[agent_id, i, j] = 1
+                    if _bb_test(self._horizontal[agent_id], index):
+                        board_view[2, i, j] = 1 + agent_id
+                    if _bb_test(self._vertical[agent_id], index):
+                        board_view[3, i, j] = 1 + agent_id
+        return board
+
+    @property
+    def pawns(self):
+        return (_bb_to_int(self._pawns[0]), _bb_to_int(self._pawns[1]))
+
+    @property
+    def horizontal_walls(self):
+        return (_bb_to_int(self._horizontal[0]), _bb_to_int(self._horizontal[1]))
+
+    @property
+    def vertical_walls(self):
+        return (_bb_to_int(self._vertical[0]), _bb_to_int(self._vertical[1]))
+
+    cdef void _open_edges(self, Bitboard *open_xp, Bitboard *open_yp):
+        cdef Bitboard horizontal = _bb_or(self._horizontal[0], self._horizontal[1])
+        cdef Bitboard vertical = _bb_or(self._vertical[0], self._vertical[1])
+        cdef int board_size = self.board_size
+        cdef int i, j
+        open_xp[0] = _bb_zero()
+        open_yp[0] = _bb_zero()
+        for i in range(board_size):
+            for j in range(board_size):
+                if i < board_size - 1 and not _bb_test(vertical, i * board_size + j):
+                    _bb_set(open_xp, i * board_size + j)
+                if j < board_size - 1 and not _bb_test(horizontal, i * board_size + j):
+                    _bb_set(open_yp, i * board_size + j)
+
+    def path_exists(self, int agent_id):
+        """
+        Check whether agent ``agent_id`` can still reach its goal row.
+        """
+        cdef Bitboard open_xp, open_yp
+        if not 0 <= agent_id <= 1:
+            raise ValueError(f"invalid agent_id: {agent_id}")
+        self._open_edges(&open_xp, &open_yp)
+        return bool(_bb_reachable(
+            self._pawns[agent_id],
+            _goal_bits(agent_id, self.board_size),
+            open_xp,
+            open_yp,
+            self.board_size,
+        ))
+
+cdef class QuoridorSearchState:
+    """
+    ``QuoridorSearchState`` is a mutable game state for tree search. ``apply`` and
+    ``undo`` change ``board`` and ``walls_remaining`` in place and keep a compact
+    undo stack, so no arrays are allocated per visited node.
+    """
+
+    cdef readonly object board
+    cdef readonly object walls_remaining
+    cdef readonly int board_size
+    cdef readonly bint done
+    cdef u64 _hash
+    cdef cell_t [:,:,:] board_view
+    cdef cell_t [:] walls_remaining_view
+    cdef UndoRecord *stack
+    cdef int depth
+    cdef int capacity
+
+    def __cinit__(self, board, walls_remaining, int board_size = 9, bint done = False):
+        """
+        :arg board:
+            Board array, in the form described by ``QuoridorState.board``. It is
+            copied, so the caller's array is never modified.
+        :arg walls_remaining:
+            Remaining walls of both agents.
+        :arg board_size:
+            Size (width and height) of the board.
+        :arg done:
+            Whether the game is already done.
+        """
+        _check_board_size(board_size, board)
+        self.board = np.array(board, dtype=BOARD_DTYPE)
+        self.walls_remaining = np.array(walls_remaining, dtype=BOARD_DTYPE)
+        self.board_view = self.board
+        self.walls_remaining_view = self.walls_remaining
+        self.board_size = board_size
+        self.done = done
+        self._hash = _zobrist_hash(self.board_view, self.walls_remaining_view, board_size)
+        self.depth = 0
+        self.capacity = 64
+        self.stack = <UndoRecord *> malloc(self.capacity * sizeof(UndoRecord))
+        if self.stack == NULL:
+            raise MemoryError()
+
+    def __dealloc__(self):
+        free(self.stack)
+
+    def __len__(self):
+        return self.depth
+
+    @property
+    def hash(self):
+        """
+        Zobrist hash of the current position, as computed by :func:`zobrist_hash`.
+        """
+        return self._hash
+
+    def apply(self, action, int agent_id):
+        """
+        Play ``action`` for agent ``agent_id`` in place.
+        :returns:
+            Whether the game is done after the action.
+        """
+        cdef int action_type = action[0]
+        cdef int x = action[1]
+        cdef int y = action[2]
+        cdef ActionContext ctx
+        cdef UndoRecord *record
+        cdef int error
+
+        _action_context(self.board_view, self.board_size, &ctx)
+        error = _validate_action(
+            self.board_view, self.walls_remaining_view, agent_id, action_type, x, y, self.board_size, &ctx
+        )
+        if error != ACTION_OK:
+            raise ValueError(_error_message(error, agent_id, action_type, x, y))
+
+        if self.depth == self.capacity:
+            record = <UndoRecord *> realloc(self.stack, 2 * self.capacity * sizeof(UndoRecord))
+            if record == NULL:
+                raise MemoryError()
+            self.stack = record
+            self.capacity *= 2
+        record = &self.stack[self.depth]
+        record.agent_id = agent_id
+        record.action_type = action_type
+        record.x = x
+        record.y = y
+        record.prev_x = ctx.pos_x[agent_id]
+        record.prev_y = ctx.pos_y[agent_id]
+        record.done = self.done
+        record.hash = self._hash
+        self.depth += 1
+
+        self._hash ^= _zobrist_delta(
+            self.board_view, self.walls_remaining_view, agent_id, action_type, x, y, &ctx
+        )
+        _apply_action(self.board_view, self.walls_remaining_view, agent_id, action_type, x, y, &ctx)
+        self.done = _check_wins(self.board_view, self.board_size)
+        return self.done
+
+    def undo(self):
+        """
+        Take back the last applied action.
+        """
+        cdef UndoRecord *record
+        if self.depth == 0:
+            raise IndexError("no action to undo")
+        self.depth -= 1
+        record = &self.stack[self.depth]
+        if record.action_type == 0:
+            self.board_view[record.agent_id, record.x, record.y] = 0
+            self.board_view[record.agent_id, record.prev_x, record.prev_y] = 1
+        elif record.action_type == 1:
+            self.board_view[2, record.x, record.y] = 0
+            self.board_view[2, record.x + 1, record.y] = 0
+            self.walls_remaining_view[record.agent_id] += 1
+        else:
+            self.board_view[3, record.x, record.y] = 0
+            self.board_view[3, record.x, record.y + 1] = 0
+            self.walls_remaining_view[record.agent_id] += 1
+        self.done = record.done
+        self._hash = record.hash
+
+    def legal_actions(self, int agent_id):
+        """
+        Find possible actions for the agent, in the same form as
+        ``QuoridorEnv.legal_actions``.
+        """
+        return fast_legal_actions(self, agent_id, self.board_size)
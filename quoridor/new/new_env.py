@@ -13,7 +13,7 @@ from __future__ import annotations
 
 import sys
 from dataclasses import dataclass
-from typing import Callable, Dict, Deque, Optional
+from typing import Callable, Dict, Deque, Optional, Tuple
 
 import numpy as np
 from numpy.typing import ArrayLike, NDArray
@@ -29,6 +29,12 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 from . import cythonfn
 
+BOARD_DTYPE = cythonfn.BOARD_DTYPE
+"""
+Compact dtype (``uint8``) of ``board``, ``walls_remaining`` and legal action arrays.
+Every kernel in :mod:`cythonfn` expects arrays of this dtype.
+"""
+
 QuoridorAction: TypeAlias = ArrayLike
 """
 Alias of :obj:`ArrayLike` to describe the action type.
@@ -50,7 +56,7 @@ class QuoridorState(BaseState):
     ``QuoridorState`` represents the game state.
     """
 
-    board: NDArray[np.int_]
+    board: NDArray[np.uint8]
     """
     Array of shape ``(C, W, H)``, where C is channel index and W, H is board width,
     height.
@@ -63,7 +69,7 @@ class QuoridorState(BaseState):
           ``C = 2``)
     """
 
-    walls_remaining: NDArray[np.int_]
+    walls_remaining: NDArray[np.uint8]
     """
     Array of shape ``(2,)``, in the form of [ `agent0_remaining_walls`,
     `agent1_remaining_walls` ].
@@ -74,13 +80,21 @@ class QuoridorState(BaseState):
     Boolean value indicating whether the game is done.
     """
 
+    zobrist: Optional[int] = None
+    """
+    64-bit Zobrist hash of ``board`` and ``walls_remaining``, maintained
+    incrementally by :meth:`QuoridorEnv.step`. ``None`` if unknown, in which case
+    the next step computes it from scratch.
+    """
+
     def __str__(self) -> str:
         """
         Generate a human-readable string representation of the board.
         Uses unicode box drawing characters.
         """
 
-        table_top = "┌───┬───┬───┬───┬───┬───┬───┬───┬───┐"
+        board_size = self.board.shape[1]
+        table_top = "┌" + "───┬" * (board_size - 1) + "───┐"
         vertical_wall = "│"
         vertical_wall_bold = "┃"
         horizontal_wall = "───"
@@ -93,10 +107,10 @@ class QuoridorState(BaseState):
         right_intersection_bottom = "┘"
         result = table_top + "\n"
 
-        for y in range(9):
+        for y in range(board_size):
             board_line = self.board[:, :, y]
             result += vertical_wall
-            for x in range(9):
+            for x in range(board_size):
                 board_cell = board_line[:, x]
                 if board_cell[0]:
                     result += " 0 "
@@ -106,34 +120,34 @@ class QuoridorState(BaseState):
                     result += "   "
                 if board_cell[3]:
                     result += vertical_wall_bold
-                elif x == 8:
+                elif x == board_size - 1:
                     result += vertical_wall
                 else:
                     result += " "
-                if x == 8:
+                if x == board_size - 1:
                     result += "\n"
-            result += left_intersection_bottom if y == 8 else left_intersection
-            for x in range(9):
+            result += left_intersection_bottom if y == board_size - 1 else left_intersection
+            for x in range(board_size):
                 board_cell = board_line[:, x]
                 if board_cell[2]:
                     result += horizontal_wall_bold
-                elif y == 8:
+                elif y == board_size - 1:
                     result += horizontal_wall
                 else:
                     result += "   "
-                if x == 8:
+                if x == board_size - 1:
                     result += (
-                        right_intersection_bottom if y == 8 else right_intersection
+                        right_intersection_bottom if y == board_size - 1 else right_intersection
                     )
                 else:
                     result += (
-                        middle_intersection_bottom if y == 8 else middle_intersection
+                        middle_intersection_bottom if y == board_size - 1 else middle_intersection
                     )
             result += "\n"
 
         return result
 
-    def perspective(self, agent_id: int) -> NDArray[np.int_]:
+    def perspective(self, agent_id: int) -> NDArray[np.uint8]:
         """
         Return board where specified agent with ``agent_id`` is on top.
         :arg agent_id:
@@ -146,9 +160,9 @@ class QuoridorState(BaseState):
         """
         if agent_id == 0:
             return self.board
-        inverted_walls = (self.board[2:4] == 2).astype(np.int_) + (
+        inverted_walls = (self.board[2:4] == 2).astype(BOARD_DTYPE) + (
             self.board[2:4] == 1
-        ).astype(np.int_) * 2
+        ).astype(BOARD_DTYPE) * 2
         rotated = np.stack(
             [
                 np.rot90(self.board[1], 2),
@@ -167,6 +181,46 @@ class QuoridorState(BaseState):
         )
         return rotated
 
+    def to_bitboard(self) -> cythonfn.QuoridorBitboard:
+        """
+        Convert the board to its bitboard representation.
+        :returns:
+            A :obj:`cythonfn.QuoridorBitboard` holding pawn positions and walls as
+            bit masks.
+        """
+        return cythonfn.QuoridorBitboard.from_board(self.board, self.board.shape[1])
+
+    def to_compact(self) -> QuoridorState:
+        """
+        Convert a state holding ``np.int_`` arrays to :data:`BOARD_DTYPE`.
+        :returns:
+            The state itself if it is already compact, otherwise a converted copy.
+        """
+        if (
+            self.board.dtype == BOARD_DTYPE
+            and self.walls_remaining.dtype == BOARD_DTYPE
+        ):
+            return self
+        return QuoridorState(
+            board=self.board.astype(BOARD_DTYPE),
+            walls_remaining=self.walls_remaining.astype(BOARD_DTYPE),
+            done=self.done,
+            zobrist=self.zobrist,
+        )
+
+    def to_legacy(self) -> QuoridorState:
+        """
+        Convert the state to the former ``np.int_`` layout.
+        :returns:
+            A copy of the state holding ``np.int_`` arrays.
+        """
+        return QuoridorState(
+            board=self.board.astype(np.int_),
+            walls_remaining=self.walls_remaining.astype(np.int_),
+            done=self.done,
+            zobrist=self.zobrist,
+        )
+
     def to_dict(self) -> Dict:
         """
         Serialize state object to dict.
@@ -188,12 +242,75 @@ class QuoridorState(BaseState):
         :returns:
             Deserialized ``QuoridorState`` object.
         """
+        board = np.array(serialized["board"], dtype=BOARD_DTYPE)
+        walls_remaining = np.array(serialized["walls_remaining"], dtype=BOARD_DTYPE)
         return QuoridorState(
-            board=np.array(serialized["board"]),
-            walls_remaining=np.array(serialized["walls_remaining"]),
+            board=board,
+            walls_remaining=walls_remaining,
             done=serialized["done"],
+            zobrist=cythonfn.zobrist_hash(board, walls_remaining, board.shape[1]),
         )
 
+    def to_bytes(self) -> bytes:
+        """
+        Serialize state object to a fixed-size binary record.
+        :returns:
+            A record of :func:`cythonfn.state_record_size` bytes, laid out as
+            described in :func:`cythonfn.pack_state`.
+        """
+        state = self.to_compact()
+        board_size = self.board.shape[1]
+        zobrist = self.zobrist
+        if zobrist is None:
+            zobrist = cythonfn.zobrist_hash(state.board, state.walls_remaining, board_size)
+        return cythonfn.pack_state(
+            state.board, state.walls_remaining, self.done, zobrist, board_size
+        )
+
+    @staticmethod
+    def from_bytes(data) -> QuoridorState:
+        """
+        Deserialize from a record written by :meth:`to_bytes`.
+        :arg data:
+            A bytes-like object.
+        :returns:
+            Deserialized ``QuoridorState`` object.
+        """
+        board, walls_remaining, done, zobrist = cythonfn.unpack_state(data)
+        return QuoridorState(
+            board=board, walls_remaining=walls_remaining, done=done, zobrist=zobrist
+        )
+
+    @staticmethod
+    def from_bytes_batch(
+        data, board_size: int = 9, out: Optional[Tuple[NDArray, ...]] = None
+    ) -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.bool_], NDArray[np.uint64]]:
+        """
+        Deserialize concatenated records written by :meth:`to_bytes` into arrays,
+        without creating a state object per record.
+        :arg data:
+            A bytes-like object. It is read in place.
+        :arg board_size:
+            Size (width and height) of the encoded boards.
+        :arg out:
+            Optional tuple of preallocated ``(boards, walls_remaining, done,
+            zobrist)`` arrays as accepted by :func:`cythonfn.unpack_states`, with
+            room for every record.
+        :returns:
+            The ``(boards, walls_remaining, done, zobrist)`` arrays, trimmed to the
+            number of records. They are views of ``out`` if given.
+        """
+        if out is None:
+            count = len(memoryview(data).cast("B")) // cythonfn.state_record_size(board_size)
+            out = (
+                np.empty((count, 4, board_size, board_size), dtype=BOARD_DTYPE),
+                np.empty((count, 2), dtype=BOARD_DTYPE),
+                np.empty((count,), dtype=np.bool_),
+                np.empty((count,), dtype=np.uint64),
+            )
+        count = cythonfn.unpack_states(data, *out)
+        return tuple(array[:count] for array in out)  # type: ignore
+
 
 class QuoridorEnv(BaseEnv[QuoridorState, QuoridorAction]):
     env_id = ("quoridor", 0)  # type: ignore
@@ -246,19 +363,27 @@ class QuoridorEnv(BaseEnv[QuoridorState, QuoridorAction]):
         if pre_step_fn is not None:
             pre_step_fn(state, agent_id, action)
 
-        next_information = cythonfn.fast_step(state.board, state.walls_remaining, agent_id, action, self.board_size)
+        next_information = cythonfn.fast_step(
+            state.board,
+            state.walls_remaining,
+            agent_id,
+            action,
+            self.board_size,
+            state.zobrist,
+        )
 
         next_state = QuoridorState(
             board=next_information[0],
             walls_remaining=next_information[1],
             done=next_information[2],
+            zobrist=next_information[3],
         )
 
         if post_step_fn is not None:
             post_step_fn(next_state, agent_id, action)
         return next_state
     
-    def legal_actions(self, state: QuoridorState, agent_id: int) -> NDArray[np.int_]:
+    def legal_actions(self, state: QuoridorState, agent_id: int) -> NDArray[np.uint8]:
         """
         Find possible actions for the agent.
 
@@ -268,16 +393,126 @@ class QuoridorEnv(BaseEnv[QuoridorState, QuoridorAction]):
             Agent_id of the agent.
         
         :returns:
-            A numpy array of shape (4, 9, 9) which is one-hot encoding of possible actions.
+            A numpy array of shape (3, 9, 9) which is one-hot encoding of possible actions.
+        """
+        return cythonfn.fast_legal_actions(state, agent_id, self.board_size)
+
+    @property
+    def num_actions(self) -> int:
+        """
+        Size of the flat action index space, ``3 * board_size * board_size``.
+        """
+        return 3 * self.board_size * self.board_size
+
+    def encode_action(self, action: QuoridorAction) -> int:
+        """
+        Convert an action to its flat index
+        ``(action_type * board_size + x) * board_size + y``.
+        """
+        return (action[0] * self.board_size + action[1]) * self.board_size + action[2]
+
+    def decode_action(self, idx: int) -> QuoridorAction:
+        """
+        Convert a flat action index back to ``[action_type, x, y]``.
         """
-        return cythonfn.legal_actions(state, agent_id, self.board_size)
+        if not 0 <= idx < self.num_actions:
+            raise ValueError(f"invalid action index: {idx}")
+        rest, y = divmod(idx, self.board_size)
+        action_type, x = divmod(rest, self.board_size)
+        return [action_type, x, y]
+
+    def step_index(
+        self,
+        state: QuoridorState,
+        agent_id: int,
+        idx: int,
+        *,
+        pre_step_fn: Optional[
+            Callable[[QuoridorState, int, QuoridorAction], None]
+        ] = None,
+        post_step_fn: Optional[
+            Callable[[QuoridorState, int, QuoridorAction], None]
+        ] = None,
+    ) -> QuoridorState:
+        """
+        Step through the game with an action given as a flat index, which is
+        decoded and passed to :meth:`step` together with the callbacks.
+
+        :arg state:
+            Current state of the environment.
+        :arg agent_id:
+            ID of the agent that takes the action. (``0`` or ``1``)
+        :arg idx:
+            Flat action index, as described by :meth:`encode_action`.
+        :arg pre_step_fn:
+            See :meth:`step`.
+        :arg post_step_fn:
+            See :meth:`step`.
+
+        :returns:
+            The next state.
+        """
+        return self.step(
+            state,
+            agent_id,
+            self.decode_action(idx),
+            pre_step_fn=pre_step_fn,
+            post_step_fn=post_step_fn,
+        )
+
+    def legal_mask_flat(self, state: QuoridorState, agent_id: int) -> NDArray[np.bool_]:
+        """
+        Find possible actions for the agent as a flat mask.
+
+        :arg state:
+            Current state of the environment.
+        :arg agent_id:
+            Agent_id of the agent.
+
+        :returns:
+            A contiguous boolean array of shape ``(num_actions,)`` indexed by
+            :meth:`encode_action`.
+        """
+        return self.legal_actions(state, agent_id).reshape(-1).view(np.bool_)
+
+    def distances(self, state: QuoridorState) -> Tuple[NDArray[np.intc], NDArray[np.intc]]:
+        """
+        Measure how far each agent is from its goal row, ignoring pawns.
+
+        :arg state:
+            Current state of the environment.
+
+        :returns:
+            A tuple of ``(distance_maps, lengths)``. ``distance_maps`` has shape
+            ``(2, board_size, board_size)`` and holds, for each agent, the number of
+            steps from every cell to its goal row, or
+            :data:`cythonfn.DISTANCE_UNREACHABLE`.
+            ``lengths`` has shape ``(2,)`` and holds the shortest-path length of
+            each agent from its current position.
+        """
+        return cythonfn.distances(state.board, self.board_size)
+
+    def search_state(self, state: QuoridorState) -> cythonfn.QuoridorSearchState:
+        """
+        Create a mutable copy of the state for tree search.
+
+        :arg state:
+            State to start the search from. It is not modified.
+
+        :returns:
+            A :obj:`cythonfn.QuoridorSearchState` supporting in-place ``apply(action,
+            agent_id)`` and ``undo()``.
+        """
+        return cythonfn.QuoridorSearchState(
+            state.board, state.walls_remaining, self.board_size, state.done
+        )
 
     def _check_in_range(self, pos: NDArray[np.int_], bottom_right=None) -> np.bool_:
         if bottom_right is None:
             bottom_right = np.array([self.board_size, self.board_size])
         return np.all(np.logical_and(np.array([0, 0]) <= pos, pos < bottom_right))
 
-    def _check_path_exists(self, board: NDArray[np.int_], agent_id: int) -> bool:
+    def _check_path_exists(self, board: NDArray[np.uint8], agent_id: int) -> bool:
         start_pos = tuple(np.argwhere(board[agent_id] == 1)[0])
         visited = set()
         q = Deque([start_pos])
@@ -302,7 +537,7 @@ class QuoridorEnv(BaseEnv[QuoridorState, QuoridorAction]):
 
     def _check_wall_blocked(
         self,
-        board: NDArray[np.int_],
+        board: NDArray[np.uint8],
         current_pos: NDArray[np.int_],
         new_pos: NDArray[np.int_],
     ) -> bool:
@@ -321,7 +556,7 @@ class QuoridorEnv(BaseEnv[QuoridorState, QuoridorAction]):
         )
         return bool(right_check or left_check or down_check or up_check)
 
-    def _check_wins(self, board: NDArray[np.int_]) -> bool:
+    def _check_wins(self, board: NDArray[np.uint8]) -> bool:
         return bool(board[0, :, -1].sum() or board[1, :, 0].sum())
 
     def initialize_state(self) -> QuoridorState:
@@ -336,22 +571,24 @@ class QuoridorEnv(BaseEnv[QuoridorState, QuoridorAction]):
                 "initialize state manually"
             )
 
-        starting_pos_0 = np.zeros((self.board_size, self.board_size), dtype=np.int_)
+        starting_pos_0 = np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE)
         starting_pos_0[(self.board_size - 1) // 2, 0] = 1
 
         starting_board = np.stack(
             [
                 np.copy(starting_pos_0),
                 np.fliplr(starting_pos_0),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
-                np.zeros((self.board_size, self.board_size), dtype=np.int_),
+                np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE),
+                np.zeros((self.board_size, self.board_size), dtype=BOARD_DTYPE),
             ]
         )
 
+        walls_remaining = np.array((self.max_walls, self.max_walls), dtype=BOARD_DTYPE)
         initial_state = QuoridorState(
             board=starting_board,
             done=False,
-            walls_remaining=np.array((self.max_walls, self.max_walls)),
+            walls_remaining=walls_remaining,
+            zobrist=cythonfn.zobrist_hash(starting_board, walls_remaining, self.board_size),
         )
 
         return initial_state
\ No newline at end of file
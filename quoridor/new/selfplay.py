@@ -0,0 +1,55 @@
+"""
+Quoridor Self-Play Runner
+:class:`common.selfplay.BaseSelfPlayRunner` playing :obj:`QuoridorEnv` games.
+Positions are stored as :meth:`QuoridorState.to_bytes` records and actions as
+flat indices (see :meth:`QuoridorEnv.encode_action`).
+
+    with SelfPlayRunner((RandomAgent, RandomAgent), num_workers=8) as runner:
+        for trajectories in runner:
+            boards, walls_remaining, done, zobrist = trajectories.states()
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.selfplay import AgentFactory, BaseSelfPlayRunner, BaseTrajectories
+from .new_env import QuoridorEnv, QuoridorState
+
+
+class Trajectories(BaseTrajectories):
+    """
+    Plies of Quoridor games; ``outcomes`` is ``0`` only for games cut off at
+    ``max_plies``.
+    """
+
+    def states(
+        self,
+    ) -> Tuple[NDArray[np.uint8], NDArray[np.uint8], NDArray[np.bool_], NDArray[np.uint64]]:
+        """
+        Decode every position with :meth:`QuoridorState.from_bytes_batch`.
+        """
+        return QuoridorState.from_bytes_batch(self.records.reshape(-1), QuoridorEnv.board_size)
+
+
+def _outcome(state: QuoridorState, last_agent_id: int) -> int:
+    if not state.done:
+        return 0
+    return 1 if last_agent_id == 0 else -1
+
+
+class SelfPlayRunner(BaseSelfPlayRunner):
+    """
+    Self-play of Quoridor games; see :class:`common.selfplay.BaseSelfPlayRunner`.
+    """
+
+    env_class = QuoridorEnv
+    trajectories_class = Trajectories
+    outcome = staticmethod(_outcome)
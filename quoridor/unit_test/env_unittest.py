@@ -6,6 +6,7 @@ import numpy as np
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+from new import cythonfn
 from new.new_env import QuoridorEnv
 
 class TestQuoridorEnv(unittest.TestCase):
@@ -165,6 +166,250 @@ class TestQuoridorEnv(unittest.TestCase):
         np.testing.assert_array_equal(issue_24.board[2], expected_hwall)
         np.testing.assert_array_equal(issue_24.board[3], expected_vwall)
 
+    def test_search_state(self):
+        search_state = self.env.search_state(self.initial_state)
+        actions = [(0, [0, 4, 1]), (1, [1, 4, 0]), (0, [2, 3, 1]), (1, [0, 4, 7])]
+        expected = self.initial_state
+        history = [expected]
+        for agent_id, action in actions:
+            expected = self.env.step(expected, agent_id, action)
+            history.append(expected)
+            search_state.apply(action, agent_id)
+            np.testing.assert_array_equal(search_state.board, expected.board)
+            np.testing.assert_array_equal(
+                search_state.walls_remaining, expected.walls_remaining
+            )
+        np.testing.assert_array_equal(
+            search_state.legal_actions(0), self.env.legal_actions(expected, 0)
+        )
+
+        self.assertRaisesRegex(
+            ValueError,
+            "already placed",
+            lambda: search_state.apply([1, 4, 0], 0),
+        )
+        self.assertEqual(len(search_state), len(actions))
+
+        for state in reversed(history[:-1]):
+            search_state.undo()
+            np.testing.assert_array_equal(search_state.board, state.board)
+            np.testing.assert_array_equal(
+                search_state.walls_remaining, state.walls_remaining
+            )
+        self.assertRaises(IndexError, search_state.undo)
+
+    def test_step_batch(self):
+        boards = np.stack([self.initial_state.board] * 3)
+        walls_remaining = np.stack([self.initial_state.walls_remaining] * 3)
+        agent_ids = np.array([0, 1, 0], dtype=np.intc)
+        actions = np.array([[0, 4, 1], [1, 0, 0], [1, 0, 8]], dtype=np.intc)
+        legal_actions = cythonfn.fast_legal_actions_batch(
+            boards, walls_remaining, agent_ids, 9
+        )
+        for i in range(3):
+            np.testing.assert_array_equal(
+                legal_actions[i],
+                self.env.legal_actions(self.initial_state, agent_ids[i]),
+            )
+
+        dones, errors = cythonfn.fast_step_batch(
+            boards, walls_remaining, agent_ids, actions, 9
+        )
+        np.testing.assert_array_equal(dones, [0, 0, 0])
+        self.assertEqual(errors[0], 0)
+        self.assertEqual(errors[1], 0)
+        self.assertEqual(
+            cythonfn.error_message(errors[2], 0, actions[2]),
+            "cannot place wall on the edge",
+        )
+        for i in range(2):
+            expected = self.env.step(self.initial_state, agent_ids[i], actions[i])
+            np.testing.assert_array_equal(boards[i], expected.board)
+            np.testing.assert_array_equal(walls_remaining[i], expected.walls_remaining)
+        np.testing.assert_array_equal(boards[2], self.initial_state.board)
+
+    def test_rollout(self):
+        winner, length = cythonfn.rollout(self.initial_state, 0, 42)
+        self.assertIn(winner, [0, 1])
+        self.assertGreater(length, 0)
+        self.assertEqual(cythonfn.rollout(self.initial_state, 0, 42), (winner, length))
+        self.assertEqual(cythonfn.rollout(self.initial_state, 0, 42, 5), (-1, 5))
+
+        winners, lengths = cythonfn.rollouts(self.initial_state, 1, 7, 16)
+        self.assertEqual(winners.shape, (16,))
+        self.assertTrue(np.all(lengths > 0))
+        np.testing.assert_array_equal(self.initial_state.board, self.env.initialize_state().board)
+
+        finished = self.env.step(self.initial_state, 0, [0, 4, 1])
+        finished.board[0] = 0
+        finished.board[0, 4, 8] = 1
+        finished.board[1] = 0
+        finished.board[1, 0, 4] = 1
+        self.assertEqual(cythonfn.rollout(finished, 1, 0), (0, 0))
+
+    def test_legal_actions(self):
+        walled_in = self.env.step(self.initial_state, 0, [1, 4, 0])
+        walled_in = self.env.step(walled_in, 1, [2, 5, 0])
+        self.assertFalse(self.env.legal_actions(walled_in, 0)[2, 3, 0])
+        moved_out = self.env.step(walled_in, 0, [0, 3, 0])
+        for state in [walled_in, moved_out]:
+            for agent_id in range(2):
+                legal_actions = self.env.legal_actions(state, agent_id)
+                self.assertEqual(legal_actions.shape, (3, 9, 9))
+                for action in np.ndindex(*legal_actions.shape):
+                    try:
+                        self.env.step(state, agent_id, list(action))
+                    except ValueError:
+                        self.assertFalse(legal_actions[action], action)
+                    else:
+                        self.assertTrue(legal_actions[action], action)
+
+    def test_board_sizes(self):
+        for board_size in [5, 7, 13]:
+            env = QuoridorEnv()
+            env.board_size = board_size
+            state = env.initialize_state()
+            legal_actions = env.legal_actions(state, 0)
+            self.assertEqual(legal_actions.shape, (3, board_size, board_size))
+            for action in np.ndindex(*legal_actions.shape):
+                try:
+                    env.step(state, 0, list(action))
+                except ValueError:
+                    self.assertFalse(legal_actions[action], action)
+                else:
+                    self.assertTrue(legal_actions[action], action)
+
+            winner, length = cythonfn.rollout(state, 0, 1, board_size=board_size)
+            self.assertTrue(winner in [0, 1] or length == 1000)
+
+        env = QuoridorEnv()
+        env.board_size = 5
+        state = env.initialize_state()
+        state = env.step(state, 0, [1, 2, 0])
+        state = env.step(state, 1, [2, 1, 0])
+        with self.assertRaisesRegex(ValueError, "cannot place wall blocking all paths"):
+            env.step(state, 0, [2, 3, 0])
+        for board_size in [3, 8, 15]:
+            with self.assertRaisesRegex(ValueError, f"unsupported board_size: {board_size}"):
+                cythonfn.fast_step(state.board, state.walls_remaining, 0, [0, 1, 0], board_size)
+        with self.assertRaisesRegex(ValueError, "invalid board shape"):
+            cythonfn.fast_step(state.board, state.walls_remaining, 0, [0, 1, 0], 7)
+        with self.assertRaisesRegex(ValueError, "invalid board shape"):
+            cythonfn.zobrist_hash(self.initial_state.board, self.initial_state.walls_remaining, 13)
+
+
+    def test_flat_actions(self):
+        self.assertEqual(self.env.num_actions, 243)
+        mask = self.env.legal_mask_flat(self.initial_state, 0)
+        self.assertEqual(mask.shape, (243,))
+        self.assertEqual(mask.dtype, np.bool_)
+        self.assertTrue(mask.flags.c_contiguous)
+        np.testing.assert_array_equal(
+            mask, self.env.legal_actions(self.initial_state, 0).reshape(-1) == 1
+        )
+
+        idx = self.env.encode_action([1, 2, 3])
+        self.assertEqual(idx, 81 + 2 * 9 + 3)
+        self.assertEqual(self.env.decode_action(idx), [1, 2, 3])
+        np.testing.assert_array_equal(
+            self.env.step_index(self.initial_state, 0, idx).board,
+            self.env.step(self.initial_state, 0, [1, 2, 3]).board,
+        )
+        with self.assertRaisesRegex(ValueError, "invalid action index: 243"):
+            self.env.step_index(self.initial_state, 0, 243)
+
+        calls = []
+        next_state = self.env.step_index(
+            self.initial_state,
+            0,
+            idx,
+            pre_step_fn=lambda *args: calls.append(("pre",) + args),
+            post_step_fn=lambda *args: calls.append(("post",) + args),
+        )
+        self.assertEqual(
+            calls,
+            [("pre", self.initial_state, 0, [1, 2, 3]), ("post", next_state, 0, [1, 2, 3])],
+        )
+        with self.assertRaisesRegex(ValueError, "cannot place wall on the edge"):
+            self.env.step_index(self.initial_state, 0, self.env.encode_action([1, 2, 8]))
+
+
+    def test_zobrist(self):
+        def from_scratch(state):
+            return cythonfn.zobrist_hash(state.board, state.walls_remaining, 9)
+
+        self.assertEqual(self.initial_state.zobrist, from_scratch(self.initial_state))
+        first = self.env.step(self.initial_state, 0, [1, 2, 3])
+        first = self.env.step(first, 1, [2, 5, 5])
+        second = self.env.step(self.initial_state, 0, [2, 5, 5])
+        second = self.env.step(second, 1, [1, 2, 3])
+        self.assertNotEqual(first.zobrist, second.zobrist)
+        self.assertEqual(first.zobrist, from_scratch(first))
+        self.assertEqual(second.zobrist, from_scratch(second))
+
+        moved = self.env.step(first, 0, [0, 4, 1])
+        self.assertEqual(moved.zobrist, from_scratch(moved))
+        moved_back = self.env.step(moved, 0, [0, 4, 0])
+        self.assertEqual(moved_back.zobrist, first.zobrist)
+
+        search_state = self.env.search_state(self.initial_state)
+        search_state.apply([1, 2, 3], 0)
+        search_state.apply([1, 6, 3], 0)
+        other_order = self.env.search_state(self.initial_state)
+        other_order.apply([1, 6, 3], 0)
+        other_order.apply([1, 2, 3], 0)
+        self.assertEqual(search_state.hash, other_order.hash)
+        search_state.undo()
+        search_state.undo()
+        self.assertEqual(search_state.hash, self.initial_state.zobrist)
+
+    def test_distances(self):
+        distance_maps, lengths = self.env.distances(self.initial_state)
+        self.assertEqual(distance_maps.shape, (2, 9, 9))
+        np.testing.assert_array_equal(lengths, [8, 8])
+        np.testing.assert_array_equal(distance_maps[0, 2], np.arange(8, -1, -1))
+        np.testing.assert_array_equal(distance_maps[1, 2], np.arange(9))
+
+        state = self.env.step(self.initial_state, 0, [1, 4, 0])
+        distance_maps, lengths = self.env.distances(state)
+        np.testing.assert_array_equal(lengths, [9, 9])
+        self.assertEqual(distance_maps[0, 3, 0], 8)
+        self.assertEqual(distance_maps[1, 5, 1], 2)
+        self.assertNotIn(cythonfn.DISTANCE_UNREACHABLE, distance_maps)
+        with self.assertRaisesRegex(ValueError, "unsupported board_size: 16"):
+            cythonfn.distances(state.board, 16)
+        board = state.board.copy()
+        board[1] = 0
+        with self.assertRaisesRegex(ValueError, "no pawn for agent 1"):
+            cythonfn.distances(board, 9)
+
+    def test_transposition_table(self):
+        table = cythonfn.TranspositionTable(4)
+        self.assertEqual(table.capacity, 4)
+        table.store(1, "deep", 5)
+        table.store(3, "shallow", 1)
+        self.assertEqual(table.lookup(1), "deep")
+        self.assertEqual(table.lookup(3), "shallow")
+        self.assertEqual(len(table), 2)
+
+        table.store(5, "replaces shallow", 2)
+        self.assertNotIn(3, table)
+        self.assertEqual(table.lookup(1), "deep")
+        table.store(7, "deeper", 6)
+        self.assertEqual(table.lookup(7), "deeper")
+        self.assertEqual(table.lookup(1), "deep")
+        self.assertNotIn(5, table)
+        self.assertEqual(table.depth(7), 6)
+        self.assertEqual(table.depth(5), -1)
+        self.assertIsNone(table.lookup(2))
+
+        table.store(7, "overwritten", 0)
+        self.assertEqual(table.lookup(7), "overwritten")
+        self.assertEqual(len(table), 2)
+        table.clear()
+        self.assertEqual(len(table), 0)
+        self.assertNotIn(7, table)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,18 @@
+import unittest
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.unit_test.selfplay_cases import SelfPlayRunnerCases
+from new.selfplay import SelfPlayRunner
+
+class TestSelfPlayRunner(SelfPlayRunnerCases, unittest.TestCase):
+    runner_class = SelfPlayRunner
+
+    def expected_outcome(self, state, num_plies):
+        # The agent who moved last reached its goal.
+        return 1 if num_plies % 2 else -1
+
+if __name__ == "__main__":
+    unittest.main()
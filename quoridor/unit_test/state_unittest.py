@@ -5,7 +5,7 @@ import numpy as np
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
-from new.new_env import QuoridorEnv, QuoridorState
+from new.new_env import BOARD_DTYPE, QuoridorEnv, QuoridorState
 
 class TestQuoridorState(unittest.TestCase):
     def setUp(self) -> None:
@@ -47,5 +47,72 @@ class TestQuoridorState(unittest.TestCase):
         rotated_state = self.env.step(rotated_state, 0, [2, 4, 2])
         np.testing.assert_array_equal(rotated_board[2:], rotated_state.board[2:])
 
+    def test_compact(self):
+        self.assertEqual(self.state.board.dtype, BOARD_DTYPE)
+        self.assertEqual(self.state.walls_remaining.dtype, BOARD_DTYPE)
+        self.assertIs(self.state.to_compact(), self.state)
+
+        legacy = self.state.to_legacy()
+        self.assertEqual(legacy.board.dtype, np.int_)
+        self.assertEqual(legacy.walls_remaining.dtype, np.int_)
+        compact = legacy.to_compact()
+        np.testing.assert_array_equal(compact.board, self.state.board)
+        self.assertEqual(compact.board.dtype, BOARD_DTYPE)
+        next_state = self.env.step(compact, 1, [0, 4, 7])
+        self.assertEqual(next_state.board.dtype, BOARD_DTYPE)
+
+        state = QuoridorState.from_dict(legacy.to_dict())
+        self.assertEqual(state.board.dtype, BOARD_DTYPE)
+        self.assertEqual(state.walls_remaining.dtype, BOARD_DTYPE)
+
+    def test_to_bitboard(self):
+        bitboard = self.state.to_bitboard()
+        np.testing.assert_array_equal(bitboard.to_board(), self.state.board)
+        self.assertEqual(bitboard.pawns, (1 << (3 * 9 + 1), 1 << (4 * 9 + 8)))
+        self.assertEqual(bitboard.vertical_walls, (0, (1 << (3 * 9)) | (1 << (3 * 9 + 1))))
+        self.assertTrue(bitboard.path_exists(0))
+        self.assertTrue(bitboard.path_exists(1))
+
+        enclosed = self.initial_state.board.copy()
+        enclosed[2, 4, 0] = 1
+        enclosed[3, 3, 0] = 1
+        enclosed[3, 4, 0] = 1
+        enclosed_state = QuoridorState(
+            board=enclosed, walls_remaining=self.initial_state.walls_remaining
+        )
+        self.assertFalse(enclosed_state.to_bitboard().path_exists(0))
+        self.assertTrue(enclosed_state.to_bitboard().path_exists(1))
+
+    def test_to_bytes(self):
+        data = self.state.to_bytes()
+        self.assertEqual(len(data), 60)
+        state = QuoridorState.from_bytes(data)
+        np.testing.assert_array_equal(state.board, self.state.board)
+        np.testing.assert_array_equal(state.walls_remaining, self.state.walls_remaining)
+        self.assertEqual(state.done, self.state.done)
+        self.assertEqual(state.zobrist, self.state.zobrist)
+        self.assertEqual(self.state.to_legacy().to_bytes(), data)
+
+        with self.assertRaisesRegex(ValueError, "invalid state record size"):
+            QuoridorState.from_bytes(data[:-1])
+        with self.assertRaisesRegex(ValueError, "unsupported state format version"):
+            QuoridorState.from_bytes(b"\xff" + data[1:])
+
+        records = self.initial_state.to_bytes() + data
+        boards, walls_remaining, done, zobrist = QuoridorState.from_bytes_batch(records)
+        np.testing.assert_array_equal(boards, [self.initial_state.board, self.state.board])
+        self.assertEqual(zobrist[1], self.state.zobrist)
+
+        out = (
+            np.zeros((4, 4, 9, 9), dtype=BOARD_DTYPE),
+            np.zeros((4, 2), dtype=BOARD_DTYPE),
+            np.zeros((4,), dtype=np.bool_),
+            np.zeros((4,), dtype=np.uint64),
+        )
+        decoded = QuoridorState.from_bytes_batch(memoryview(records), out=out)
+        self.assertEqual(len(decoded[0]), 2)
+        self.assertTrue(np.shares_memory(decoded[0], out[0]))
+        np.testing.assert_array_equal(out[1][:2], walls_remaining)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
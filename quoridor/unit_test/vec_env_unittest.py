@@ -0,0 +1,17 @@
+import unittest
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))))
+from common.unit_test.vec_env_cases import VecEnvCases
+from new.vec_env import VecEnv
+
+class TestVecEnv(VecEnvCases, unittest.TestCase):
+    vec_env_class = VecEnv
+
+    def expected_reward(self, state, agent_id):
+        return 1
+
+if __name__ == "__main__":
+    unittest.main()